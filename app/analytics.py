@@ -0,0 +1,207 @@
+# app/analytics.py
+
+"""
+Activity rollups: messages and conversations per day, maintained at ingest.
+
+MessageActivity holds one row per (day, author_role) with the message count
+and total content length; ConversationActivity one row per day with the
+conversations created. Triggers on Messages and Conversations add and
+subtract every insert, delete and relevant update, so the rollups follow
+imports, upserts, merges and migrations without being recomputed. Weekly and
+monthly series are summed from the daily rows at read time: years of history
+are a few thousand rows, never a scan of Messages.
+
+Days are UTC dates of create_time; rows without a create_time are not counted.
+"""
+
+import sqlite3
+
+from .compression import register_content_functions
+
+GRANULARITIES = {
+    "day": "day",
+    # Monday of the day's week
+    "week": "date(day, '-6 days', 'weekday 1')",
+    "month": "substr(day, 1, 7)",
+}
+
+_MESSAGE_DAY = "date({row}.create_time, 'unixepoch')"
+_MESSAGE_ROLE = "IFNULL({row}.author_role, 'unknown')"
+_MESSAGE_LENGTH = "IFNULL(length(inflate_content({row}.content)), 0)"
+
+def _add_message(row):
+    return f"""
+        INSERT INTO MessageActivity (day, author_role, messages, content_chars)
+        SELECT {_MESSAGE_DAY.format(row=row)}, {_MESSAGE_ROLE.format(row=row)}, 1, {_MESSAGE_LENGTH.format(row=row)}
+        WHERE {row}.create_time IS NOT NULL
+        ON CONFLICT(day, author_role) DO UPDATE SET
+            messages = messages + 1, content_chars = content_chars + excluded.content_chars;
+    """
+
+def _remove_message(row):
+    return f"""
+        UPDATE MessageActivity SET
+            messages = messages - 1, content_chars = content_chars - {_MESSAGE_LENGTH.format(row=row)}
+        WHERE day = {_MESSAGE_DAY.format(row=row)} AND author_role = {_MESSAGE_ROLE.format(row=row)};
+    """
+
+def _add_conversation(row):
+    return f"""
+        INSERT INTO ConversationActivity (day, conversations)
+        SELECT date({row}.create_time, 'unixepoch'), 1 WHERE {row}.create_time IS NOT NULL
+        ON CONFLICT(day) DO UPDATE SET conversations = conversations + 1;
+    """
+
+def _remove_conversation(row):
+    return f"""
+        UPDATE ConversationActivity SET conversations = conversations - 1
+        WHERE day = date({row}.create_time, 'unixepoch');
+    """
+
+_ROLLUP_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS MessageActivity (
+        day TEXT NOT NULL,
+        author_role TEXT NOT NULL,
+        messages INTEGER NOT NULL,
+        content_chars INTEGER NOT NULL,
+        PRIMARY KEY (day, author_role)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ConversationActivity (
+        day TEXT PRIMARY KEY,
+        conversations INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+]
+
+_ROLLUP_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS messages_activity_insert AFTER INSERT ON Messages BEGIN {_add_message('new')} END",
+    f"CREATE TRIGGER IF NOT EXISTS messages_activity_delete AFTER DELETE ON Messages BEGIN {_remove_message('old')} END",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_activity_update
+    AFTER UPDATE OF create_time, author_role, content ON Messages BEGIN
+        {_remove_message('old')}
+        {_add_message('new')}
+    END
+    """,
+    f"CREATE TRIGGER IF NOT EXISTS conversations_activity_insert AFTER INSERT ON Conversations BEGIN {_add_conversation('new')} END",
+    f"CREATE TRIGGER IF NOT EXISTS conversations_activity_delete AFTER DELETE ON Conversations BEGIN {_remove_conversation('old')} END",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS conversations_activity_update AFTER UPDATE OF create_time ON Conversations BEGIN
+        {_remove_conversation('old')}
+        {_add_conversation('new')}
+    END
+    """,
+]
+
+def has_activity_rollups(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'MessageActivity'"
+    ).fetchone() is not None
+
+def ensure_activity_rollups(conn):
+    """
+    Creates the rollup tables and their triggers, backfilling the tables from
+    existing rows the first time. Messages and Conversations must already exist.
+    """
+    existed = has_activity_rollups(conn)
+    register_content_functions(conn)
+    for statement in _ROLLUP_TABLES + _ROLLUP_TRIGGERS:
+        conn.execute(statement)
+    if not existed:
+        rebuild_activity_rollups(conn)
+
+def rebuild_activity_rollups(conn):
+    """Recomputes both rollup tables from Messages and Conversations."""
+    register_content_functions(conn)
+    conn.execute("DELETE FROM MessageActivity")
+    conn.execute(f"""
+        INSERT INTO MessageActivity (day, author_role, messages, content_chars)
+        SELECT {_MESSAGE_DAY.format(row='m')}, {_MESSAGE_ROLE.format(row='m')}, COUNT(*),
+               SUM({_MESSAGE_LENGTH.format(row='m')})
+        FROM Messages m WHERE m.create_time IS NOT NULL
+        GROUP BY 1, 2
+    """)
+    conn.execute("DELETE FROM ConversationActivity")
+    conn.execute("""
+        INSERT INTO ConversationActivity (day, conversations)
+        SELECT date(create_time, 'unixepoch'), COUNT(*)
+        FROM Conversations WHERE create_time IS NOT NULL
+        GROUP BY 1
+    """)
+
+def _average(total, count):
+    return round(total / count, 1) if count else 0
+
+def fetch_activity(conn, granularity="month", start_date=None, end_date=None):
+    """
+    Reads the activity series from the rollups.
+
+    Args:
+        granularity: 'day', 'week' (starting Monday) or 'month'.
+        start_date, end_date: Optional inclusive YYYY-MM-DD bounds on the day.
+
+    Returns:
+        A dict with the granularity, `periods` (oldest first, each with
+        conversations, messages, average_length and per-role messages and
+        average_length) and `totals`; None if the database has no rollups.
+    """
+    period = GRANULARITIES[granularity]
+    where, params = ["1=1"], []
+    if start_date:
+        where.append("day >= ?")
+        params.append(start_date)
+    if end_date:
+        where.append("day <= ?")
+        params.append(end_date)
+    where = " AND ".join(where)
+
+    try:
+        message_rows = conn.execute(f"""
+            SELECT {period} AS period, author_role, SUM(messages), SUM(content_chars)
+            FROM MessageActivity WHERE {where}
+            GROUP BY 1, 2 HAVING SUM(messages) > 0
+        """, params).fetchall()
+        conversation_rows = conn.execute(f"""
+            SELECT {period} AS period, SUM(conversations)
+            FROM ConversationActivity WHERE {where}
+            GROUP BY 1 HAVING SUM(conversations) > 0
+        """, params).fetchall()
+    except sqlite3.OperationalError as e:
+        if "no such table" in str(e):
+            # Database imported before the rollups existed
+            return None
+        raise
+
+    periods = {}
+    def entry(key):
+        if key not in periods:
+            periods[key] = {"period": key, "conversations": 0, "messages": 0, "content_chars": 0, "roles": {}}
+        return periods[key]
+
+    for key, role, messages, chars in message_rows:
+        item = entry(key)
+        item["messages"] += messages
+        item["content_chars"] += chars
+        item["roles"][role] = {"messages": messages, "content_chars": chars}
+    for key, conversations in conversation_rows:
+        entry(key)["conversations"] = conversations
+
+    totals = {"conversations": 0, "messages": 0, "content_chars": 0, "roles": {}}
+    for item in periods.values():
+        totals["conversations"] += item["conversations"]
+        totals["messages"] += item["messages"]
+        totals["content_chars"] += item["content_chars"]
+        for role, stats in item["roles"].items():
+            role_totals = totals["roles"].setdefault(role, {"messages": 0, "content_chars": 0})
+            role_totals["messages"] += stats["messages"]
+            role_totals["content_chars"] += stats["content_chars"]
+
+    # Lengths are reported as averages (characters per message)
+    for stats in [*periods.values(), totals]:
+        stats["average_length"] = _average(stats.pop("content_chars"), stats["messages"])
+        for role_stats in stats["roles"].values():
+            role_stats["average_length"] = _average(role_stats.pop("content_chars"), role_stats["messages"])
+    return {"granularity": granularity, "periods": [periods[key] for key in sorted(periods)], "totals": totals}
@@ -4,6 +4,7 @@ import os
 from app.routes import main  # absolute Import
 from .db import get_db_connection
 from .utils import format_timestamp
+from .metrics import init_app
 from flask import request
 
 app = Flask(
@@ -15,6 +16,9 @@ app = Flask(
 # Register the Blueprint
 app.register_blueprint(main)
 
+# Per-request timing, SQL counts and the /metrics histograms
+init_app(app)
+
 @app.context_processor
 def inject_search_params():
     query = request.args.get('query', '')
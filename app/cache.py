@@ -0,0 +1,131 @@
+# app/cache.py
+
+"""
+In-process cache for query results.
+
+The database only changes when something writes to it, almost always the
+importer, so listing pages and searches are cached per process and dropped as
+soon as the data may have changed. A cached result is stale when either:
+
+    - the ingest generation (IngestState, bumped by every import batch) moved, or
+    - PRAGMA data_version on the connection doing the lookup moved since that
+      connection last looked, i.e. some other connection committed a write.
+
+Both checks are a single-row read. Entries also expire after a TTL, and the
+least recently used entry is evicted once the cache is full.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from .db import get_ingest_generation
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL = 300  # seconds
+
+class QueryCache:
+    """
+    An LRU/TTL cache of query results tagged with the data version they were
+    computed at. Cached values are shared between requests and must not be
+    mutated by callers.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._epoch = 0  # bumped on every invalidation
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+    def _check_version(self, conn):
+        """Clears the cache if the data may have changed since it was filled."""
+        generation = get_ingest_generation(conn)
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        # data_version is only comparable on the same connection
+        last_data_version = getattr(conn, "cache_data_version", None)
+        try:
+            conn.cache_data_version = data_version
+        except AttributeError:
+            # Plain sqlite3.Connection; rely on the generation alone
+            pass
+
+        with self._lock:
+            changed = generation != self._generation or (
+                last_data_version is not None and last_data_version != data_version
+            )
+            if changed:
+                if self._generation is not None:
+                    self._stats["invalidations"] += 1
+                self._entries.clear()
+                self._epoch += 1
+                self._generation = generation
+
+    def get_or_compute(self, conn, key, compute):
+        """
+        Returns the cached result for `key`, or calls `compute()` and caches it.
+
+        Args:
+            conn: The connection the result would be read from, used to check
+                the data version.
+            key: A hashable key built from the normalized request parameters.
+            compute: Zero-argument callable producing the result.
+        """
+        self._check_version(conn)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+                self._stats["expired"] += 1
+            self._stats["misses"] += 1
+            epoch = self._epoch
+
+        value = compute()
+
+        with self._lock:
+            # Skip storing if another request invalidated the cache meanwhile
+            if epoch == self._epoch:
+                self._entries[key] = (now, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                max_entries=self.max_entries,
+                ttl=self.ttl,
+                hit_rate=round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                generation=self._generation,
+            )
+
+query_cache = QueryCache()
+
+def cached_query(conn, key, compute):
+    """Shortcut for query_cache.get_or_compute."""
+    return query_cache.get_or_compute(conn, key, compute)
+
+def invalidate_query_cache():
+    """Drops every cached result, e.g. after a write made by this process."""
+    query_cache.clear()
+
+def get_cache_stats():
+    return query_cache.stats()
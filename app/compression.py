@@ -0,0 +1,153 @@
+# app/compression.py
+
+"""
+Optional compressed storage for long message bodies.
+
+With compression enabled (see `set_compress_threshold`), message content
+longer than the threshold is stored in Messages.content as a BLOB: one format
+byte followed by a zlib stream. Shorter bodies stay TEXT, so the column's
+storage type tells the two apart and nothing else in the schema changes.
+
+Python readers pass content through `decode_content`. SQL that needs the
+plain text (the FTS5 sync triggers, summary previews, LIKE fallbacks) calls
+the `inflate_content()` function, which `register_content_functions` adds to
+a connection; the app's pooled connections and the importer register it, and
+so must any other connection that inserts or deletes messages.
+"""
+
+import zlib
+import sqlite3
+
+# Format byte prefixed to every compressed body
+ZLIB_FORMAT = 1
+
+# Threshold used by --compress when none is given, in UTF-8 bytes
+DEFAULT_COMPRESS_THRESHOLD = 1024
+
+COMPRESSION_LEVEL = 6
+
+# Rows rewritten per transaction by the migration
+_MIGRATION_BATCH_SIZE = 2000
+
+# Triggers re-indexing the text of updated content, which the migration
+# leaves unchanged
+_TEXT_UPDATE_TRIGGERS = ("messages_fts_update", "messages_trigram_update", "messages_activity_update")
+
+def compress_content(text, threshold):
+    """
+    Returns `text` compressed to a BLOB if it is longer than `threshold` bytes
+    and compression actually saves space, otherwise `text` unchanged.
+    """
+    if not threshold or not isinstance(text, str):
+        return text
+    data = text.encode("utf-8")
+    if len(data) <= threshold:
+        return text
+    compressed = bytes((ZLIB_FORMAT,)) + zlib.compress(data, COMPRESSION_LEVEL)
+    return compressed if len(compressed) < len(data) else text
+
+def decode_content(value):
+    """Returns the text of a Messages.content value, decompressing BLOBs."""
+    if isinstance(value, bytes):
+        if value[:1] == bytes((ZLIB_FORMAT,)):
+            return zlib.decompress(value[1:]).decode("utf-8")
+        raise ValueError(f"Unknown message content format {value[:1]!r}")
+    return value
+
+def register_content_functions(conn):
+    """Adds inflate_content(content) to `conn`; safe to call more than once."""
+    conn.create_function("inflate_content", 1, decode_content, deterministic=True)
+
+def get_compress_threshold(conn):
+    """The threshold new imports compress at, 0 if compression is off."""
+    try:
+        row = conn.execute("SELECT value FROM IngestState WHERE key = 'compress_threshold'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+def set_compress_threshold(conn, threshold):
+    """Remembers the threshold so later imports keep compressing without the flag."""
+    conn.execute("""
+        INSERT INTO IngestState (key, value) VALUES ('compress_threshold', ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (int(threshold),))
+
+def migrate_message_content(conn, threshold):
+    """
+    Rewrites stored message bodies to match `threshold`: plain TEXT longer
+    than it is compressed and, with threshold 0, every BLOB is decompressed.
+    The search index and activity update triggers are suspended meanwhile,
+    since the text they read does not change. Commits every _MIGRATION_BATCH_SIZE rows.
+
+    Returns:
+        The number of rows rewritten.
+    """
+    register_content_functions(conn)
+    if threshold:
+        select = "SELECT rowid, content FROM Messages WHERE typeof(content) = 'text' AND length(CAST(content AS BLOB)) > ?"
+        params = (threshold,)
+    else:
+        select = "SELECT rowid, content FROM Messages WHERE typeof(content) = 'blob'"
+        params = ()
+
+    placeholders = ", ".join("?" for _ in _TEXT_UPDATE_TRIGGERS)
+    triggers = conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({placeholders})",
+        _TEXT_UPDATE_TRIGGERS,
+    ).fetchall()
+    rewritten = 0
+    last_rowid = -1
+    try:
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        while True:
+            rows = conn.execute(
+                select + " AND rowid > ? ORDER BY rowid LIMIT ?", (*params, last_rowid, _MIGRATION_BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            updates = []
+            for rowid, content in rows:
+                value = compress_content(content, threshold) if threshold else decode_content(content)
+                if value is not content:
+                    updates.append((value, rowid))
+            with conn:
+                conn.executemany("UPDATE Messages SET content = ? WHERE rowid = ?", updates)
+            rewritten += len(updates)
+    finally:
+        if triggers:
+            with conn:
+                for _, sql in triggers:
+                    conn.execute(sql)
+    return rewritten
+
+def storage_report(conn):
+    """
+    Summarizes how message content is stored: counts and bytes of plain and
+    compressed bodies, the uncompressed size of the compressed ones, and the
+    database file's page usage. Reads every message, so it is not cheap.
+    """
+    report = {
+        "messages": 0, "plain_messages": 0, "plain_bytes": 0,
+        "compressed_messages": 0, "compressed_bytes": 0, "compressed_original_bytes": 0,
+    }
+    for value, in conn.execute("SELECT content FROM Messages WHERE content IS NOT NULL"):
+        report["messages"] += 1
+        if isinstance(value, bytes):
+            report["compressed_messages"] += 1
+            report["compressed_bytes"] += len(value)
+            report["compressed_original_bytes"] += len(decode_content(value).encode("utf-8"))
+        else:
+            report["plain_messages"] += 1
+            report["plain_bytes"] += len(value.encode("utf-8"))
+    stored = report["plain_bytes"] + report["compressed_bytes"]
+    original = report["plain_bytes"] + report["compressed_original_bytes"]
+    report["content_ratio"] = round(stored / original, 3) if original else 1.0
+
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    report["file_bytes"] = page_size * conn.execute("PRAGMA page_count").fetchone()[0]
+    report["free_bytes"] = page_size * conn.execute("PRAGMA freelist_count").fetchone()[0]
+    report["compress_threshold"] = get_compress_threshold(conn)
+    return report
@@ -1,9 +1,236 @@
 # app/db.py
 import sqlite3
 import os
+import threading
+import time
 
-def get_db_connection():
-    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'GPT_conversations_database.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+from .compression import register_content_functions
+from .metrics import note_sql_statement, note_sql_time
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'GPT_conversations_database.db')
+
+# Applied to every pooled connection, in this order. journal_mode=WAL lets
+# readers run while the importer writes; the rest keep hot pages in memory.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "busy_timeout": 5000,
+    "synchronous": "NORMAL",
+    "cache_size": -65536,         # KiB, i.e. 64 MiB per connection
+    "mmap_size": 268435456,       # 256 MiB
+    "temp_store": "MEMORY",
+}
+
+# Extra PRAGMAs for connections handed out with readonly=True
+READER_PRAGMAS = {"query_only": "ON"}
+
+# Prepared statements kept per connection by the sqlite3 module
+STATEMENT_CACHE_SIZE = 256
+
+# Idle connections kept per pool; more are opened under load and closed on release
+MAX_IDLE_CONNECTIONS = 8
+
+# Ids bound per IN (...) lookup; SQLite's historical default limit on bound
+# parameters is 999
+ID_CHUNK_SIZE = 500
+
+_config = {
+    "db_path": os.environ.get("CONVERSATIONS_DB_PATH", DEFAULT_DB_PATH),
+    "pragmas": dict(DEFAULT_PRAGMAS),
+}
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _timed(method):
+    """Adds the time spent in a cursor method to the current request's SQL time."""
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            note_sql_time(time.perf_counter() - start)
+    wrapper.__name__ = method.__name__
+    return wrapper
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor whose execute and fetch calls are timed for app/metrics.py."""
+
+    execute = _timed(sqlite3.Cursor.execute)
+    executemany = _timed(sqlite3.Cursor.executemany)
+    fetchone = _timed(sqlite3.Cursor.fetchone)
+    fetchmany = _timed(sqlite3.Cursor.fetchmany)
+    fetchall = _timed(sqlite3.Cursor.fetchall)
+    __next__ = _timed(sqlite3.Cursor.__next__)
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection whose close() hands it back to its pool instead of closing it.
+    Statements run through it are counted and timed for the request metrics.
+    """
+
+    pool = None
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def close_for_real(self):
+        self.pool = None
+        super().close()
+
+class ConnectionPool:
+    """
+    Keeps tuned SQLite connections alive between requests.
+
+    A connection is used by one thread at a time but may move between threads
+    (Werkzeug serves each request on a new thread), so connections are opened
+    with check_same_thread=False. The pool belongs to the process that created
+    it; a forked worker starts with a fresh one.
+    """
+
+    def __init__(self, db_path, pragmas, readonly=False, max_idle=MAX_IDLE_CONNECTIONS):
+        self.db_path = db_path
+        self.pragmas = dict(pragmas, **READER_PRAGMAS) if readonly else dict(pragmas)
+        self.readonly = readonly
+        self.max_idle = max_idle
+        self.pid = os.getpid()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "reused": 0, "released": 0, "closed": 0, "in_use": 0}
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            factory=PooledConnection,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        register_content_functions(conn)
+        conn.set_trace_callback(note_sql_statement)
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self._stats["reused" if conn else "opened"] += 1
+            self._stats["in_use"] += 1
+        if conn is None:
+            conn = self._open()
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._stats["released"] += 1
+            self._stats["in_use"] -= 1
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._stats["closed"] += 1
+        conn.close_for_real()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._stats["closed"] += len(idle)
+        for conn in idle:
+            conn.close_for_real()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle), readonly=self.readonly)
+
+def configure_database(db_path=None, **pragmas):
+    """
+    Points the app at another database file and/or overrides PRAGMAs
+    (e.g. configure_database(mmap_size=0)). Existing pools are closed.
+    """
+    with _pools_lock:
+        if db_path is not None:
+            _config["db_path"] = db_path
+        _config["pragmas"].update(pragmas)
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+def get_database_path():
+    return _config["db_path"]
+
+def _get_pool(readonly):
+    with _pools_lock:
+        pool = _pools.get(readonly)
+        if pool is None or pool.pid != os.getpid():
+            pool = ConnectionPool(_config["db_path"], _config["pragmas"], readonly=readonly)
+            _pools[readonly] = pool
+        return pool
+
+def get_db_connection(readonly=True):
+    """
+    Returns a pooled connection with sqlite3.Row rows. Closing it (directly or
+    via contextlib.closing) returns it to the pool.
+
+    Args:
+        readonly: Hand out a connection with PRAGMA query_only set. Routes that
+            write must pass readonly=False.
+    """
+    return _get_pool(readonly).acquire()
+
+def get_pool_stats():
+    """Returns open/reuse counters for the reader and writer pools."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {
+        "db_path": _config["db_path"],
+        "pragmas": dict(_config["pragmas"]),
+        "statement_cache_size": STATEMENT_CACHE_SIZE,
+        "pools": {"reader" if readonly else "writer": pool.stats() for readonly, pool in pools.items()},
+    }
+
+def ensure_ingest_state(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS IngestState (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+def get_ingest_generation(conn):
+    """
+    Returns a counter the importer bumps on every committed write, so anything
+    derived from the data (cached counts, query results) can tell it is stale.
+    """
+    try:
+        row = conn.execute("SELECT value FROM IngestState WHERE key = 'generation'").fetchone()
+    except sqlite3.OperationalError:
+        # Database imported before the counter existed
+        return 0
+    return row[0] if row else 0
+
+def bump_ingest_generation(conn):
+    conn.execute("""
+        INSERT INTO IngestState (key, value) VALUES ('generation', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    """)
+
+def iter_id_chunks(ids, size=ID_CHUNK_SIZE):
+    """
+    Splits `ids` into lists of at most `size` for IN (...) lookups.
+
+    Yields:
+        (chunk, placeholders) pairs, `placeholders` being "?, ?, ..." for the chunk.
+    """
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        chunk = ids[start:start + size]
+        yield chunk, ", ".join("?" for _ in chunk)
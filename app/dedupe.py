@@ -0,0 +1,388 @@
+# app/dedupe.py
+
+"""
+Near-duplicate conversation detection across overlapping exports.
+
+Every export repeats most of the previous one, and a conversation that comes
+back under a new ID (or with a message edited or appended) would otherwise be
+stored once per export. After each import the conversations that are new or
+changed are fingerprinted with MinHash over the set of their message texts,
+and looked up in an LSH index (ConversationLSH: BANDS bands of ROWS_PER_BAND
+hashes each) so only conversations sharing a band are compared, never the
+whole archive. A candidate is accepted when the exact Jaccard similarity of
+the two message sets reaches the threshold.
+
+The newer conversation of a pair (by update_time) is kept as the canonical
+one. The older is either linked to it as a version (ConversationVersions,
+action 'linked'; nothing is deleted) or merged into it (action 'merged').
+A merge deletes the older copy's messages whose text the canonical one
+already has, moving their feedback to the matching message, and moves the
+rest into the canonical conversation, grafted under the matching parent.
+Its model comparisons move too and its row is deleted. Merged IDs keep
+their IngestManifest row, so incremental re-imports skip them.
+"""
+
+import re
+import random
+import struct
+import sqlite3
+import hashlib
+from datetime import datetime
+
+from .compression import decode_content, register_content_functions
+from .db import bump_ingest_generation, ensure_ingest_state
+from .summary import refresh_conversation_summaries
+from .threads import refresh_thread_layout
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_HASHES // BANDS
+
+DEFAULT_THRESHOLD = 0.8
+
+# Conversations with fewer distinct messages than this are fingerprinted but
+# never matched: two short chats easily share most of their messages.
+MIN_SHINGLES = 4
+
+DEDUPE_MODES = ("link", "merge", "off")
+
+# Conversations fingerprinted per transaction
+_CHUNK_SIZE = 500
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101)
+_HASH_PARAMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+_SIGNATURE = struct.Struct(f"<{NUM_HASHES}Q")
+_WHITESPACE = re.compile(r"\s+")
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS ConversationFingerprints (
+        conversation_id TEXT PRIMARY KEY,
+        content_hash TEXT,
+        shingle_count INTEGER NOT NULL,
+        signature BLOB NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ConversationLSH (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        conversation_id TEXT NOT NULL,
+        PRIMARY KEY (band, bucket, conversation_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_conversation_lsh_conversation_id ON ConversationLSH (conversation_id)",
+    """
+    CREATE TABLE IF NOT EXISTS ConversationVersions (
+        conversation_id TEXT PRIMARY KEY,
+        canonical_id TEXT NOT NULL,
+        similarity REAL,
+        action TEXT NOT NULL,
+        message_count INTEGER,
+        content_bytes INTEGER,
+        detected_at TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_conversation_versions_canonical_id ON ConversationVersions (canonical_id)",
+]
+
+def ensure_dedupe_tables(conn):
+    for statement in _SCHEMA:
+        conn.execute(statement)
+
+def shingle(text):
+    """Hashes one message's normalized text to an integer below the MinHash prime."""
+    normalized = _WHITESPACE.sub(" ", text.strip().lower())
+    return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little") % _PRIME
+
+def conversation_shingles(conn, conversation_id):
+    """The set of hashed message texts of a conversation, all branches included."""
+    texts = (
+        decode_content(row[0])
+        for row in conn.execute(
+            "SELECT content FROM Messages WHERE conversation_id = ? AND content IS NOT NULL AND content != ''",
+            (conversation_id,),
+        )
+    )
+    return {shingle(text) for text in texts if text.strip()}
+
+def minhash(shingles):
+    """Returns the NUM_HASHES minimums of (a * x + b) mod p over `shingles`."""
+    return [min((a * x + b) % _PRIME for x in shingles) for a, b in _HASH_PARAMS]
+
+def band_buckets(signature):
+    """One bucket key (a signed 64-bit integer) per LSH band of `signature`."""
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f"<{ROWS_PER_BAND}Q", *rows), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, "little", signed=True))
+    return buckets
+
+def estimate_similarity(first, second):
+    return sum(a == b for a, b in zip(first, second)) / NUM_HASHES
+
+def _find_candidate(conn, conversation_id, signature, shingles, threshold):
+    """Returns (candidate_id, similarity) for the most similar indexed conversation, or None."""
+    candidates = set()
+    for band, bucket in enumerate(band_buckets(signature)):
+        candidates.update(
+            row[0] for row in conn.execute(
+                "SELECT conversation_id FROM ConversationLSH WHERE band = ? AND bucket = ?", (band, bucket)
+            )
+        )
+    candidates.discard(conversation_id)
+
+    best = None
+    for candidate in candidates:
+        row = conn.execute(
+            "SELECT signature FROM ConversationFingerprints WHERE conversation_id = ?", (candidate,)
+        ).fetchone()
+        # The estimate has a standard error of about 0.06 at 64 hashes
+        if row is None or estimate_similarity(signature, _SIGNATURE.unpack(row[0])) < threshold - 0.15:
+            continue
+        other = conversation_shingles(conn, candidate)
+        similarity = len(shingles & other) / len(shingles | other)
+        if similarity >= threshold and (best is None or similarity > best[1]):
+            best = (candidate, similarity)
+    return best
+
+def _unindex(conn, conversation_id):
+    conn.execute("DELETE FROM ConversationLSH WHERE conversation_id = ?", (conversation_id,))
+
+def _content_size(conn, conversation_id):
+    return conn.execute(
+        "SELECT COUNT(*), IFNULL(SUM(length(CAST(content AS BLOB))), 0) FROM Messages WHERE conversation_id = ?",
+        (conversation_id,),
+    ).fetchone()
+
+def _merge_messages(conn, older, newer):
+    """
+    Moves the messages of `older` that `newer` does not have into `newer` and
+    deletes the rest, along with their feedback or moving it to the message
+    with the same text. Messages without text are dropped unless a moved
+    message descends from them.
+
+    Returns:
+        The number of messages moved.
+    """
+    canonical = {}
+    for message_id, content in conn.execute(
+        "SELECT message_id, content FROM Messages WHERE conversation_id = ? ORDER BY create_time, message_id",
+        (newer,),
+    ):
+        text = decode_content(content) or ""
+        if text.strip():
+            canonical.setdefault(shingle(text), message_id)
+
+    parents, duplicates, moved = {}, {}, []
+    for message_id, parent_id, content in conn.execute(
+        "SELECT message_id, parent_id, content FROM Messages WHERE conversation_id = ?", (older,)
+    ):
+        parents[message_id] = parent_id
+        text = decode_content(content) or ""
+        if not text.strip():
+            continue
+        match = canonical.get(shingle(text))
+        if match is None:
+            moved.append(message_id)
+        else:
+            duplicates[message_id] = match
+
+    kept = set(moved)
+    def graft_point(parent_id):
+        # Nearest ancestor that stays: a moved message, or the canonical copy of a duplicate
+        seen = set()
+        while parent_id in parents and parent_id not in kept and parent_id not in duplicates and parent_id not in seen:
+            seen.add(parent_id)
+            parent_id = parents[parent_id]
+        return duplicates.get(parent_id, parent_id) if parent_id in parents else None
+
+    conn.executemany(
+        "UPDATE Messages SET conversation_id = ?, parent_id = ? WHERE message_id = ?",
+        [(newer, graft_point(parents[message_id]), message_id) for message_id in moved],
+    )
+    conn.executemany(
+        "UPDATE MessageFeedback SET message_id = ? WHERE message_id = ?",
+        [(match, message_id) for message_id, match in duplicates.items()],
+    )
+    conn.execute(
+        "DELETE FROM MessageFeedback WHERE message_id IN (SELECT message_id FROM Messages WHERE conversation_id = ?)",
+        (older,),
+    )
+    if moved:
+        refresh_thread_layout(conn, [newer])
+    return len(moved)
+
+def _record_version(conn, older, newer, similarity, mode, stats):
+    message_count, content_bytes = _content_size(conn, older)
+    _unindex(conn, older)
+    # Keep versions one level deep: whatever pointed at `older` now points at `newer`
+    conn.execute("UPDATE ConversationVersions SET canonical_id = ? WHERE canonical_id = ?", (newer, older))
+    if mode == "merge":
+        stats["messages_moved"] += _merge_messages(conn, older, newer)
+        removed_count, removed_bytes = _content_size(conn, older)
+        conn.execute("DELETE FROM Messages WHERE conversation_id = ?", (older,))
+        conn.execute("UPDATE ModelComparisons SET conversation_id = ? WHERE conversation_id = ?", (newer, older))
+        conn.execute("DELETE FROM Conversations WHERE conversation_id = ?", (older,))
+        conn.execute("DELETE FROM ConversationSummary WHERE conversation_id = ?", (older,))
+        conn.execute("DELETE FROM ConversationFingerprints WHERE conversation_id = ?", (older,))
+        stats["merged"] += 1
+        stats["messages_removed"] += removed_count
+        stats["bytes_saved"] += removed_bytes
+    else:
+        stats["linked"] += 1
+        stats["bytes_reclaimable"] += content_bytes
+    conn.execute(
+        "INSERT OR REPLACE INTO ConversationVersions VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            older, newer, round(similarity, 4), "merged" if mode == "merge" else "linked",
+            message_count, content_bytes, datetime.now().isoformat(timespec="seconds"),
+        ),
+    )
+
+def _stale_conversations(conn):
+    """Conversations never fingerprinted, or re-imported with different content since."""
+    return conn.execute("""
+        SELECT c.conversation_id, c.update_time, m.content_hash
+        FROM Conversations c
+        LEFT JOIN IngestManifest m ON m.conversation_id = c.conversation_id
+        LEFT JOIN ConversationFingerprints f ON f.conversation_id = c.conversation_id
+        WHERE f.conversation_id IS NULL OR f.content_hash IS NOT m.content_hash
+        ORDER BY c.update_time, c.conversation_id
+    """).fetchall()
+
+def deduplicate_conversations(conn, mode="link", threshold=DEFAULT_THRESHOLD):
+    """
+    Fingerprints new and changed conversations and links or merges the
+    near-duplicates found, committing every _CHUNK_SIZE conversations.
+
+    Args:
+        conn: A plain sqlite3 connection to the ingest database.
+        mode: 'link' to record versions, 'merge' to fold the older copy into the newer.
+        threshold: Minimum Jaccard similarity of the two message sets.
+
+    Returns:
+        A report dict: conversations fingerprinted, duplicates found, how many
+        were linked or merged, messages removed and moved by merges, content
+        bytes removed by merges and content bytes held by linked versions.
+    """
+    if mode not in ("link", "merge"):
+        raise ValueError(f"mode must be 'link' or 'merge', not {mode!r}")
+    ensure_dedupe_tables(conn)
+    ensure_ingest_state(conn)
+    # Merges delete messages, which fires triggers that call inflate_content()
+    register_content_functions(conn)
+
+    stats = {
+        "fingerprinted": 0, "duplicates": 0, "linked": 0, "merged": 0,
+        "messages_removed": 0, "messages_moved": 0, "bytes_saved": 0, "bytes_reclaimable": 0,
+    }
+    stale = _stale_conversations(conn)
+    for start in range(0, len(stale), _CHUNK_SIZE):
+        touched = set()
+        with conn:
+            for conversation_id, update_time, content_hash in stale[start:start + _CHUNK_SIZE]:
+                if conn.execute(
+                    "SELECT 1 FROM Conversations WHERE conversation_id = ?", (conversation_id,)
+                ).fetchone() is None:
+                    # Merged away earlier in this run
+                    continue
+                shingles = conversation_shingles(conn, conversation_id)
+                signature = minhash(shingles) if shingles else [_PRIME] * NUM_HASHES
+                _unindex(conn, conversation_id)
+                conn.execute("DELETE FROM ConversationVersions WHERE conversation_id = ?", (conversation_id,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO ConversationFingerprints VALUES (?, ?, ?, ?)",
+                    (conversation_id, content_hash, len(shingles), _SIGNATURE.pack(*signature)),
+                )
+                stats["fingerprinted"] += 1
+                if len(shingles) < MIN_SHINGLES:
+                    continue
+
+                match = _find_candidate(conn, conversation_id, signature, shingles, threshold)
+                if match is not None:
+                    stats["duplicates"] += 1
+                    candidate, similarity = match
+                    candidate_time = conn.execute(
+                        "SELECT update_time FROM Conversations WHERE conversation_id = ?", (candidate,)
+                    ).fetchone()[0]
+                    # Ties keep the conversation that was already indexed
+                    if (update_time or 0) > (candidate_time or 0):
+                        older, newer = candidate, conversation_id
+                    else:
+                        older, newer = conversation_id, candidate
+                    _record_version(conn, older, newer, similarity, mode, stats)
+                    touched.update((older, newer))
+                    if older == conversation_id:
+                        continue
+
+                conn.executemany(
+                    "INSERT OR IGNORE INTO ConversationLSH VALUES (?, ?, ?)",
+                    [(band, bucket, conversation_id) for band, bucket in enumerate(band_buckets(signature))],
+                )
+            if touched:
+                if mode == "merge":
+                    refresh_conversation_summaries(conn, touched)
+                bump_ingest_generation(conn)
+    return stats
+
+def fetch_conversation_versions(conn, conversation_id):
+    """
+    Returns the known versions of a conversation: the older copies linked or
+    merged into it and, if it is itself an older copy, its canonical
+    conversation (with action 'canonical').
+    """
+    try:
+        versions = [dict(row) for row in conn.execute(
+            """
+            SELECT conversation_id, canonical_id, similarity, action, message_count, detected_at
+            FROM ConversationVersions WHERE canonical_id = ? ORDER BY detected_at
+            """,
+            (conversation_id,),
+        )]
+        canonical = conn.execute(
+            "SELECT canonical_id, similarity FROM ConversationVersions WHERE conversation_id = ?",
+            (conversation_id,),
+        ).fetchone()
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        # Database imported before deduplication existed
+        return []
+    if canonical is not None:
+        versions.insert(0, {
+            "conversation_id": canonical[0], "canonical_id": canonical[0], "similarity": canonical[1],
+            "action": "canonical", "message_count": None, "detected_at": None,
+        })
+    return versions
+
+def resolve_merged_conversation(conn, conversation_id):
+    """Returns the conversation a merged-away ID was merged into, or None."""
+    try:
+        row = conn.execute(
+            "SELECT canonical_id FROM ConversationVersions WHERE conversation_id = ? AND action = 'merged'",
+            (conversation_id,),
+        ).fetchone()
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        return None
+    return row[0] if row else None
+
+def get_dedupe_report(conn):
+    """Totals over ConversationVersions: versions linked or merged and the content bytes involved."""
+    try:
+        rows = conn.execute("""
+            SELECT action, COUNT(*), IFNULL(SUM(message_count), 0), IFNULL(SUM(content_bytes), 0)
+            FROM ConversationVersions GROUP BY action
+        """).fetchall()
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        rows = []
+    report = {action: {"conversations": 0, "messages": 0, "content_bytes": 0} for action in ("linked", "merged")}
+    for action, conversations, messages, content_bytes in rows:
+        report[action] = {"conversations": conversations, "messages": messages, "content_bytes": content_bytes}
+    return report
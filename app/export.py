@@ -0,0 +1,136 @@
+# app/export.py
+
+"""
+Streaming exports built on the Messages table.
+
+Every exporter is a generator: messages are read page by page with the same
+keyset query the conversation view uses and output is yielded as soon as it
+is produced, so memory stays bounded however long a conversation, or however
+large the archive, is. The routes hand these generators to Flask as streamed
+responses and export_conversations.py writes them to files.
+"""
+
+import io
+import json
+import re
+import zipfile
+
+from .compression import decode_content
+from .db import iter_id_chunks
+from .threads import fetch_message_page
+from .utils import format_timestamp
+
+# Messages read per query while exporting
+EXPORT_PAGE_SIZE = 500
+
+EXPORT_FORMATS = ("ndjson", "zip")
+
+def iter_conversations(conn, where="1=1", params=(), conversation_ids=None):
+    """
+    Yields Conversations rows matching `where`, oldest first, optionally
+    restricted to a list of ids (looked up in chunks).
+    """
+    sql = f"SELECT * FROM Conversations WHERE {where}"
+    if conversation_ids is None:
+        yield from conn.execute(sql + " ORDER BY create_time, conversation_id", params)
+        return
+
+    for chunk, placeholders in iter_id_chunks(dict.fromkeys(conversation_ids)):
+        yield from conn.execute(
+            sql + f" AND conversation_id IN ({placeholders}) ORDER BY create_time, conversation_id",
+            [*params, *chunk],
+        )
+
+def iter_messages(conn, conversation_id, all_branches=False, page_size=EXPORT_PAGE_SIZE):
+    """Yields a conversation's messages in thread order, one page in memory at a time."""
+    after = None
+    while True:
+        rows, after = fetch_message_page(conn, conversation_id, after, page_size, all_branches)
+        yield from rows
+        if after is None:
+            return
+
+def export_message(msg):
+    return {
+        "message_id": msg["message_id"],
+        "parent_id": msg["parent_id"],
+        "author_role": msg["author_role"] or "unknown",
+        "content": decode_content(msg["content"]),
+        "timestamp": format_timestamp(msg["create_time"]),
+    }
+
+def iter_conversation_json(conn, conversation_row, all_branches=False):
+    """
+    Yields a conversation as one compact JSON document, in pieces. The
+    document has no raw newlines, so it doubles as an NDJSON line.
+    """
+    header = json.dumps({
+        "conversation_id": conversation_row["conversation_id"],
+        "title": conversation_row["title"] or "No Title",
+        "create_time": format_timestamp(conversation_row["create_time"]),
+        "update_time": format_timestamp(conversation_row["update_time"]),
+    })
+    yield header[:-1] + ', "messages": ['
+    separator = ""
+    for msg in iter_messages(conn, conversation_row["conversation_id"], all_branches):
+        yield separator + json.dumps(export_message(msg))
+        separator = ", "
+    yield "]}"
+
+def iter_export_messages(conn, conversation_id, all_branches=False):
+    """Yields template-ready message dicts for the HTML export."""
+    for msg in iter_messages(conn, conversation_id, all_branches):
+        message = export_message(msg)
+        yield dict(message, content=message["content"] or "")
+
+def iter_ndjson(conn, conversation_rows, all_branches=False):
+    """Yields one JSON line per conversation."""
+    for conversation_row in conversation_rows:
+        yield from iter_conversation_json(conn, conversation_row, all_branches)
+        yield "\n"
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only sink that zipfile writes into and the generator drains."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def archive_name(conversation_id, extension="json"):
+    """A file name for a conversation's export, safe in archives and Content-Disposition."""
+    return "conversation_" + re.sub(r"[^\w.-]", "_", conversation_id or "unknown") + "." + extension
+
+def iter_zip(conn, conversation_rows, all_branches=False):
+    """
+    Yields a zip archive with one JSON file per conversation. The archive is
+    written without seeking (sizes go in data descriptors), so each chunk can
+    be sent as soon as it is compressed.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for conversation_row in conversation_rows:
+            name = archive_name(conversation_row["conversation_id"])
+            with archive.open(name, mode="w", force_zip64=True) as entry:
+                for piece in iter_conversation_json(conn, conversation_row, all_branches):
+                    entry.write(piece.encode("utf-8"))
+                    data = buffer.drain()
+                    if data:
+                        yield data
+    # Remaining compressed data plus the central directory
+    yield buffer.drain()
@@ -1,32 +1,55 @@
 # app/helpers.py
 
+from .db import iter_id_chunks
+
+def _fetch_grouped(conn, sql, key, ids):
+    """
+    Runs `sql` (with an `{ids}` placeholder list) once per chunk of ids and
+    groups the resulting rows by `key`.
+
+    Returns:
+        A dict mapping every requested id to a list of row dicts (empty if none).
+    """
+    ids = list(dict.fromkeys(i for i in ids if i is not None))
+    grouped = {i: [] for i in ids}
+    for chunk, placeholders in iter_id_chunks(ids):
+        for row in conn.execute(sql.format(ids=placeholders), chunk):
+            grouped[row[key]].append(dict(row))
+    return grouped
+
 def fetch_feedback(conn, message_ids):
-    feedback_data = []
-    for message_id in message_ids:
-        feedback = conn.execute(
-            "SELECT * FROM Feedback WHERE message_id = ?", (message_id,)
-        ).fetchall()
-        for fb in feedback:
-            feedback_data.append({
-                "feedback_id": fb["feedback_id"],
-                "message_id": fb["message_id"],
-                "feedback_type": fb["feedback_type"],
-                "feedback_content": fb["feedback_content"]
-            })
-    return feedback_data
+    """
+    Fetches MessageFeedback for many messages in a few IN (...) queries.
+
+    Returns:
+        A dict mapping each message_id to its feedback entries.
+    """
+    return _fetch_grouped(
+        conn,
+        """
+        SELECT feedback_id, message_id, feedback_type, feedback_content
+        FROM MessageFeedback WHERE message_id IN ({ids})
+        ORDER BY message_id, feedback_id
+        """,
+        "message_id",
+        message_ids,
+    )
+
+def fetch_model_comparisons(conn, conversation_ids):
+    """
+    Fetches ModelComparisons for many conversations in a few IN (...) queries.
+    Comparisons are recorded per conversation in the export, not per message.
 
-def fetch_model_comparisons(conn, message_ids):
-    model_comparisons = []
-    for message_id in message_ids:
-        comparisons = conn.execute(
-            "SELECT * FROM ModelComparisons WHERE message_id = ?", (message_id,)
-        ).fetchall()
-        for comp in comparisons:
-            model_comparisons.append({
-                "comparison_id": comp["comparison_id"],
-                "message_id": comp["message_id"],
-                "model_name": comp["model_name"],
-                "response_time": comp["response_time"],
-                "comparison_data": comp["comparison_data"]
-            })
-    return model_comparisons
+    Returns:
+        A dict mapping each conversation_id to its comparisons.
+    """
+    return _fetch_grouped(
+        conn,
+        """
+        SELECT comparison_id, conversation_id, criteria, results
+        FROM ModelComparisons WHERE conversation_id IN ({ids})
+        ORDER BY conversation_id, comparison_id
+        """,
+        "conversation_id",
+        conversation_ids,
+    )
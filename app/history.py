@@ -0,0 +1,254 @@
+# app/history.py
+
+"""
+Append-only search history.
+
+Searches are queued in memory and written by a background thread in batched
+transactions to a small SQLite store of its own (data/search_history.db), so
+logging never waits on disk on the search path and never touches the
+conversations database. The store keeps:
+
+    SearchHistory  one row per search, trimmed to the newest MAX_HISTORY_ROWS
+    QueryStats     running count and last use per normalized query
+
+Recent searches come from the end of the rowid B-tree and top queries from an
+index on the count, so both are a short index walk however long the history.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+HISTORY_DB_PATH = os.environ.get("SEARCH_HISTORY_DB_PATH", os.path.join(DATA_DIR, 'search_history.db'))
+
+# Pre-SQLite history file, imported once into an empty store
+LEGACY_HISTORY_PATH = os.path.join(DATA_DIR, 'search_history.json')
+
+# Rows kept in SearchHistory; QueryStats keeps counting past the trim
+MAX_HISTORY_ROWS = 10000
+
+# Searches waiting for the writer; past this, new entries are dropped rather
+# than slowing the request down
+MAX_PENDING = 10000
+
+# Entries written per transaction
+WRITE_BATCH_SIZE = 200
+
+_HISTORY_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS SearchHistory (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        query TEXT NOT NULL,
+        normalized_query TEXT NOT NULL,
+        start_date TEXT,
+        end_date TEXT,
+        result_count INTEGER,
+        searched_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS QueryStats (
+        normalized_query TEXT PRIMARY KEY,
+        query TEXT NOT NULL,
+        search_count INTEGER NOT NULL,
+        last_searched REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_query_stats_count ON QueryStats (search_count, last_searched)",
+]
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive key used to aggregate queries."""
+    return " ".join((query or "").lower().split())
+
+def _connect(db_path):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+def _read_legacy_history(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            text = file.read()
+        entries = json.loads(text) if text.strip() else []
+    except (OSError, ValueError) as e:
+        logging.warning("Could not import legacy search history: %s", e)
+        return []
+    if not isinstance(entries, list):
+        return []
+
+    rows = []
+    for entry in entries[-MAX_HISTORY_ROWS:]:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            searched_at = time.mktime(time.strptime(entry["timestamp"], '%Y-%m-%d %H:%M:%S'))
+        except (KeyError, TypeError, ValueError):
+            searched_at = time.time()
+        rows.append((str(entry.get("query") or ""), entry.get("start_date"), entry.get("end_date"), None, searched_at))
+    return rows
+
+def ensure_history_store(conn, legacy_path=LEGACY_HISTORY_PATH):
+    """Creates the history tables, importing the old JSON history into an empty store."""
+    with conn:
+        for statement in _HISTORY_SCHEMA:
+            conn.execute(statement)
+        if conn.execute("SELECT 1 FROM SearchHistory LIMIT 1").fetchone() is None and os.path.exists(legacy_path):
+            _write_entries(conn, _read_legacy_history(legacy_path))
+
+def _write_entries(conn, entries):
+    """Appends (query, start_date, end_date, result_count, searched_at) rows and updates the stats."""
+    entries = [entry for entry in entries if entry[0].strip()]
+    if not entries:
+        return
+    conn.executemany(
+        """
+        INSERT INTO SearchHistory (query, normalized_query, start_date, end_date, result_count, searched_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        [(query, normalize_query(query), *rest) for query, *rest in entries],
+    )
+    conn.executemany(
+        """
+        INSERT INTO QueryStats (normalized_query, query, search_count, last_searched)
+        VALUES (?, ?, 1, ?)
+        ON CONFLICT(normalized_query) DO UPDATE SET
+            query = excluded.query,
+            search_count = search_count + 1,
+            last_searched = MAX(last_searched, excluded.last_searched)
+        """,
+        [(normalize_query(query), query.strip(), searched_at) for query, _, _, _, searched_at in entries],
+    )
+    conn.execute(
+        "DELETE FROM SearchHistory WHERE id <= (SELECT MAX(id) FROM SearchHistory) - ?",
+        (MAX_HISTORY_ROWS,),
+    )
+
+class SearchHistoryWriter:
+    """
+    Owns the write connection and a daemon thread that drains the queue in
+    batches. Started lazily, and again in a forked child.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or HISTORY_DB_PATH
+        self.pid = os.getpid()
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=MAX_PENDING)
+        self._thread = threading.Thread(target=self._run, name="search-history-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, entry):
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Blocks until every queued entry has been written."""
+        self._queue.join()
+
+    def _run(self):
+        try:
+            conn = _connect(self.db_path)
+            ensure_history_store(conn)
+        except (OSError, sqlite3.Error):
+            logging.exception("Search history disabled")
+            conn = None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if conn is None:
+                self.dropped += len(batch)
+                for _ in batch:
+                    self._queue.task_done()
+                continue
+            try:
+                with conn:
+                    _write_entries(conn, batch)
+                self.written += len(batch)
+            except sqlite3.Error:
+                logging.exception("Error writing search history")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def _get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.pid != os.getpid():
+            _writer = SearchHistoryWriter()
+        return _writer
+
+def log_search(query, start_date='', end_date='', result_count=None):
+    """Queues a search for the history store and returns immediately."""
+    if not (query or "").strip():
+        return
+    _get_writer().submit((query, start_date, end_date, result_count, time.time()))
+
+def flush_search_history():
+    """Waits for queued searches to be written (used at exit and by scripts)."""
+    with _writer_lock:
+        writer = _writer
+    if writer is not None and writer.pid == os.getpid():
+        writer.flush()
+
+atexit.register(flush_search_history)
+
+def _read(sql, params):
+    if not os.path.exists(HISTORY_DB_PATH):
+        return []
+    conn = sqlite3.connect(f"file:{HISTORY_DB_PATH}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in conn.execute(sql, params)]
+    except sqlite3.OperationalError:
+        # Store created but the writer has not made the tables yet
+        return []
+    finally:
+        conn.close()
+
+def get_recent_searches(limit=5):
+    """Returns the newest `limit` searches, newest first."""
+    return [
+        dict(row, timestamp=time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row["searched_at"])))
+        for row in _read(
+            "SELECT query, start_date, end_date, result_count, searched_at "
+            "FROM SearchHistory ORDER BY id DESC LIMIT ?",
+            (limit,),
+        )
+    ]
+
+def get_top_queries(limit=10):
+    """Returns the most frequent queries with their counts, most searched first."""
+    return _read(
+        "SELECT query, search_count, last_searched FROM QueryStats "
+        "ORDER BY search_count DESC, last_searched DESC LIMIT ?",
+        (limit,),
+    )
+
+def get_history_stats():
+    """Writer counters for the current process."""
+    with _writer_lock:
+        writer = _writer
+    if writer is None:
+        return {"written": 0, "dropped": 0, "pending": 0}
+    return {"written": writer.written, "dropped": writer.dropped, "pending": writer._queue.qsize()}
@@ -0,0 +1,224 @@
+# app/metrics.py
+
+"""
+Per-request timing and SQL instrumentation, exported in Prometheus text format.
+
+For every request the middleware records, per endpoint:
+
+    wall time          before_request -> after_request
+    SQL statements     counted by the sqlite3 trace callback on pooled connections
+    SQL time           time spent inside execute/fetch calls on pooled connections
+    render time        time spent rendering Jinja templates
+    response size      body bytes (streamed responses are not sized)
+
+Each is aggregated into a histogram and served with the connection pool and
+query cache counters at /metrics. A jump in the SQL statement histogram of an
+endpoint is how an N+1 query regression shows up.
+"""
+
+import contextvars
+import threading
+import time
+
+import jinja2
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+class RequestStats:
+    """Counters for the request being handled in the current context."""
+
+    __slots__ = ("start", "sql_statements", "sql_seconds", "render_seconds")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+def current_request_stats():
+    return _current.get()
+
+def note_sql_statement(statement):
+    """
+    sqlite3 trace callback: counts the statements run for the current request.
+    Statements SQLite runs on its own behalf (triggers, FTS5 shadow-table
+    lookups) are traced as "-- ..." and not counted.
+    """
+    stats = _current.get()
+    if stats is not None and not statement.startswith("--"):
+        stats.sql_statements += 1
+
+def note_sql_time(seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_seconds += seconds
+
+class TimedTemplate(jinja2.Template):
+    """Template class that adds its render time to the current request's stats."""
+
+    def render(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return super().render(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            stats.render_seconds += time.perf_counter() - start
+
+class Histogram:
+    """A Prometheus-style cumulative histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, documentation, label_names, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            label_text = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text}{"," if label_text else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text}{"," if label_text else ""}le="+Inf"}} {count}')
+            lines.append(f"{_sample(self.name + '_sum', label_text)} {total}")
+            lines.append(f"{_sample(self.name + '_count', label_text)} {count}")
+        return lines
+
+class Counter:
+    def __init__(self, name, documentation, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{_sample(self.name, _labels(self.label_names, labels))} {value}")
+        return lines
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+def _sample(name, label_text):
+    return f"{name}{{{label_text}}}" if label_text else name
+
+def _gauges(name, documentation, samples, metric_type="gauge"):
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    for label_names, label_values, value in samples:
+        lines.append(f"{_sample(name, _labels(label_names, label_values))} {value}")
+    return lines
+
+REQUESTS = Counter("http_requests_total", "Requests handled.", ("endpoint", "method", "status"))
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Wall time per request.", ("endpoint", "method"), DURATION_BUCKETS
+)
+SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements run per request.", ("endpoint",), STATEMENT_BUCKETS
+)
+SQL_SECONDS = Histogram(
+    "http_request_sql_duration_seconds", "Time spent in SQLite per request.", ("endpoint",), DURATION_BUCKETS
+)
+RENDER_SECONDS = Histogram(
+    "http_request_render_duration_seconds", "Template render time per request.", ("endpoint",), DURATION_BUCKETS
+)
+RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes", "Response body size.", ("endpoint",), SIZE_BUCKETS
+)
+
+def _before_request():
+    _current.set(RequestStats())
+
+def _after_request(response):
+    from flask import request
+
+    stats = _current.get()
+    if stats is None:
+        return response
+    endpoint = request.endpoint or "unmatched"
+    REQUESTS.inc((endpoint, request.method, str(response.status_code)))
+    REQUEST_SECONDS.observe((endpoint, request.method), time.perf_counter() - stats.start)
+    SQL_STATEMENTS.observe((endpoint,), stats.sql_statements)
+    SQL_SECONDS.observe((endpoint,), stats.sql_seconds)
+    RENDER_SECONDS.observe((endpoint,), stats.render_seconds)
+    if not response.is_streamed:
+        RESPONSE_BYTES.observe((endpoint,), response.calculate_content_length() or 0)
+    response.headers["Server-Timing"] = (
+        f"sql;dur={stats.sql_seconds * 1000:.2f};desc=\"{stats.sql_statements} statements\", "
+        f"render;dur={stats.render_seconds * 1000:.2f}"
+    )
+    return response
+
+def _teardown_request(exc):
+    _current.set(None)
+
+def init_app(app):
+    """Installs the request hooks and the timed template class on `app`."""
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+def render_metrics():
+    """Returns every metric, plus pool and cache counters, in Prometheus text format."""
+    from .cache import get_cache_stats
+    from .db import get_pool_stats
+
+    lines = []
+    for metric in (REQUESTS, REQUEST_SECONDS, SQL_STATEMENTS, SQL_SECONDS, RENDER_SECONDS, RESPONSE_BYTES):
+        lines.extend(metric.render())
+
+    pools = get_pool_stats()["pools"]
+    for key, documentation, metric_type in (
+        ("opened", "Connections opened.", "counter"),
+        ("reused", "Connections reused from the pool.", "counter"),
+        ("in_use", "Connections currently checked out.", "gauge"),
+        ("idle", "Idle connections kept open.", "gauge"),
+    ):
+        name = f"sqlite_pool_{key}" + ("_total" if metric_type == "counter" else "")
+        lines.extend(_gauges(
+            name, documentation, [(("pool",), (pool,), stats[key]) for pool, stats in sorted(pools.items())],
+            metric_type,
+        ))
+
+    cache = get_cache_stats()
+    for key in ("hits", "misses", "evictions", "invalidations"):
+        lines.extend(_gauges(
+            f"query_cache_{key}_total", f"Query cache {key}.", [((), (), cache[key])], "counter"
+        ))
+    lines.extend(_gauges("query_cache_entries", "Results held in the query cache.", [((), (), cache["entries"])]))
+    return "\n".join(lines) + "\n"
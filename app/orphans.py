@@ -0,0 +1,163 @@
+# app/orphans.py
+
+"""
+Batch linking of orphaned messages (rows with no conversation_id).
+
+Each orphan is matched in two steps:
+
+    1. Timestamp: the conversation whose create_time is nearest to the
+       message's, within a window, found by bisecting one sorted list.
+    2. Similarity: otherwise, the conversation whose title best overlaps the
+       message content, scored on character trigrams. Candidates come from an
+       inverted trigram index, so only conversations sharing a rare trigram
+       with the message are ever scored.
+
+Every link carries a confidence in [0, 1] and all accepted links are written
+with one executemany in a single transaction.
+"""
+
+import bisect
+from collections import Counter, defaultdict
+
+from .compression import decode_content
+from .db import bump_ingest_generation, ensure_ingest_state
+from .summary import refresh_conversation_summaries
+from .threads import refresh_thread_layout
+
+# Seconds between a message and a conversation's create_time for a timestamp match
+DEFAULT_TIME_WINDOW = 600
+
+# Minimum share of a title's trigrams found in the message for a similarity match
+DEFAULT_SIMILARITY_THRESHOLD = 0.6
+
+# Characters of message content used for similarity matching
+CONTENT_PREFIX_LENGTH = 2000
+
+# Trigrams shared by more titles than this are too common to find candidates with
+MAX_POSTINGS = 500
+
+# Candidates scored exactly per orphan
+MAX_CANDIDATES = 20
+
+def trigrams(text):
+    """Returns the set of lowercase character trigrams of `text`, with padded word edges."""
+    normalized = " " + " ".join((text or "").lower().split()) + " "
+    return {normalized[i:i + 3] for i in range(len(normalized) - 2)}
+
+class TimestampIndex:
+    """Conversations sorted by create_time, searched with bisect."""
+
+    def __init__(self, rows):
+        pairs = sorted((row["create_time"], row["conversation_id"]) for row in rows if row["create_time"] is not None)
+        self.times = [create_time for create_time, _ in pairs]
+        self.ids = [conversation_id for _, conversation_id in pairs]
+
+    def nearest(self, timestamp, window):
+        """Returns (conversation_id, distance) of the closest conversation within `window`, or None."""
+        if timestamp is None or not self.times:
+            return None
+        position = bisect.bisect_left(self.times, timestamp)
+        best = None
+        for index in (position - 1, position):
+            if 0 <= index < len(self.times):
+                distance = abs(self.times[index] - timestamp)
+                if distance < window and (best is None or distance < best[1]):
+                    best = (self.ids[index], distance)
+        return best
+
+class TitleIndex:
+    """Inverted character-trigram index over conversation titles."""
+
+    def __init__(self, rows):
+        self.ids = []
+        self.grams = []
+        postings = defaultdict(list)
+        for row in rows:
+            grams = trigrams(row["title"])
+            if len(grams) < 3:
+                continue  # "", "Chat", ... say nothing about the content
+            for gram in grams:
+                postings[gram].append(len(self.ids))
+            self.ids.append(row["conversation_id"])
+            self.grams.append(grams)
+        self.postings = {gram: ids for gram, ids in postings.items() if len(ids) <= MAX_POSTINGS}
+
+    def best_match(self, text):
+        """Returns (conversation_id, score) of the title best contained in `text`, or None."""
+        grams = trigrams((text or "")[:CONTENT_PREFIX_LENGTH])
+        hits = Counter()
+        for gram in grams:
+            hits.update(self.postings.get(gram, ()))
+        best = None
+        for index, _ in hits.most_common(MAX_CANDIDATES):
+            title_grams = self.grams[index]
+            score = len(title_grams & grams) / len(title_grams)
+            if best is None or score > best[1]:
+                best = (self.ids[index], score)
+        return best
+
+def find_orphan_links(conn, time_window=DEFAULT_TIME_WINDOW, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD):
+    """
+    Proposes a conversation for every orphaned message that has a match.
+
+    Returns:
+        A list of dicts with message_id, create_time, conversation_id,
+        conversation_title, method ("timestamp" or "similarity") and
+        confidence (1.0 for an exact timestamp match, falling to 0.5 at the
+        edge of the window; the trigram score for similarity matches).
+    """
+    conversations = conn.execute("SELECT conversation_id, title, create_time FROM Conversations").fetchall()
+    titles = {row["conversation_id"]: row["title"] for row in conversations}
+    by_time = TimestampIndex(conversations)
+    by_title = None  # built on first use
+
+    links = []
+    for message in conn.execute(
+        "SELECT message_id, content, create_time FROM Messages WHERE conversation_id IS NULL"
+    ):
+        match = by_time.nearest(message["create_time"], time_window)
+        if match is not None:
+            conversation_id, distance = match
+            method, confidence = "timestamp", 1.0 - 0.5 * distance / time_window
+        else:
+            if by_title is None:
+                by_title = TitleIndex(conversations)
+            match = by_title.best_match(decode_content(message["content"]))
+            if match is None or match[1] < similarity_threshold:
+                continue
+            conversation_id, confidence = match
+            method = "similarity"
+
+        links.append({
+            "message_id": message["message_id"],
+            "create_time": message["create_time"],
+            "conversation_id": conversation_id,
+            "conversation_title": titles[conversation_id],
+            "method": method,
+            "confidence": round(confidence, 3),
+        })
+    return links
+
+def apply_orphan_links(conn, links, min_confidence=0.0):
+    """
+    Writes the links at or above `min_confidence` in one transaction and
+    refreshes the summaries and thread layout of the conversations they touch.
+
+    Returns:
+        The number of messages linked.
+    """
+    accepted = [link for link in links if link["confidence"] >= min_confidence]
+    if not accepted:
+        return 0
+
+    touched = {link["conversation_id"] for link in accepted}
+    with conn:
+        conn.executemany(
+            "UPDATE Messages SET conversation_id = ? WHERE message_id = ? AND conversation_id IS NULL",
+            [(link["conversation_id"], link["message_id"]) for link in accepted],
+        )
+        refresh_thread_layout(conn, touched)
+        refresh_conversation_summaries(conn, touched)
+        ensure_ingest_state(conn)
+        bump_ingest_generation(conn)
+    return len(accepted)
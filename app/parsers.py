@@ -1,56 +1,47 @@
 # app/parsers.py
 
-import json
-import sqlite3
-from .utils import format_timestamp
-from .helpers import fetch_feedback, fetch_model_comparisons
+from .utils import format_timestamp, encode_cursor
+from .compression import decode_content
+from .helpers import fetch_feedback
+from .threads import fetch_message_page
 
-def parse_conversation_data(conversation_row, conn):
-    try:
-        # Validate input
-        if not isinstance(conversation_row, sqlite3.Row):
-            raise TypeError(f"Expected sqlite3.Row, got {type(conversation_row)}")
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
 
-        # Extract fields
-        conversation_id = conversation_row["conversation_id"]
-        title = conversation_row["title"] or "No Title"
-        create_time = format_timestamp(conversation_row["create_time"])
-        update_time = format_timestamp(conversation_row["update_time"])
+def format_message(msg):
+    """Turns a Messages row into the dict the templates and JSON endpoints use."""
+    return {
+        "message_id": msg["message_id"],
+        "author_role": msg["author_role"] or "unknown",
+        "content": decode_content(msg["content"]) or "No content available",
+        "timestamp": format_timestamp(msg["create_time"]),
+        "status": msg["status"],
+        "depth": msg["depth"] or 0,
+        "on_active_branch": msg["branch_position"] is not None,
+    }
 
-        print(f"Parsing messages for conversation_id: {conversation_id}")
-        # Fetch messages
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM Messages WHERE conversation_id = ? ORDER BY create_time ASC",
-            (conversation_id,)
-        )
-        message_rows = cursor.fetchall()
+def attach_feedback(conn, messages):
+    """Adds each message's MessageFeedback entries under "feedback", in one batched lookup."""
+    feedback = fetch_feedback(conn, [message["message_id"] for message in messages])
+    for message in messages:
+        message["feedback"] = feedback.get(message["message_id"], [])
+    return messages
 
-        messages = [
-            {
-                "message_id": msg["message_id"],
-                "author_role": msg["author_role"] or "unknown",
-                "content": msg["content"] or "No content available",
-                "timestamp": format_timestamp(msg["create_time"]),
-                "status": msg["status"],
-            }
-            for msg in message_rows
-        ]
+def parse_message_page(conn, conversation_id, after=None, limit=MESSAGE_PAGE_SIZE, all_branches=False):
+    """
+    Returns one page of messages for incremental loading.
 
-        return {
-            "conversation_id": conversation_id,
-            "title": title,
-            "create_time": create_time,
-            "update_time": update_time,
-            "messages": messages,
-        }
+    Args:
+        after: A decoded cursor from a previous page, or None for the first page.
+        limit: Messages per page, capped at MAX_MESSAGE_PAGE_SIZE.
+        all_branches: Page through the whole tree instead of the active branch.
 
-    except Exception as e:
-        print(f"Error parsing conversation data: {e}")
-        return {
-            "conversation_id": "unknown",
-            "title": "Error",
-            "create_time": "N/A",
-            "update_time": "N/A",
-            "messages": [],
-        }
+    Returns:
+        {"messages": [...], "next_cursor": str or None}
+    """
+    limit = max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+    rows, next_key = fetch_message_page(conn, conversation_id, after, limit, all_branches)
+    return {
+        "messages": attach_feedback(conn, [format_message(msg) for msg in rows]),
+        "next_cursor": encode_cursor(next_key) if next_key is not None else None,
+    }
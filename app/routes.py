@@ -1,10 +1,28 @@
 # app/routes.py
 
-from flask import Blueprint, render_template, request, make_response, jsonify
-from .db import get_db_connection
-from .utils import format_timestamp, log_search, get_recent_searches
-from .parsers import parse_conversation_data
+from flask import Blueprint, Response, redirect, render_template, request, jsonify, url_for, stream_template
+from .db import get_database_path, get_db_connection, get_pool_stats
+from .utils import format_timestamp, encode_cursor, decode_cursor, conversation_filter
+from .parsers import parse_message_page, MESSAGE_PAGE_SIZE
 from .helpers import fetch_feedback, fetch_model_comparisons
+from .compression import decode_content
+from .summary import LIST_SORT_KEY, count_conversations
+from .orphans import find_orphan_links, apply_orphan_links
+from .analytics import GRANULARITIES, fetch_activity
+from .dedupe import fetch_conversation_versions, get_dedupe_report, resolve_merged_conversation
+from .metrics import render_metrics
+from .cache import cached_query, get_cache_stats, invalidate_query_cache
+from .history import log_search, get_recent_searches, get_top_queries, get_history_stats
+from .export import (
+    EXPORT_FORMATS, archive_name, iter_conversation_json, iter_conversations, iter_export_messages,
+    iter_ndjson, iter_zip
+)
+from .search import (
+    DEFAULT_LIMIT, FACET_FILTERS, clamp_limit, fetch_context_windows, render_highlight, search_conversations,
+    search_facets, search_messages, search_pattern
+)
+from .semantic import get_vector_index_stats, load_vector_index, semantic_search
+from .suggest import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, get_suggest_index, warm_suggest_index
 from datetime import datetime
 import math
 import logging
@@ -12,60 +30,104 @@ from contextlib import closing
 
 main = Blueprint('main', __name__)
 
+SEARCH_MODES = ("fulltext", "semantic", "substring", "regex")
+
+@main.before_app_request
+def load_suggestions():
+    # Builds the /suggest index in the background on the first page load
+    if request.endpoint != 'static':
+        warm_suggest_index()
+
 @main.route('/')
 def index():
     query = request.args.get('query', '')
     start_date = request.args.get('start_date', '')
     end_date = request.args.get('end_date', '')
-    page = int(request.args.get('page', 1))
+    after = decode_cursor(request.args.get('after'))
+    before = decode_cursor(request.args.get('before'))
+    page = max(request.args.get('page', 1, type=int), 1)
+    for cursor in (after, before):
+        if cursor and cursor[0] is None:
+            # Links made before the list sorted NULL create_times as 0
+            cursor[0] = 0
     per_page = 20
-    offset = (page - 1) * per_page
 
+    # Apply filters
+    where, params = conversation_filter(query, start_date, end_date)
+
+    def load_page(conn):
+        # Total for "Page X of Y", cached separately so it is shared by every page
+        total_records = count_conversations(conn, where, params)
+
+        # Keyset pagination on (LIST_SORT_KEY, conversation_id), newest first.
+        # The plain bound on LIST_SORT_KEY lets SQLite seek its expression
+        # index, which it does not do for the row-value comparison alone.
+        # Listing pages read only the precomputed summaries, never Messages.
+        sql_query = f"SELECT * FROM ConversationSummary WHERE {where}"
+        if before:
+            conversations = conn.execute(
+                sql_query + f" AND {LIST_SORT_KEY} >= ? AND ({LIST_SORT_KEY}, conversation_id) > (?, ?)"
+                f" ORDER BY {LIST_SORT_KEY} ASC, conversation_id ASC LIMIT ?",
+                params + before[:1] + before + [per_page + 1]
+            ).fetchall()
+            has_previous = len(conversations) > per_page
+            has_next = True
+            conversations = conversations[:per_page][::-1]
+        else:
+            sql_params = list(params)
+            if after:
+                sql_query += f" AND {LIST_SORT_KEY} <= ? AND ({LIST_SORT_KEY}, conversation_id) < (?, ?)"
+                sql_params += after[:1] + after
+            sql_query += f" ORDER BY {LIST_SORT_KEY} DESC, conversation_id DESC LIMIT ?"
+            sql_params.append(per_page + 1)
+            if not after and page > 1:
+                # Old ?page=N links without a cursor
+                sql_query += " OFFSET ?"
+                sql_params.append((page - 1) * per_page)
+            conversations = conn.execute(sql_query, sql_params).fetchall()
+            has_previous = bool(after) or page > 1
+            has_next = len(conversations) > per_page
+            conversations = conversations[:per_page]
+        return total_records, conversations, has_previous, has_next
+
+    # Identical list pages are served from the query cache until the data changes
+    cache_key = ("index", where, tuple(params), tuple(after or ()), tuple(before or ()), page, per_page)
     with closing(get_db_connection()) as conn:
-        # Base SQL query
-        sql_query = "SELECT * FROM Conversations WHERE 1=1"
-        count_query = "SELECT COUNT(*) FROM Conversations WHERE 1=1"
-        sql_params, count_params = [], []
-
-        # Apply filters
-        if query:
-            sql_query += " AND title LIKE ?"
-            count_query += " AND title LIKE ?"
-            sql_params.append(f"%{query}%")
-            count_params.append(f"%{query}%")
-        if start_date:
-            sql_query += " AND datetime(create_time, 'unixepoch') >= ?"
-            count_query += " AND datetime(create_time, 'unixepoch') >= ?"
-            sql_params.append(start_date)
-            count_params.append(start_date)
-        if end_date:
-            sql_query += " AND datetime(create_time, 'unixepoch') <= ?"
-            count_query += " AND datetime(create_time, 'unixepoch') <= ?"
-            sql_params.append(end_date)
-            count_params.append(end_date)
-
-        # Fetch total count for pagination
-        total_records = conn.execute(count_query, count_params).fetchone()[0]
-        total_pages = math.ceil(total_records / per_page)
-
-        # Fetch paginated results
-        sql_query += " LIMIT ? OFFSET ?"
-        sql_params.extend([per_page, offset])
-        conversations = conn.execute(sql_query, sql_params).fetchall()
-
-        # Process data for rendering
-        results = []
-        for conversation in conversations:
-            print(f"Processing conversation row: {conversation}")
-            print(f"Fetched conversations: {conversations}")
-            parsed_data = parse_conversation_data(conversation, conn)  # Pass entire row
-            results.append({
-                "conversation_id": parsed_data["conversation_id"],
-                "title": parsed_data["title"],
-                "create_time": parsed_data["create_time"],
-                "update_time": parsed_data["update_time"],
-                "messages": parsed_data["messages"],
-            })
+        total_records, conversations, has_previous, has_next = cached_query(
+            conn, cache_key, lambda: load_page(conn)
+        )
+    total_pages = max(math.ceil(total_records / per_page), 1)
+
+    # Process data for rendering
+    results = [
+        {
+            "conversation_id": conversation["conversation_id"],
+            "title": conversation["title"] or "No Title",
+            "create_time": format_timestamp(conversation["create_time"]),
+            "update_time": format_timestamp(conversation["update_time"]),
+            "message_count": conversation["message_count"],
+            "user_messages": conversation["user_messages"],
+            "assistant_messages": conversation["assistant_messages"],
+            "last_message_time": format_timestamp(conversation["last_message_time"]),
+            "preview": conversation["preview"] or "",
+        }
+        for conversation in conversations
+    ]
+
+    filter_args = {"query": query, "start_date": start_date, "end_date": end_date}
+    previous_url = next_url = None
+    if conversations and has_previous:
+        first = conversations[0]
+        previous_url = url_for(
+            'main.index', before=encode_cursor([first["create_time"] or 0, first["conversation_id"]]),
+            page=max(page - 1, 1), **filter_args
+        )
+    if conversations and has_next:
+        last = conversations[-1]
+        next_url = url_for(
+            'main.index', after=encode_cursor([last["create_time"] or 0, last["conversation_id"]]),
+            page=page + 1, **filter_args
+        )
 
     return render_template(
         'index.html',
@@ -73,6 +135,9 @@ def index():
         page=page,
         per_page=per_page,
         total_pages=total_pages,
+        total_records=total_records,
+        previous_url=previous_url,
+        next_url=next_url,
         query=query,
         start_date=start_date,
         end_date=end_date
@@ -83,146 +148,164 @@ def conversation(conversation_id):
     with closing(get_db_connection()) as conn:
         # Fetch conversation details
         cursor = conn.cursor()
-        print(f"Fetching conversation with ID: {conversation_id}")
+        logging.debug("Fetching conversation with ID: %s", conversation_id)
         cursor.execute("SELECT * FROM Conversations WHERE conversation_id = ?", (conversation_id,))
         conversation_row = cursor.fetchone()
-        print(f"Fetched conversation row: {conversation_row}")
 
         if not conversation_row:
-            print(f"Conversation ID {conversation_id} not found.")
+            # Merged into a newer copy by the importer's near-duplicate detection
+            canonical_id = resolve_merged_conversation(conn, conversation_id)
+            if canonical_id is not None:
+                return redirect(url_for('main.conversation', conversation_id=canonical_id))
+            logging.debug("Conversation ID %s not found.", conversation_id)
             return "Conversation not found", 404
 
-        # Parse conversation data
-        parsed_data = parse_conversation_data(conversation_row, conn)
-        print(f"Parsed conversation data: {parsed_data}")
+        # Render the header and the first page only; the rest of the active
+        # branch (or ?branches=all for the whole tree) is fetched on scroll
+        all_branches = request.args.get('branches') == 'all'
+        page = parse_message_page(conn, conversation_id, all_branches=all_branches)
+        model_comparisons = fetch_model_comparisons(conn, [conversation_id])[conversation_id]
+        versions = fetch_conversation_versions(conn, conversation_id)
 
     return render_template(
         'conversation.html',
-        title=parsed_data["title"],
-        create_time=parsed_data["create_time"],
-        update_time=parsed_data["update_time"],
-        messages=parsed_data["messages"]
+        conversation_id=conversation_id,
+        title=conversation_row["title"] or "No Title",
+        create_time=format_timestamp(conversation_row["create_time"]),
+        update_time=format_timestamp(conversation_row["update_time"]),
+        messages=page["messages"],
+        next_cursor=page["next_cursor"],
+        model_comparisons=model_comparisons,
+        versions=versions,
+        all_branches=all_branches
     )
 
+@main.route('/conversation/<conversation_id>/messages')
+def conversation_messages(conversation_id):
+    """
+    Returns a page of messages as JSON, for incremental loading of long
+    conversations. Pass the previous page's next_cursor as ?cursor=.
+    """
+    all_branches = request.args.get('branches') == 'all'
+    limit = request.args.get('limit', MESSAGE_PAGE_SIZE, type=int)
+    after = decode_cursor(request.args.get('cursor'), size=None)
+
+    with closing(get_db_connection()) as conn:
+        page = parse_message_page(conn, conversation_id, after, limit, all_branches)
+
+    return jsonify(page)
+
 @main.route('/review_orphaned_messages')
 def review_orphaned_messages():
+    """Lists the conversation proposed for each orphaned message, with its confidence."""
     with closing(get_db_connection()) as conn:
-        orphaned_messages = conn.execute("""
-            SELECT * FROM Messages
-            WHERE conversation_id IS NULL
-        """).fetchall()
-
-        matched_messages = []
-        for message in orphaned_messages:
-            matched_conversation = find_matching_conversations(message, conn)
-            if matched_conversation:
-                matched_messages.append({
-                    "message_id": message['message_id'],
-                    "potential_conversation_id": matched_conversation['conversation_id'],
-                    "conversation_title": matched_conversation['title'],
-                    "timestamp": message['timestamp'],
-                    "user_id": message['user_id']
-                })
-
-        return render_template('review_orphaned_messages.html', matched_messages=matched_messages)
-
-# Helper function for finding matching conversations
-def find_matching_conversations(message, conn):
-    timestamp = message['timestamp']
-    user_id = message['user_id']
-    
-    matched_conversation = conn.execute("""
-        SELECT * FROM Conversations
-        WHERE user_id = ? AND ABS(timestamp - ?) < 3600
-        ORDER BY ABS(timestamp - ?) ASC
-        LIMIT 1
-    """, (user_id, timestamp)).fetchone()
-    
-    return matched_conversation
+        links = find_orphan_links(conn)
+
+    matched_messages = [
+        {
+            "message_id": link["message_id"],
+            "potential_conversation_id": link["conversation_id"],
+            "conversation_title": link["conversation_title"],
+            "timestamp": format_timestamp(link["create_time"]),
+            "method": link["method"],
+            "confidence": link["confidence"],
+        }
+        for link in links
+    ]
+    return render_template('review_orphaned_messages.html', matched_messages=matched_messages)
 
 @main.route('/link_orphaned_messages', methods=['POST'])
 def link_orphaned_messages():
-    with closing(get_db_connection()) as conn:
-        orphaned_messages = conn.execute("""
-            SELECT * FROM Messages
-            WHERE conversation_id IS NULL
-        """).fetchall()
-        
-        for message in orphaned_messages:
-            matched_conversation = find_matching_conversations(message, conn)
-            if matched_conversation:
-                conn.execute("""
-                    UPDATE Messages
-                    SET conversation_id = ?
-                    WHERE message_id = ?
-                """, (matched_conversation['conversation_id'], message['message_id']))
-
-        conn.commit()
-    return "Orphaned messages have been linked to conversations.", 200
-
-@main.route('/conversation/<conversation_id>/export/json', methods=['POST'])
-def export_conversation_json(conversation_id):
+    """Links every orphaned message whose match reaches `min_confidence` (default 0)."""
+    min_confidence = request.values.get('min_confidence', 0.0, type=float)
+    with closing(get_db_connection(readonly=False)) as conn:
+        links = find_orphan_links(conn)
+        linked = apply_orphan_links(conn, links, min_confidence)
+    invalidate_query_cache()
+    return f"Linked {linked} of {len(links)} matched orphaned messages to conversations.", 200
+
+def _stream_export(export, *args):
+    """Runs an export generator on its own pooled connection, released when the stream ends."""
     conn = get_db_connection()
-    conversation = conn.execute("SELECT * FROM Conversations WHERE conversation_id = ?", (conversation_id,)).fetchone()
-    conn.close()
-
-    if conversation:
-        # Parse conversation data to ensure nested content is included
-        parsed_data = parse_conversation_data(conversation['conversation_data'])
-        title = parsed_data.get("title", "No Title")
-        create_time = parsed_data.get("create_time", "N/A")
-        update_time = parsed_data.get("update_time", "N/A")
-        messages = parsed_data.get("messages", [])
-        print(f"Type of conversation_row: {type(conversation_row)}, Value: {conversation_row}")
-
-
-        # Structure JSON for full export
-        conversation_json = {
-            "conversation_id": conversation['conversation_id'],
-            "title": title,
-            "create_time": create_time,
-            "update_time": update_time,
-            "messages": [
-                {
-                    "message_id": message["message_id"],
-                    "author_role": message.get("author_role", "unknown"),
-                    "content": message["content"],
-                    "timestamp": message["timestamp"]
-                }
-                for message in messages
-            ]
-        }
+    try:
+        yield from export(conn, *args)
+    finally:
+        conn.close()
 
-        # Create JSON response for download
-        response = make_response(json.dumps(conversation_json, indent=2))
-        response.headers['Content-Disposition'] = f'attachment; filename=conversation_{conversation_id}.json'
-        response.headers['Content-Type'] = 'application/json'
-        return response
-    else:
+def _fetch_conversation_row(conversation_id):
+    with closing(get_db_connection()) as conn:
+        return conn.execute(
+            "SELECT * FROM Conversations WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+
+@main.route('/conversation/<conversation_id>/export/json', methods=['GET', 'POST'])
+def export_conversation_json(conversation_id):
+    conversation = _fetch_conversation_row(conversation_id)
+    if not conversation:
         return "Conversation not found", 404
 
-@main.route('/conversation/<conversation_id>/export/html', methods=['POST'])
-def export_conversation_html(conversation_id):
-    conn = get_db_connection()
-    conversation = conn.execute("SELECT * FROM Conversations WHERE conversation_id = ?", (conversation_id,)).fetchone()
-    messages = conn.execute("SELECT * FROM Messages WHERE conversation_id = ?", (conversation_id,)).fetchall()
-    conn.close()
+    all_branches = request.values.get('branches') == 'all'
+    response = Response(
+        _stream_export(iter_conversation_json, conversation, all_branches),
+        mimetype='application/json'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={archive_name(conversation_id)}'
+    return response
 
-    conversation_data = json.loads(conversation['conversation_data'])
-    title = conversation_data.get("title", "No Title")
-    create_time = conversation_data.get("create_time", "N/A")
-    update_time = conversation_data.get("update_time", "N/A")
+@main.route('/conversation/<conversation_id>/export/html', methods=['GET', 'POST'])
+def export_conversation_html(conversation_id):
+    conversation = _fetch_conversation_row(conversation_id)
+    if not conversation:
+        return "Conversation not found", 404
 
-    rendered_html = render_template(
+    all_branches = request.values.get('branches') == 'all'
+    rendered_html = stream_template(
         'export_template.html',
-        title=title,
-        create_time=create_time,
-        update_time=update_time,
-        messages=messages
+        title=conversation["title"] or "No Title",
+        create_time=format_timestamp(conversation["create_time"]),
+        update_time=format_timestamp(conversation["update_time"]),
+        messages=_stream_export(iter_export_messages, conversation_id, all_branches)
+    )
+    response = Response(rendered_html, mimetype='text/html')
+    response.headers['Content-Disposition'] = f'attachment; filename={archive_name(conversation_id, "html")}'
+    return response
+
+@main.route('/export', methods=['GET', 'POST'])
+def export_conversations():
+    """
+    Streams many conversations at once, selected by the list filters
+    (query, start_date, end_date) and/or an `ids` list, as NDJSON (one
+    conversation per line) or as a zip archive with one JSON file each.
+    """
+    export_format = request.values.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
+    where, params = conversation_filter(
+        request.values.get('query', ''),
+        request.values.get('start_date', ''),
+        request.values.get('end_date', '')
     )
-    response = make_response(rendered_html)
-    response.headers['Content-Disposition'] = f'attachment; filename=conversation_{conversation_id}.html'
-    response.headers['Content-Type'] = 'text/html'
+    ids = [
+        conversation_id.strip()
+        for value in request.values.getlist('ids')
+        for conversation_id in value.split(',')
+        if conversation_id.strip()
+    ] or None
+    all_branches = request.values.get('branches') == 'all'
+
+    def generate(conn):
+        conversations = iter_conversations(conn, where, params, ids)
+        if export_format == 'zip':
+            return iter_zip(conn, conversations, all_branches)
+        return iter_ndjson(conn, conversations, all_branches)
+
+    if export_format == 'zip':
+        response = Response(_stream_export(generate), mimetype='application/zip')
+        response.headers['Content-Disposition'] = 'attachment; filename=conversations.zip'
+    else:
+        response = Response(_stream_export(generate), mimetype='application/x-ndjson')
+        response.headers['Content-Disposition'] = 'attachment; filename=conversations.ndjson'
     return response
 
 @main.route('/message/<message_id>')
@@ -235,16 +318,18 @@ def message_detail(message_id):
         if not message:
             return "Message not found.", 404
 
-        # Fetch feedback and model comparisons for the message
-        feedback = conn.execute("SELECT * FROM Feedback WHERE message_id = ?", (message_id,)).fetchall()
-        model_comparisons = conn.execute("SELECT * FROM ModelComparisons WHERE message_id = ?", (message_id,)).fetchall()
+        # Fetch feedback for the message and model comparisons for its conversation
+        feedback = fetch_feedback(conn, [message_id])[message_id]
+        model_comparisons = fetch_model_comparisons(conn, [message["conversation_id"]]).get(
+            message["conversation_id"], []
+        )
 
     # Prepare data for the template
     message_data = {
         "message_id": message["message_id"],
-        "author_role": message.get("author_role", "unknown"),
-        "content": message["content"],
-        "timestamp": format_timestamp(message["timestamp"]),
+        "author_role": message["author_role"] or "unknown",
+        "content": decode_content(message["content"]),
+        "timestamp": format_timestamp(message["create_time"]),
         "conversation_id": message["conversation_id"]
     }
 
@@ -258,90 +343,253 @@ def message_detail(message_id):
 @main.route('/search', methods=['GET'])
 def search():
     """
-    Enhanced search endpoint to include results from Conversations and Messages tables.
+    Full-text search over conversation titles and message content.
+
+    Accepts FTS5 query syntax ("exact phrase", prefix*, AND/OR/NOT) in `query`,
+    an optional `limit` on the matches returned per kind and `context`, the
+    number of surrounding messages returned on each side of a message hit.
+    Results are ranked by bm25 and carry highlighted snippets.
+
+    With `mode=semantic` matches are found by meaning instead (see
+    app/semantic.py): results are ranked by cosine similarity, carry a
+    `score` and plain snippets, and the FTS5 query syntax does not apply.
+
+    `mode=substring` finds the query as literal text (case-insensitive) and
+    `mode=regex` as a Python regular expression, e.g. identifiers or stack
+    trace lines the word tokenizer splits up. Both are prefiltered on the
+    trigram index and stop after a few seconds; results are then partial and
+    the response carries `X-Search-Truncated: 1`.
+
+    In fulltext mode `author_role`, `conversation_id` and `month` (YYYY-MM)
+    narrow the matches, and `facets=1` returns {"results": [...], "facets":
+    {...}} with the matching messages counted per author role, per month and
+    for the top conversations, so a result set can be drilled into with one
+    request per step.
     """
-    query = request.args.get('query', '')
+    query = request.args.get('query', '').strip()
     if not query:
         return jsonify({"error": "Query parameter is required"}), 400
-
-    context_range = 2  # Number of messages for context
-
-    with closing(get_db_connection()) as conn:
-        # Search in the Conversations table
-        conversation_query = """
-            SELECT conversation_id, conversation_data
-            FROM Conversations
-            WHERE conversation_data LIKE ?
-        """
-        conversation_matches = conn.execute(conversation_query, (f'%{query}%',)).fetchall()
-
-        # Search in the Messages table
-        message_query = """
-            SELECT message_id, conversation_id, content, timestamp
-            FROM Messages
-            WHERE content LIKE ?
-        """
-        message_matches = conn.execute(message_query, (f'%{query}%',)).fetchall()
+    limit = clamp_limit(request.args.get('limit', DEFAULT_LIMIT))
+    context_range = min(max(request.args.get('context', 2, type=int), 0), 10)
+    mode = request.args.get('mode', 'fulltext')
+    if mode not in SEARCH_MODES:
+        return jsonify({"error": f"Unknown search mode; use one of {', '.join(SEARCH_MODES)}"}), 400
+    filters = {name: request.args[name] for name in FACET_FILTERS if request.args.get(name)}
+    with_facets = request.args.get('facets', '') in ('1', 'true')
+    if (filters or with_facets) and mode != 'fulltext':
+        return jsonify({"error": "Facets and facet filters are only available in fulltext mode"}), 400
+    vector_index = load_vector_index(get_database_path()) if mode == 'semantic' else None
+    if mode == 'semantic' and vector_index is None:
+        return jsonify({
+            "error": "Semantic search is unavailable: install NumPy and re-run the importer "
+                     "(or debug_scripts/build_vector_index.py) to build the vector index"
+        }), 503
+
+    def run_search(conn):
+        truncated = False
+        if mode == 'semantic':
+            conversation_matches, message_matches = semantic_search(
+                conn, get_database_path(), query, limit, index=vector_index
+            )
+        elif mode in ('substring', 'regex'):
+            conversation_matches, message_matches, truncated = search_pattern(
+                conn, query, limit, regex=mode == 'regex'
+            )
+        else:
+            conversation_matches = search_conversations(conn, query, limit, filters)
+            message_matches = search_messages(conn, query, limit, filters)
+        # One batched query for the surrounding messages of every hit
+        context_windows = fetch_context_windows(
+            conn, [match['message_id'] for match in message_matches], context_range
+        )
 
         results = []
 
         # Process Conversation matches
         for match in conversation_matches:
-            conversation_id = match['conversation_id']
-            conversation_data = json.loads(match['conversation_data'])
             results.append({
                 "type": "conversation",
-                "conversation_id": conversation_id,
-                "title": conversation_data.get("title", "No Title"),
-                "content_snippet": query,
-                "timestamp": format_timestamp(conversation_data.get("create_time")),
+                "conversation_id": match['conversation_id'],
+                "title": match['title'] or "No Title",
+                "content_snippet": render_highlight(match['title_highlight']),
+                "timestamp": format_timestamp(match['create_time']),
+                "rank": match['rank'],
             })
+            if mode == 'semantic':
+                results[-1]["score"] = match['score']
 
         # Process Message matches with context
         for match in message_matches:
             conversation_id = match['conversation_id']
             message_id = match['message_id']
 
-            # Fetch context messages
-            context_query = """
-                SELECT * FROM Messages
-                WHERE conversation_id = ?
-                AND create_time BETWEEN ? AND ?
-            """
-            context_messages = conn.execute(context_query, (
-                conversation_id,
-                int(message_id) - context_range,
-                int(message_id) + context_range
-            )).fetchall()
-
             results.append({
                 "type": "message",
                 "match": {
                     "message_id": message_id,
                     "conversation_id": conversation_id,
                     "content": match['content'],
-                    "timestamp": format_timestamp(match['timestamp']),
-                    "author_role": match['author_role']
+                    "snippet": render_highlight(match['snippet']),
+                    "timestamp": format_timestamp(match['create_time']),
+                    "author_role": match['author_role'],
+                    "rank": match['rank'],
                 },
                 "context": [
                     {
                         "message_id": msg['message_id'],
                         "content": msg['content'],
-                        "timestamp": format_timestamp(msg['timestamp']),
-                        "author_role": msg['author_role']
-                    } for msg in context_messages
+                        "timestamp": format_timestamp(msg['create_time']),
+                        "author_role": msg['author_role'],
+                        "offset": msg['offset']
+                    } for msg in context_windows[message_id]
                 ]
             })
+            if mode == 'semantic':
+                results[-1]["match"]["score"] = match['score']
+        facets = search_facets(conn, query, filters) if with_facets else None
+        return results, truncated, facets
+
+    # Repeated searches are served from the query cache until the data changes
+    # (semantic results also depend on which vector index build answered them)
+    index_version = vector_index.meta.get("built_at") if vector_index is not None else None
+    # (whitespace is significant to substring and regex patterns)
+    normalized = query if mode in ('substring', 'regex') else " ".join(query.split())
+    cache_key = (
+        "search", mode, index_version, normalized, limit, context_range, tuple(sorted(filters.items())), with_facets
+    )
+    with closing(get_db_connection()) as conn:
+        try:
+            results, truncated, facets = cached_query(conn, cache_key, lambda: run_search(conn))
+        except ValueError as e:
+            if mode == 'regex':
+                return jsonify({"error": f"Invalid regular expression: {e}"}), 400
+            if filters.get('month'):
+                return jsonify({"error": str(e)}), 400
+            raise
+
+    # Queued for the background writer; never blocks the response
+    log_search(query, request.args.get('start_date', ''), request.args.get('end_date', ''), len(results))
+    response = jsonify({"results": results, "facets": facets} if with_facets else results)
+    if truncated:
+        response.headers['X-Search-Truncated'] = '1'
+    return response
 
-        return jsonify(results)
+@main.route('/suggest')
+def suggest():
+    """
+    Completions for the search box: past queries and conversation titles
+    starting with `query` (or with a word of the title), from the in-memory
+    index in app/suggest.py. `limit` caps them (default 8, max 20).
+    """
+    limit = min(max(request.args.get('limit', DEFAULT_SUGGESTIONS, type=int), 1), MAX_SUGGESTIONS)
+    with closing(get_db_connection()) as conn:
+        index = get_suggest_index(conn)
+    return jsonify(index.complete(request.args.get('query', ''), limit))
 
 @main.route('/recent_searches')
 def recent_searches():
     """
-    Retrieves and displays recent search queries.
+    Displays the most recent searches and the most frequent queries.
 
-    Fetches recent search queries from the search history JSON file using `get_recent_searches`.
-    Renders the 'recent_searches.html' template with the recent searches data.
+    Reads from the search history store, which is appended to in the
+    background by `log_search`.
     """
-    recent_searches_data = get_recent_searches()
-    return render_template('recent_searches.html', recent_searches=recent_searches_data)
+    return render_template(
+        'recent_searches.html',
+        recent_searches=get_recent_searches(20),
+        top_queries=get_top_queries(20)
+    )
+
+@main.route('/search_history')
+def search_history():
+    """Returns recent searches, top queries and writer counters as JSON."""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    return jsonify({
+        "recent": get_recent_searches(limit),
+        "top_queries": get_top_queries(limit),
+        "writer": get_history_stats(),
+    })
+
+@main.route('/pool_stats')
+def pool_stats():
+    """
+    Reports the database connection pools: configured PRAGMAs and how many
+    connections were opened versus reused.
+    """
+    return jsonify(get_pool_stats())
+
+@main.route('/metrics')
+def metrics():
+    """Request latency, SQL and render histograms plus pool and cache counters, for Prometheus."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def _activity_params():
+    """Returns (granularity, start_date, end_date, error) from the query string."""
+    granularity = request.args.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        return None, None, None, f"Unknown granularity; use one of {', '.join(GRANULARITIES)}"
+    bounds = []
+    for name in ('start_date', 'end_date'):
+        value = request.args.get(name) or None
+        if value is not None:
+            try:
+                value = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+            except ValueError:
+                return None, None, None, f"{name} must be a YYYY-MM-DD date"
+        bounds.append(value)
+    return granularity, bounds[0], bounds[1], None
+
+@main.route('/analytics')
+def analytics():
+    """
+    Messages and conversations per day, week or month (`granularity`),
+    overall and per author_role, with average message length. Reads only the
+    rollup tables the importer maintains; `start_date`/`end_date` bound the days.
+    """
+    granularity, start_date, end_date, error = _activity_params()
+    if error:
+        return jsonify({"error": error}), 400
+    with closing(get_db_connection()) as conn:
+        activity = fetch_activity(conn, granularity, start_date, end_date)
+    if activity is None:
+        return jsonify({
+            "error": "No activity rollups; re-run the importer or debug_scripts/build_activity_rollups.py"
+        }), 503
+    return jsonify(activity)
+
+@main.route('/activity')
+def activity():
+    """Timeline page for the /analytics data."""
+    granularity, start_date, end_date, error = _activity_params()
+    if error:
+        return error, 400
+    with closing(get_db_connection()) as conn:
+        activity = fetch_activity(conn, granularity, start_date, end_date)
+    periods = activity["periods"] if activity else []
+    return render_template(
+        'activity.html',
+        activity=activity,
+        granularities=list(GRANULARITIES),
+        max_messages=max((period["messages"] for period in periods), default=0),
+        start_date=start_date or '',
+        end_date=end_date or ''
+    )
+
+@main.route('/duplicates')
+def duplicates():
+    """
+    Reports the near-duplicate conversations found at import: how many were
+    linked as versions or merged, and the message content they account for.
+    """
+    with closing(get_db_connection()) as conn:
+        return jsonify(get_dedupe_report(conn))
+
+@main.route('/cache_stats')
+def cache_stats():
+    """Reports query cache hits, misses, evictions and invalidations."""
+    return jsonify(get_cache_stats())
+
+@main.route('/vector_index_stats')
+def vector_index_stats():
+    """Reports whether semantic search is available and what the vector index holds."""
+    return jsonify(get_vector_index_stats(get_database_path()))
@@ -0,0 +1,676 @@
+# app/search.py
+
+"""
+FTS5-backed full-text search over message content and conversation titles.
+
+The index tables mirror Messages and Conversations by rowid and are kept in
+sync by triggers, so every write the importer makes (inserts, upserts and
+message replacement) updates them in the same transaction. The message
+triggers index inflate_content(content), the plain text of bodies stored
+compressed (app/compression.py). Databases whose SQLite build lacks FTS5 fall
+back to unindexed LIKE scans.
+
+Substring and regex searches use a second, contentless index of message
+trigrams (SQLite 3.34+): the literal fragments a pattern requires select the
+candidate messages, and only those are run through the REGEXP function.
+"""
+
+import contextlib
+import functools
+import html
+import json
+import re
+import sqlite3
+import time
+
+from .compression import register_content_functions
+from .db import ensure_ingest_state
+from .utils import month_to_epochs
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# Control characters used as highlight markers inside snippet()/highlight()
+# output, swapped for <mark> tags once the surrounding text is escaped.
+_HIGHLIGHT_START = "\x02"
+_HIGHLIGHT_END = "\x03"
+
+# Filters accepted by search_conversations / search_messages / search_facets
+FACET_FILTERS = ("author_role", "conversation_id", "month")
+
+# Conversations listed in the conversation facet
+TOP_CONVERSATION_FACETS = 10
+
+# Substring / regex searches stop and return what they found after this long
+PATTERN_SEARCH_TIMEOUT = 2.0
+
+# Virtual machine instructions between two checks of the deadline
+_PROGRESS_STEPS = 10000
+
+# Characters of context kept on each side of a substring / regex match
+_SNIPPET_CONTEXT = 80
+
+_SEARCH_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS MessagesFTS USING fts5(
+        content, tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS ConversationsFTS USING fts5(
+        title, tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON Messages BEGIN
+        INSERT INTO MessagesFTS (rowid, content) VALUES (new.rowid, inflate_content(new.content));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON Messages BEGIN
+        DELETE FROM MessagesFTS WHERE rowid = old.rowid;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON Messages BEGIN
+        UPDATE MessagesFTS SET content = inflate_content(new.content) WHERE rowid = old.rowid;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON Conversations BEGIN
+        INSERT INTO ConversationsFTS (rowid, title) VALUES (new.rowid, new.title);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON Conversations BEGIN
+        DELETE FROM ConversationsFTS WHERE rowid = old.rowid;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE OF title ON Conversations BEGIN
+        UPDATE ConversationsFTS SET title = new.title WHERE rowid = old.rowid;
+    END
+    """,
+]
+
+# Contentless: the text stays in Messages, so deletes must pass the old text.
+# detail=none keeps no positions (about a quarter of the size), so a match
+# only means every trigram occurs somewhere; REGEXP confirms the candidates.
+# While the importer defers indexing (see deferred_trigram_index), rows above
+# the rowid it recorded are not in the index yet and are left to it.
+_TRIGRAM_INDEXED = "{row}.rowid <= IFNULL((SELECT value FROM IngestState WHERE key = 'trigram_deferred'), {row}.rowid)"
+
+_TRIGRAM_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS MessagesTrigram USING fts5(
+        content, tokenize = 'trigram', content = '', detail = 'none'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_trigram_insert AFTER INSERT ON Messages
+    WHEN {_TRIGRAM_INDEXED.format(row='new')}
+    BEGIN
+        INSERT INTO MessagesTrigram (rowid, content) VALUES (new.rowid, inflate_content(new.content));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_trigram_delete AFTER DELETE ON Messages
+    WHEN {_TRIGRAM_INDEXED.format(row='old')}
+    BEGIN
+        INSERT INTO MessagesTrigram (MessagesTrigram, rowid, content)
+        VALUES ('delete', old.rowid, inflate_content(old.content));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_trigram_update AFTER UPDATE OF content ON Messages
+    WHEN {_TRIGRAM_INDEXED.format(row='old')}
+    BEGIN
+        INSERT INTO MessagesTrigram (MessagesTrigram, rowid, content)
+        VALUES ('delete', old.rowid, inflate_content(old.content));
+        INSERT INTO MessagesTrigram (rowid, content) VALUES (new.rowid, inflate_content(new.content));
+    END
+    """,
+]
+
+def has_search_index(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'MessagesFTS'"
+    ).fetchone() is not None
+
+def ensure_search_index(conn):
+    """
+    Creates the FTS5 tables and sync triggers, backfilling them from existing
+    rows the first time. Messages and Conversations must already exist.
+
+    Returns:
+        False if this SQLite build has no FTS5 support, True otherwise.
+    """
+    existed = has_search_index(conn)
+    trigram_existed = has_trigram_index(conn)
+    register_content_functions(conn)
+    # Triggers from before compressed storage indexed new.content as is
+    for trigger in ("messages_fts_insert", "messages_fts_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    try:
+        for statement in _SEARCH_SCHEMA:
+            conn.execute(statement)
+    except sqlite3.OperationalError as e:
+        if "fts5" in str(e):
+            return False
+        raise
+    trigram = _create_trigram_index(conn)
+    if not existed:
+        rebuild_search_index(conn)
+    elif trigram and not trigram_existed:
+        rebuild_trigram_index(conn)
+    return True
+
+def has_trigram_index(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'MessagesTrigram'"
+    ).fetchone() is not None
+
+def _create_trigram_index(conn):
+    """Creates the trigram table and triggers; False if SQLite has no trigram tokenizer."""
+    try:
+        conn.execute(_TRIGRAM_SCHEMA[0])
+    except sqlite3.OperationalError as e:
+        if "tokenizer" in str(e):
+            return False
+        raise
+    ensure_ingest_state(conn)
+    for statement in _TRIGRAM_SCHEMA[1:]:
+        conn.execute(statement)
+    return True
+
+def rebuild_search_index(conn):
+    """Repopulates the FTS5 tables from Messages and Conversations (e.g. after VACUUM renumbered rowids)."""
+    register_content_functions(conn)
+    conn.execute("DELETE FROM MessagesFTS")
+    conn.execute("INSERT INTO MessagesFTS (rowid, content) SELECT rowid, inflate_content(content) FROM Messages")
+    conn.execute("DELETE FROM ConversationsFTS")
+    conn.execute("INSERT INTO ConversationsFTS (rowid, title) SELECT rowid, title FROM Conversations")
+    if has_trigram_index(conn):
+        rebuild_trigram_index(conn)
+
+def rebuild_trigram_index(conn):
+    """Repopulates the substring / regex trigram index from Messages."""
+    register_content_functions(conn)
+    conn.execute("INSERT INTO MessagesTrigram (MessagesTrigram) VALUES ('delete-all')")
+    conn.execute(
+        "INSERT INTO MessagesTrigram (rowid, content) SELECT rowid, inflate_content(content) FROM Messages"
+    )
+
+@contextlib.contextmanager
+def deferred_trigram_index(conn):
+    """
+    Inside a transaction, adds the messages inserted in the block to the
+    trigram index with one statement at the end instead of one per row.
+    FTS5 flushes its pending terms at every statement inside a trigger, so
+    row-by-row indexing of a large import is several times slower.
+    """
+    if not has_trigram_index(conn):
+        yield
+        return
+    # New rows get rowids above the current maximum; the triggers leave them alone
+    last_rowid = conn.execute("SELECT IFNULL(MAX(rowid), 0) FROM Messages").fetchone()[0]
+    conn.execute("INSERT OR REPLACE INTO IngestState (key, value) VALUES ('trigram_deferred', ?)", (last_rowid,))
+    yield
+    conn.execute("DELETE FROM IngestState WHERE key = 'trigram_deferred'")
+    conn.execute(
+        "INSERT INTO MessagesTrigram (rowid, content) "
+        "SELECT rowid, inflate_content(content) FROM Messages WHERE rowid > ?",
+        (last_rowid,),
+    )
+
+def quote_query(query):
+    """Turns free text into an FTS5 query matching every word, with no operators."""
+    return " ".join('"' + token.replace('"', '""') + '"' for token in query.split())
+
+def clamp_limit(limit):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+def render_highlight(text):
+    """HTML-escapes FTS output and turns the highlight markers into <mark> tags."""
+    return (
+        html.escape(text or "")
+        .replace(_HIGHLIGHT_START, "<mark>")
+        .replace(_HIGHLIGHT_END, "</mark>")
+    )
+
+# Errors FTS5 raises for a MATCH expression it cannot parse ("column:" filters
+# naming unknown columns, stray quotes, a lone "*")
+_QUERY_SYNTAX_ERRORS = ("fts5: syntax error", "no such column", "unterminated string", "unknown special query")
+
+def _match(conn, sql, query, *params):
+    """
+    Runs an FTS5 query with the user's own syntax (phrases, prefix*, AND/OR/NOT),
+    retrying with every word quoted if it is not a valid FTS5 expression.
+    Other errors (a locked database, a missing table, an interrupt) are raised.
+    `params` follow the query in the statement's parameters.
+    """
+    try:
+        return conn.execute(sql, (query, *params)).fetchall()
+    except sqlite3.OperationalError as e:
+        if not any(error in str(e) for error in _QUERY_SYNTAX_ERRORS):
+            raise
+    quoted = quote_query(query)
+    return conn.execute(sql, (quoted, *params)).fetchall() if quoted else []
+
+def facet_filter(filters, alias, fts_rowid=None):
+    """
+    Builds the SQL for facet filters on the table aliased `alias` (Messages
+    or Conversations).
+
+    Args:
+        filters: Dict with any of author_role, conversation_id and month
+            ('YYYY-MM', on create_time in UTC).
+        fts_rowid: The rowid column of the FTS table messages are matched
+            on. A conversation filter then constrains it to the
+            conversation's rowids, which FTS5 looks up directly instead of
+            joining every match to Messages.
+
+    Returns:
+        A ("AND ..." clause, params) pair, or None if the filters cannot
+        match this table (author_role on conversations).
+
+    Raises:
+        ValueError: The month is not a valid 'YYYY-MM' month.
+    """
+    filters = filters or {}
+    clauses, params = [], []
+    if filters.get("author_role"):
+        if alias != "m":
+            return None
+        clauses.append(f"{alias}.author_role = ?")
+        params.append(filters["author_role"])
+    if filters.get("conversation_id"):
+        if fts_rowid:
+            clauses.append(f"{fts_rowid} IN (SELECT rowid FROM Messages WHERE conversation_id = ?)")
+        else:
+            clauses.append(f"{alias}.conversation_id = ?")
+        params.append(filters["conversation_id"])
+    if filters.get("month"):
+        bounds = month_to_epochs(filters["month"])
+        if bounds is None:
+            raise ValueError("month must be a YYYY-MM month")
+        clauses.append(f"{alias}.create_time >= ? AND {alias}.create_time < ?")
+        params.extend(bounds)
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+def search_conversations(conn, query, limit=DEFAULT_LIMIT, filters=None):
+    """
+    Finds conversations whose title matches, best bm25 score first.
+
+    Returns:
+        Rows with conversation_id, title, create_time, title_highlight and
+        rank; none when `filters` (see facet_filter) select an author role.
+    """
+    filter_sql = facet_filter(filters, "c")
+    if filter_sql is None:
+        return []
+    where, params = filter_sql
+    if not has_search_index(conn):
+        return conn.execute(
+            f"""
+            SELECT conversation_id, title, create_time, title AS title_highlight, 0 AS rank
+            FROM Conversations c WHERE title LIKE ?{where} LIMIT ?
+            """,
+            (f"%{query}%", *params, limit),
+        ).fetchall()
+
+    return _match(conn, f"""
+        SELECT c.conversation_id, c.title, c.create_time,
+               highlight(ConversationsFTS, 0, '{_HIGHLIGHT_START}', '{_HIGHLIGHT_END}') AS title_highlight,
+               ConversationsFTS.rank AS rank
+        FROM ConversationsFTS
+        JOIN Conversations c ON c.rowid = ConversationsFTS.rowid
+        WHERE ConversationsFTS MATCH ?{where}
+        ORDER BY ConversationsFTS.rank
+        LIMIT ?
+    """, query, *params, limit)
+
+def search_messages(conn, query, limit=DEFAULT_LIMIT, filters=None):
+    """
+    Finds messages whose content matches, best bm25 score first, narrowed
+    by `filters` (see facet_filter).
+
+    Returns:
+        Rows with the Messages columns used by the search results plus
+        snippet (with highlight markers) and rank.
+    """
+    if not has_search_index(conn):
+        where, params = facet_filter(filters, "m")
+        return conn.execute(
+            f"""
+            SELECT message_id, conversation_id, author_role, inflate_content(content) AS content, create_time,
+                   substr(inflate_content(content), 1, 200) AS snippet, 0 AS rank
+            FROM Messages m WHERE inflate_content(content) LIKE ?{where} LIMIT ?
+            """,
+            (f"%{query}%", *params, limit),
+        ).fetchall()
+
+    where, params = facet_filter(filters, "m", "MessagesFTS.rowid")
+    return _match(conn, f"""
+        SELECT m.message_id, m.conversation_id, m.author_role, inflate_content(m.content) AS content, m.create_time,
+               snippet(MessagesFTS, 0, '{_HIGHLIGHT_START}', '{_HIGHLIGHT_END}', '…', 16) AS snippet,
+               MessagesFTS.rank AS rank
+        FROM MessagesFTS
+        JOIN Messages m ON m.rowid = MessagesFTS.rowid
+        WHERE MessagesFTS MATCH ?{where}
+        ORDER BY MessagesFTS.rank
+        LIMIT ?
+    """, query, *params, limit)
+
+def search_facets(conn, query, filters=None, top_conversations=TOP_CONVERSATION_FACETS):
+    """
+    Counts every message matching `query` and `filters` by author role, by
+    month of create_time (UTC) and by conversation, in one grouped pass over
+    the matches rather than one query per facet.
+
+    Returns:
+        A dict with `total` matching messages, `author_role` and `month`
+        lists of {value, count} (months newest first) and `conversation`,
+        the `top_conversations` conversations with the most matches, each
+        with its title.
+    """
+    indexed = has_search_index(conn)
+    where, params = facet_filter(filters, "m", "MessagesFTS.rowid" if indexed else None)
+    grouped = f"""
+        SELECT m.author_role, m.conversation_id,
+               strftime('%Y-%m', m.create_time, 'unixepoch') AS month, COUNT(*) AS count
+        FROM {{source}}
+        WHERE {{match}}{where}
+        GROUP BY 1, 2, 3
+    """
+    if indexed:
+        rows = _match(conn, grouped.format(
+            source="MessagesFTS JOIN Messages m ON m.rowid = MessagesFTS.rowid", match="MessagesFTS MATCH ?"
+        ), query, *params)
+    else:
+        rows = conn.execute(
+            grouped.format(source="Messages m", match="inflate_content(m.content) LIKE ?"),
+            (f"%{query}%", *params),
+        ).fetchall()
+
+    roles, months, conversations = {}, {}, {}
+    total = 0
+    for role, conversation_id, month, count in rows:
+        total += count
+        roles[role] = roles.get(role, 0) + count
+        if month is not None:
+            months[month] = months.get(month, 0) + count
+        if conversation_id is not None:
+            conversations[conversation_id] = conversations.get(conversation_id, 0) + count
+
+    top = sorted(conversations.items(), key=lambda item: (-item[1], item[0]))[:top_conversations]
+    titles = {}
+    if top:
+        placeholders = ", ".join("?" for _ in top)
+        titles = dict(conn.execute(
+            f"SELECT conversation_id, title FROM Conversations WHERE conversation_id IN ({placeholders})",
+            [conversation_id for conversation_id, _ in top],
+        ).fetchall())
+    return {
+        "total": total,
+        "author_role": [
+            {"value": role, "count": count}
+            for role, count in sorted(roles.items(), key=lambda item: (-item[1], str(item[0])))
+        ],
+        "month": [{"value": month, "count": count} for month, count in sorted(months.items(), reverse=True)],
+        "conversation": [
+            {"value": conversation_id, "title": titles.get(conversation_id) or "No Title", "count": count}
+            for conversation_id, count in top
+        ],
+    }
+
+def fetch_context_windows(conn, message_ids, context=2):
+    """
+    Fetches the `context` messages before and after each hit in one query,
+    using each message's position within its conversation (ordered by
+    create_time) rather than one lookup per hit.
+
+    Returns:
+        A dict mapping each hit's message_id to its neighbours in conversation
+        order, each row carrying `offset` (negative before the hit, positive
+        after it).
+    """
+    message_ids = list(dict.fromkeys(message_ids))
+    windows = {message_id: [] for message_id in message_ids}
+    if not message_ids or context <= 0:
+        return windows
+
+    # The ids are bound once, as a JSON array, so any number of hits stays
+    # within SQLite's bound-parameter limit
+    rows = conn.execute("""
+        WITH hits AS (
+            SELECT value AS message_id FROM json_each(?)
+        ),
+        ordered AS (
+            SELECT message_id, conversation_id, author_role, content, create_time,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY conversation_id ORDER BY create_time, message_id
+                   ) AS position
+            FROM Messages
+            WHERE conversation_id IN (
+                SELECT conversation_id FROM Messages WHERE message_id IN (SELECT message_id FROM hits)
+            )
+        )
+        SELECT hit.message_id AS hit_id, neighbour.position - hit.position AS offset,
+               neighbour.message_id, neighbour.author_role, inflate_content(neighbour.content) AS content,
+               neighbour.create_time
+        FROM ordered hit
+        JOIN ordered neighbour
+          ON neighbour.conversation_id = hit.conversation_id
+         AND neighbour.position BETWEEN hit.position - ? AND hit.position + ?
+         AND neighbour.message_id != hit.message_id
+        WHERE hit.message_id IN (SELECT message_id FROM hits)
+        ORDER BY hit.message_id, neighbour.position
+    """, (json.dumps(message_ids), context, context)).fetchall()
+
+    for row in rows:
+        windows[row["hit_id"]].append(row)
+    return windows
+
+@functools.lru_cache(maxsize=64)
+def _compile(pattern):
+    return re.compile(pattern)
+
+def _regexp(pattern, value):
+    """SQLite REGEXP: `value REGEXP pattern` calls regexp(pattern, value)."""
+    return value is not None and _compile(pattern).search(value) is not None
+
+def register_search_functions(conn):
+    """Adds the REGEXP operator (Python `re` syntax, unanchored search) to `conn`."""
+    conn.create_function("regexp", 2, _regexp, deterministic=True)
+
+_BRACE_QUANTIFIER = re.compile(r"\{(\d*)(?:,\d*)?\}")
+
+def required_literals(regex):
+    """
+    Returns literal substrings (3+ characters) that every match of the
+    compiled `regex` must contain, for the trigram prefilter. Only text
+    outside groups is considered, and an empty list means the pattern
+    (alternation at the top level, verbose mode, no long literal) cannot be
+    prefiltered.
+    """
+    pattern = regex.pattern
+    if regex.flags & re.VERBOSE:
+        return []
+    literals, run = [], []
+
+    def end_run():
+        if len(run) >= 3:
+            literals.append("".join(run))
+        run.clear()
+
+    depth, i = 0, 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            escaped = pattern[i + 1:i + 2]
+            if depth == 0:
+                # \d, \w, \b, backreferences... are not literal text
+                if escaped and not escaped.isalnum():
+                    run.append(escaped)
+                else:
+                    end_run()
+            i += 2
+            continue
+        if char == "[":
+            # Skip the character class
+            i += 1
+            if pattern[i:i + 1] == "^":
+                i += 1
+            if pattern[i:i + 1] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            if depth == 0:
+                end_run()
+        elif char == "(":
+            if depth == 0:
+                end_run()
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth > 0:
+            pass
+        elif char == "|":
+            return []
+        elif char in "?*+":
+            # The quantified character is optional unless the quantifier is +
+            if char != "+" and run:
+                run.pop()
+            end_run()
+        elif char == "{" and _BRACE_QUANTIFIER.match(pattern, i):
+            quantifier = _BRACE_QUANTIFIER.match(pattern, i)
+            if not quantifier.group(1) or int(quantifier.group(1)) == 0:
+                if run:
+                    run.pop()
+            end_run()
+            i = quantifier.end()
+            continue
+        elif char in ".^$":
+            end_run()
+        else:
+            run.append(char)
+        i += 1
+    end_run()
+    return literals
+
+def trigram_query(literals):
+    """An FTS5 query matching text that contains every trigram of every literal."""
+    trigrams = {literal[i:i + 3] for literal in literals for i in range(len(literal) - 2)}
+    return " AND ".join('"' + trigram.replace('"', '""') + '"' for trigram in sorted(trigrams))
+
+def _pattern_snippet(regex, text):
+    """A window of `text` around the first match, with highlight markers."""
+    text = text or ""
+    match = regex.search(text)
+    if match is None:
+        return text[:2 * _SNIPPET_CONTEXT]
+    start = max(match.start() - _SNIPPET_CONTEXT, 0)
+    end = match.end() + _SNIPPET_CONTEXT
+    return (
+        ("…" if start else "") + text[start:match.start()]
+        + _HIGHLIGHT_START + match.group(0) + _HIGHLIGHT_END
+        + text[match.end():end] + ("…" if end < len(text) else "")
+    )
+
+def _fetch_until(conn, sql, params, deadline):
+    """
+    Runs a query, interrupting it once `deadline` (time.monotonic()) passes.
+
+    Returns:
+        The rows fetched and whether the query was cut short.
+    """
+    rows = []
+    conn.set_progress_handler(lambda: time.monotonic() > deadline, _PROGRESS_STEPS)
+    try:
+        for row in conn.execute(sql, params):
+            rows.append(row)
+    except sqlite3.OperationalError as e:
+        if "interrupted" not in str(e):
+            raise
+        return rows, True
+    finally:
+        conn.set_progress_handler(None, 0)
+    return rows, False
+
+def search_pattern(conn, query, limit=DEFAULT_LIMIT, regex=False, timeout=PATTERN_SEARCH_TIMEOUT):
+    """
+    Substring (case-insensitive) or regular expression search over titles and
+    message content, newest messages first.
+
+    Messages are prefiltered on the trigram index with the literal text the
+    pattern requires; patterns without a 3+ character literal, and databases
+    without the index, are scanned. Either way the search stops after
+    `timeout` seconds and returns the matches found so far. (The deadline is
+    checked between rows, so a single catastrophically backtracking pattern
+    can still overrun it.)
+
+    Returns:
+        (conversation matches, message matches, truncated), the matches as
+        dicts shaped like the rows of search_conversations / search_messages.
+
+    Raises:
+        ValueError: `query` is not a valid regular expression.
+    """
+    if regex:
+        try:
+            compiled = _compile(query)
+        except re.error as e:
+            raise ValueError(str(e)) from e
+        literals = required_literals(compiled)
+    else:
+        compiled = _compile("(?i)" + re.escape(query))
+        literals = [query] if len(query) >= 3 else []
+    register_content_functions(conn)
+    register_search_functions(conn)
+    deadline = time.monotonic() + timeout
+
+    conversation_rows, truncated = _fetch_until(conn, """
+        SELECT conversation_id, title, create_time FROM Conversations
+        WHERE title REGEXP ? ORDER BY create_time DESC LIMIT ?
+    """, (compiled.pattern, limit), deadline)
+
+    if literals and has_trigram_index(conn):
+        message_rows, cut_short = _fetch_until(conn, """
+            SELECT m.message_id, m.conversation_id, m.author_role, inflate_content(m.content) AS content,
+                   m.create_time
+            FROM MessagesTrigram t
+            JOIN Messages m ON m.rowid = t.rowid
+            WHERE MessagesTrigram MATCH ? AND inflate_content(m.content) REGEXP ?
+            ORDER BY t.rowid DESC
+            LIMIT ?
+        """, (trigram_query(literals), compiled.pattern, limit), deadline)
+    else:
+        message_rows, cut_short = _fetch_until(conn, """
+            SELECT message_id, conversation_id, author_role, inflate_content(content) AS content, create_time
+            FROM Messages
+            WHERE inflate_content(content) REGEXP ?
+            ORDER BY rowid DESC
+            LIMIT ?
+        """, (compiled.pattern, limit), deadline)
+
+    conversations = [
+        {
+            "conversation_id": row["conversation_id"], "title": row["title"], "create_time": row["create_time"],
+            "title_highlight": _pattern_snippet(compiled, row["title"]), "rank": 0,
+        }
+        for row in conversation_rows
+    ]
+    messages = [
+        {
+            "message_id": row["message_id"], "conversation_id": row["conversation_id"],
+            "author_role": row["author_role"], "content": row["content"], "create_time": row["create_time"],
+            "snippet": _pattern_snippet(compiled, row["content"]), "rank": 0,
+        }
+        for row in message_rows
+    ]
+    return conversations, messages, truncated or cut_short
@@ -0,0 +1,402 @@
+# app/semantic.py
+
+"""
+Offline semantic search over messages and conversations.
+
+Every message is turned into a hashed TF-IDF vector: its words, plus the
+character trigrams of longer words (so "retries" still lands near "retry"),
+are hashed into BUCKETS feature buckets, weighted by sublinear term frequency
+and inverse document frequency, then folded with a random sign into
+DIMENSIONS dense dimensions and L2-normalized. A conversation's vector is its
+title plus the mean of its messages. Nothing leaves the machine.
+
+The vectors are written next to the database, in `<db>.vectors/`, as .npy
+files that are memory-mapped at query time; a query is scored against every
+row with one matrix-vector product per block and the best rows are picked
+with argpartition. NumPy is optional: without it `is_available()` is False
+and the importer skips building the index.
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import sqlite3
+import threading
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # Semantic search is disabled without NumPy
+    np = None
+
+from .compression import decode_content
+from .db import get_ingest_generation, iter_id_chunks
+
+# Hashed feature space used for document frequencies (2^20 buckets keep
+# collisions between real terms rare).
+BUCKET_BITS = 20
+BUCKETS = 1 << BUCKET_BITS
+
+# Width of the stored vectors. Scoring reads N x DIMENSIONS float32 values,
+# so this is the knob between recall and query time on large archives.
+DIMENSIONS = 256
+
+# Only the start of very long messages (pasted logs, code dumps) is vectorized
+MAX_TEXT_CHARS = 4000
+
+# Shorter messages ("thanks!", "ok") are not indexed: with a handful of
+# features their vectors are dominated by hash collisions.
+MIN_CONTENT_CHARS = 20
+
+# Messages vectorized per block while building
+BUILD_BLOCK_SIZE = 4096
+
+# Rows scored per matrix-vector product while searching
+SCORE_BLOCK_SIZE = 131072
+
+# Results scoring below this cosine similarity are dropped
+MIN_SCORE = 0.05
+
+_WORD = re.compile(r"\w+")
+_word_buckets = {}
+_MAX_CACHED_WORDS = 500000
+
+def is_available():
+    return np is not None
+
+def vector_index_path(db_path):
+    return f"{db_path}.vectors"
+
+def _hash(feature):
+    return zlib.crc32(feature.encode("utf-8")) & (BUCKETS - 1)
+
+def _buckets_of_word(word):
+    buckets = _word_buckets.get(word)
+    if buckets is None:
+        buckets = [_hash(word)]
+        if len(word) > 4:
+            padded = f"<{word}>"
+            buckets.extend(_hash("#" + padded[i:i + 3]) for i in range(len(padded) - 2))
+        if len(_word_buckets) >= _MAX_CACHED_WORDS:
+            _word_buckets.clear()
+        _word_buckets[word] = buckets
+    return buckets
+
+def text_buckets(text):
+    """Returns the hashed feature buckets of `text`, one entry per occurrence."""
+    buckets = []
+    for word in _WORD.findall((text or "")[:MAX_TEXT_CHARS].lower()):
+        buckets.extend(_buckets_of_word(word))
+    return buckets
+
+def _bucket_keys(texts):
+    """
+    Flattens the features of many texts into (row, bucket) pairs encoded as
+    row * BUCKETS + bucket, deduplicated with their counts.
+    """
+    rows, buckets = [], []
+    for row, text in enumerate(texts):
+        features = text_buckets(text)
+        buckets.extend(features)
+        rows.extend([row] * len(features))
+    if not buckets:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    keys = np.asarray(rows, dtype=np.int64) * BUCKETS + np.asarray(buckets, dtype=np.int64)
+    return np.unique(keys, return_counts=True)
+
+def _projection():
+    """Maps every bucket to a dimension and a sign (the hashing trick)."""
+    buckets = np.arange(BUCKETS, dtype=np.int64)
+    dims = buckets % DIMENSIONS
+    signs = np.where((buckets >> (BUCKET_BITS - 1)) & 1, -1.0, 1.0).astype(np.float32)
+    return dims, signs
+
+def vectorize(texts, idf, dims, signs):
+    """
+    Builds L2-normalized float32 vectors for `texts`.
+
+    Args:
+        texts: Strings to vectorize.
+        idf: Inverse document frequency per bucket.
+        dims, signs: The bucket projection from `_projection`.
+
+    Returns:
+        A (len(texts), DIMENSIONS) array; texts without features are all zeros.
+    """
+    keys, counts = _bucket_keys(texts)
+    rows = keys // BUCKETS
+    buckets = keys % BUCKETS
+    weights = (1.0 + np.log(counts)) * idf[buckets] * signs[buckets]
+    vectors = np.bincount(
+        rows * DIMENSIONS + dims[buckets], weights=weights, minlength=len(texts) * DIMENSIONS
+    ).astype(np.float32).reshape(len(texts), DIMENSIONS)
+    return _normalize(vectors)
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+def _iter_message_blocks(conn):
+    """
+    Yields lists of (rowid, conversation_id, text) for the messages to index,
+    in rowid order. Compressed bodies are decoded before MIN_CONTENT_CHARS is
+    applied, since length() of a BLOB counts compressed bytes.
+    """
+    cursor = conn.execute("""
+        SELECT rowid, conversation_id, content FROM Messages
+        WHERE typeof(content) = 'blob' OR length(content) >= ?
+        ORDER BY rowid
+    """, (MIN_CONTENT_CHARS,))
+    while True:
+        rows = cursor.fetchmany(BUILD_BLOCK_SIZE)
+        if not rows:
+            return
+        block = [(rowid, conversation_id, decode_content(content)) for rowid, conversation_id, content in rows]
+        block = [row for row in block if len(row[2]) >= MIN_CONTENT_CHARS]
+        if block:
+            yield block
+
+def read_vector_meta(path):
+    try:
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def build_vector_index(db_path, force=False):
+    """
+    Writes the message and conversation vectors for `db_path` to
+    `<db_path>.vectors/`, replacing the previous index once the new one is
+    complete. Two passes over Messages: one for document frequencies, one to
+    write the vectors.
+
+    Args:
+        db_path: SQLite database to index.
+        force: Rebuild even if the index already matches the ingest generation.
+
+    Returns:
+        A dict of build statistics, or None if the index was already current.
+    """
+    if np is None:
+        raise RuntimeError("Semantic search needs NumPy (pip install numpy)")
+
+    started = time.perf_counter()
+    path = vector_index_path(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        generation = get_ingest_generation(conn)
+        meta = read_vector_meta(path)
+        if not force and meta and meta.get("generation") == generation and meta.get("dimensions") == DIMENSIONS:
+            return None
+
+        # Pass 1: document frequency per bucket
+        document_frequency = np.zeros(BUCKETS, dtype=np.int64)
+        message_count = 0
+        for block in _iter_message_blocks(conn):
+            keys, _ = _bucket_keys(row[2] for row in block)
+            document_frequency += np.bincount(keys % BUCKETS, minlength=BUCKETS)
+            message_count += len(block)
+        conversations = conn.execute("SELECT rowid, conversation_id, title FROM Conversations ORDER BY rowid").fetchall()
+        idf = (np.log((1 + message_count) / (1 + document_frequency)) + 1.0).astype(np.float32)
+        dims, signs = _projection()
+
+        temp_path = path + ".tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        np.save(os.path.join(temp_path, "idf.npy"), idf)
+
+        # Pass 2: message vectors, summed per conversation on the way
+        conversation_index = {row[1]: index for index, row in enumerate(conversations)}
+        conversation_sums = np.zeros((len(conversations), DIMENSIONS), dtype=np.float32)
+        message_vectors = np.lib.format.open_memmap(
+            os.path.join(temp_path, "messages.npy"), mode="w+", dtype=np.float32,
+            shape=(message_count, DIMENSIONS),
+        )
+        # -1 marks rows left empty if Messages shrank between the passes
+        message_rowids = np.full(message_count, -1, dtype=np.int64)
+        offset = 0
+        for block in _iter_message_blocks(conn):
+            # Messages added since pass 1 are left for the next build
+            block = block[:message_count - offset]
+            if not block:
+                break
+            vectors = vectorize([row[2] for row in block], idf, dims, signs)
+            message_vectors[offset:offset + len(block)] = vectors
+            message_rowids[offset:offset + len(block)] = [row[0] for row in block]
+            owners = np.array([conversation_index.get(row[1], -1) for row in block], dtype=np.int64)
+            linked = owners >= 0
+            np.add.at(conversation_sums, owners[linked], vectors[linked])
+            offset += len(block)
+        message_vectors.flush()
+        del message_vectors
+        np.save(os.path.join(temp_path, "message_rowids.npy"), message_rowids)
+
+        conversation_vectors = _normalize(conversation_sums) + vectorize(
+            [row[2] for row in conversations], idf, dims, signs
+        )
+        np.save(os.path.join(temp_path, "conversations.npy"), _normalize(conversation_vectors))
+        np.save(
+            os.path.join(temp_path, "conversation_rowids.npy"),
+            np.array([row[0] for row in conversations], dtype=np.int64),
+        )
+
+        stats = {
+            "generation": generation,
+            "dimensions": DIMENSIONS,
+            "buckets": BUCKETS,
+            "messages": offset,
+            "conversations": len(conversations),
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "build_seconds": round(time.perf_counter() - started, 3),
+        }
+        with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump(stats, file)
+    finally:
+        conn.close()
+
+    # Readers keep their memory maps of the old files until they reload
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(temp_path, path)
+    return stats
+
+class VectorIndex:
+    """A loaded (memory-mapped) vector index."""
+
+    def __init__(self, path):
+        self.path = path
+        self.meta = read_vector_meta(path)
+        if self.meta is None:
+            raise ValueError(f"No readable meta.json in {path}")
+        self.idf = np.load(os.path.join(path, "idf.npy"))
+        self.messages = np.load(os.path.join(path, "messages.npy"), mmap_mode="r")
+        self.message_rowids = np.load(os.path.join(path, "message_rowids.npy"))
+        self.conversations = np.load(os.path.join(path, "conversations.npy"), mmap_mode="r")
+        self.conversation_rowids = np.load(os.path.join(path, "conversation_rowids.npy"))
+        self.dims, self.signs = _projection()
+
+    def query_vector(self, query):
+        return vectorize([query], self.idf, self.dims, self.signs)[0]
+
+    @staticmethod
+    def top_k(matrix, vector, k):
+        """
+        Scores every row of `matrix` against `vector` block by block and
+        returns the (scores, row indices) of the best `k`, best first.
+        """
+        best_scores, best_rows = [], []
+        for start in range(0, len(matrix), SCORE_BLOCK_SIZE):
+            scores = matrix[start:start + SCORE_BLOCK_SIZE] @ vector
+            if len(scores) > k:
+                rows = np.argpartition(scores, -k)[-k:]
+                scores = scores[rows]
+            else:
+                rows = np.arange(len(scores))
+            best_scores.append(scores)
+            best_rows.append(rows + start)
+        if not best_scores:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        scores = np.concatenate(best_scores)
+        rows = np.concatenate(best_rows)
+        order = np.argsort(-scores)[:k]
+        keep = scores[order] >= MIN_SCORE
+        return scores[order][keep], rows[order][keep]
+
+    def search(self, query, limit):
+        """
+        Returns ([(conversation rowid, score)], [(message rowid, score)]) for
+        the `limit` most similar conversations and messages.
+        """
+        vector = self.query_vector(query)
+        if not vector.any():
+            return [], []
+        scores, rows = self.top_k(self.conversations, vector, limit)
+        conversations = list(zip(self.conversation_rowids[rows].tolist(), scores.tolist()))
+        scores, rows = self.top_k(self.messages, vector, limit)
+        messages = list(zip(self.message_rowids[rows].tolist(), scores.tolist()))
+        return conversations, messages
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+def load_vector_index(db_path):
+    """
+    Returns the VectorIndex for `db_path`, reloading it when the importer has
+    replaced it, or None if NumPy is missing or no index was built.
+    """
+    if np is None:
+        return None
+    path = vector_index_path(db_path)
+    try:
+        version = os.stat(os.path.join(path, "meta.json")).st_mtime_ns
+    except OSError:
+        return None
+    with _loaded_lock:
+        entry = _loaded.get(path)
+        if entry is None or entry[0] != version:
+            try:
+                entry = (version, VectorIndex(path))
+            except (OSError, ValueError):
+                # Caught mid-rebuild; try again on the next query
+                return None
+            _loaded[path] = entry
+        return entry[1]
+
+def _snippet(text, length=200):
+    text = " ".join((text or "").split())
+    return text if len(text) <= length else text[:length].rstrip() + "…"
+
+def semantic_search(conn, db_path, query, limit, index=None):
+    """
+    Finds the conversations and messages closest in meaning to `query`.
+
+    Args:
+        index: A VectorIndex already loaded for `db_path`, so a rebuild
+            finishing meanwhile cannot make it disappear; loaded if omitted.
+
+    Returns:
+        (conversation rows, message rows) shaped like search_conversations and
+        search_messages, with `score` (cosine similarity) and `rank` = -score,
+        best first. None if the vector index is unavailable.
+    """
+    if index is None:
+        index = load_vector_index(db_path)
+    if index is None:
+        return None
+    conversation_hits, message_hits = index.search(query, limit)
+
+    conversations = _fetch_by_rowid(conn, "Conversations", "conversation_id, title, create_time", conversation_hits)
+    for row in conversations:
+        row["title_highlight"] = row["title"]
+    messages = _fetch_by_rowid(
+        conn, "Messages", "message_id, conversation_id, author_role, content, create_time", message_hits
+    )
+    for row in messages:
+        row["content"] = decode_content(row["content"])
+        row["snippet"] = _snippet(row["content"])
+    return conversations, messages
+
+def _fetch_by_rowid(conn, table, columns, hits):
+    if not hits:
+        return []
+    rows = {
+        row["rowid"]: dict(row)
+        for chunk, placeholders in iter_id_chunks(dict(hits))
+        for row in conn.execute(f"SELECT rowid, {columns} FROM {table} WHERE rowid IN ({placeholders})", chunk)
+    }
+    results = []
+    for rowid, score in hits:
+        row = rows.get(rowid)
+        # Rows deleted since the index was built are skipped
+        if row is not None:
+            del row["rowid"]
+            row["score"] = round(score, 4)
+            row["rank"] = -row["score"]
+            results.append(row)
+    return results
+
+def get_vector_index_stats(db_path):
+    meta = read_vector_meta(vector_index_path(db_path))
+    return {"available": is_available(), "index": meta}
@@ -0,0 +1,242 @@
+# app/suggest.py
+
+"""
+Search box completions served from memory.
+
+Conversation titles and the most frequent past queries (app/history.py) are
+case-folded, their whitespace collapsed, and kept in sorted arrays of keys. A
+title is keyed from each of its first words as well, so "latency" completes
+"Query the latency of search". Completing a prefix is a bisect into the
+array. A prefix matching few keys has its matches sorted by rank; one matching
+many keys is answered by walking the keys in rank order until enough of them
+start with it, which takes few steps precisely because so many do.
+
+The index is built on the first request, rebuilt in the background when the
+ingest generation moves (titles changed) or after HISTORY_REFRESH seconds
+(new queries), and the previous index keeps answering until the new one is
+ready. A failed build is retried after REBUILD_RETRY seconds, backing off
+up to MAX_REBUILD_RETRY.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import closing
+
+from .db import get_db_connection, get_ingest_generation
+from .history import get_top_queries
+
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+
+# Past queries offered as completions, most searched first
+HISTORY_QUERIES = 1000
+
+# Seconds before the query history is reloaded
+HISTORY_REFRESH = 60
+
+# Words of a title it can be completed from
+MAX_TITLE_WORDS = 12
+
+# Seconds before retrying a failed build, doubled after each further failure
+REBUILD_RETRY = 5
+MAX_REBUILD_RETRY = 300
+
+# Prefixes matching more keys than this are answered from the rank order
+_SORT_LIMIT = 2000
+
+# Sorts after any character a key can contain
+_KEY_END = "\U0010ffff"
+
+def normalize(text):
+    """Case-folds `text` and collapses its whitespace, keeping one trailing space."""
+    text = text or ""
+    key = " ".join(text.casefold().split())
+    if key and text[-1:].isspace():
+        key += " "
+    return key
+
+class _PrefixKeys:
+    """(key, rank, entry) items sorted by key, plus the same keys sorted by rank."""
+
+    def __init__(self, items):
+        items.sort()
+        self.keys = [key for key, _, _ in items]
+        self.ranked = [(rank, entry) for _, rank, entry in items]
+        items.sort(key=lambda item: item[1])
+        self.by_rank = [(key, entry) for key, _, entry in items]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def matches(self, prefix):
+        """Yields the entries of keys starting with `prefix`, best rank first (with repeats)."""
+        low = bisect.bisect_left(self.keys, prefix)
+        high = bisect.bisect_left(self.keys, prefix + _KEY_END, low)
+        if high - low <= _SORT_LIMIT:
+            for _, entry in sorted(self.ranked[low:high]):
+                yield entry
+        else:
+            for key, entry in self.by_rank:
+                if key.startswith(prefix):
+                    yield entry
+
+class SuggestIndex:
+    """
+    Prefix keys over titles and past queries. Past queries and titles that
+    start with the prefix come first, then titles completed from a later
+    word; queries rank by how often they were searched, titles by how
+    recently their conversation was updated, queries before titles.
+    """
+
+    def __init__(self, titles, queries, generation=None):
+        """
+        Args:
+            titles: (conversation_id, title, update_time) rows.
+            queries: (query, search_count) rows.
+            generation: The ingest generation the titles were read at.
+        """
+        self.generation = generation
+        self.built_at = time.monotonic()
+        # (kind, text, conversation_id)
+        self.entries = []
+        starts, later_words = [], []
+        for query, count in queries:
+            key = normalize(query).rstrip()
+            if key:
+                self.entries.append(("query", query.strip(), None))
+                starts.append((key, (0, -(count or 0)), len(self.entries) - 1))
+        for conversation_id, title, update_time in titles:
+            key = normalize(title).rstrip()
+            if not key:
+                continue
+            self.entries.append(("title", title.strip(), conversation_id))
+            entry = len(self.entries) - 1
+            rank = (1, -(update_time or 0))
+            starts.append((key, rank, entry))
+            words = key.split(" ")[:MAX_TITLE_WORDS]
+            start = len(words[0]) + 1
+            for word in words[1:]:
+                later_words.append((key[start:], rank, entry))
+                start += len(word) + 1
+        self._starts = _PrefixKeys(starts)
+        self._later_words = _PrefixKeys(later_words)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def complete(self, prefix, limit=DEFAULT_SUGGESTIONS):
+        """
+        Returns up to `limit` completions of `prefix` as dicts with `text`,
+        `kind` ('query' or 'title') and, for titles, `conversation_id`.
+        Each text is offered once per kind.
+        """
+        prefix = normalize(prefix)
+        if not prefix.strip():
+            return []
+        completions, seen_entries, seen_texts = [], set(), set()
+        for keys in (self._starts, self._later_words):
+            for entry in keys.matches(prefix):
+                if len(completions) == limit:
+                    return completions
+                if entry in seen_entries:
+                    continue
+                seen_entries.add(entry)
+                kind, text, conversation_id = self.entries[entry]
+                if (kind, text.casefold()) in seen_texts:
+                    continue
+                seen_texts.add((kind, text.casefold()))
+                completion = {"text": text, "kind": kind}
+                if conversation_id is not None:
+                    completion["conversation_id"] = conversation_id
+                completions.append(completion)
+        return completions
+
+def build_suggest_index(conn):
+    """Reads the titles and the query history into a new SuggestIndex."""
+    generation = get_ingest_generation(conn)
+    titles = conn.execute("SELECT conversation_id, title, update_time FROM Conversations").fetchall()
+    queries = [(row["query"], row["search_count"]) for row in get_top_queries(HISTORY_QUERIES)]
+    return SuggestIndex(titles, queries, generation)
+
+_index = None
+_index_lock = threading.Lock()
+_rebuilding = False
+# Consecutive failed builds, and the monotonic time the next one may start
+_failures = 0
+_retry_at = 0.0
+# Set once the first build attempt has finished, successful or not
+_first_attempt = threading.Event()
+
+# Answers requests until the first build succeeds
+_EMPTY_INDEX = SuggestIndex([], [])
+
+def _is_stale(index, generation):
+    return index.generation != generation or time.monotonic() - index.built_at > HISTORY_REFRESH
+
+def _build():
+    """Builds and installs a new index; on failure records it for the backoff and returns None."""
+    global _index, _failures, _retry_at
+    try:
+        with closing(get_db_connection()) as conn:
+            index = build_suggest_index(conn)
+    except Exception:
+        with _index_lock:
+            _failures += 1
+            delay = min(REBUILD_RETRY * 2 ** (_failures - 1), MAX_REBUILD_RETRY)
+            _retry_at = time.monotonic() + delay
+        logging.exception("Building the suggestion index failed; retrying in %g seconds", delay)
+        return None
+    finally:
+        _first_attempt.set()
+    with _index_lock:
+        _failures, _retry_at = 0, 0.0
+        if _index is None or _index.built_at < index.built_at:
+            _index = index
+        return _index
+
+def _rebuild():
+    global _rebuilding
+    try:
+        _build()
+    finally:
+        with _index_lock:
+            _rebuilding = False
+
+def _start_rebuild():
+    """Starts a background build unless one is running or backing off. Needs _index_lock."""
+    global _rebuilding
+    if _rebuilding or time.monotonic() < _retry_at:
+        return
+    _rebuilding = True
+    threading.Thread(target=_rebuild, name="suggest-index", daemon=True).start()
+
+def get_suggest_index(conn):
+    """
+    Returns the current SuggestIndex. The first call builds it, or waits
+    for the warm-up build already running; while builds keep failing there
+    are no completions. Later calls start a background rebuild when it is
+    stale and return the current one meanwhile.
+    """
+    generation = get_ingest_generation(conn)
+    with _index_lock:
+        index = _index
+        if index is not None:
+            if _is_stale(index, generation):
+                _start_rebuild()
+            return index
+        building = _rebuilding
+        backing_off = time.monotonic() < _retry_at
+    if backing_off:
+        return _EMPTY_INDEX
+    if building:
+        _first_attempt.wait()
+        return _index or _EMPTY_INDEX
+    return _build() or _EMPTY_INDEX
+
+def warm_suggest_index():
+    """Starts building the index in the background if nothing has built it yet."""
+    with _index_lock:
+        if _index is None:
+            _start_rebuild()
@@ -0,0 +1,140 @@
+# app/summary.py
+
+"""
+Materialized per-conversation summaries.
+
+The ingest keeps one ConversationSummary row per conversation up to date so
+listing pages can be rendered from a single indexed query instead of loading
+every message of every conversation on the page.
+"""
+
+from .cache import cached_query
+from .compression import register_content_functions
+from .db import iter_id_chunks
+
+PREVIEW_LENGTH = 200
+
+# Conversation list order, newest first. Conversations without a create_time
+# sort as the oldest: a NULL in the keyset would compare as unknown and end
+# the listing at the first such row.
+LIST_SORT_KEY = "IFNULL(create_time, 0)"
+
+SUMMARY_COLUMNS = [
+    "conversation_id",
+    "title",
+    "create_time",
+    "update_time",
+    "message_count",
+    "first_message_time",
+    "last_message_time",
+    "user_messages",
+    "assistant_messages",
+    "system_messages",
+    "tool_messages",
+    "preview",
+]
+
+def has_summary_table(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ConversationSummary'"
+    ).fetchone() is not None
+
+def ensure_summary_table(conn):
+    """
+    Creates ConversationSummary and its index, filling it from Conversations
+    and Messages the first time in the same transaction, which the caller
+    commits. Messages and Conversations must already exist.
+    """
+    existed = has_summary_table(conn)
+    if not existed and not conn.in_transaction:
+        # DDL does not open a transaction by itself; an interrupted backfill
+        # must not leave an empty table behind
+        conn.execute("BEGIN")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ConversationSummary (
+            conversation_id TEXT PRIMARY KEY,
+            title TEXT,
+            create_time REAL,
+            update_time REAL,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            first_message_time REAL,
+            last_message_time REAL,
+            user_messages INTEGER NOT NULL DEFAULT 0,
+            assistant_messages INTEGER NOT NULL DEFAULT 0,
+            system_messages INTEGER NOT NULL DEFAULT 0,
+            tool_messages INTEGER NOT NULL DEFAULT 0,
+            preview TEXT
+        )
+    """)
+    # Date range filters on the conversation list
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversation_summary_create_time
+        ON ConversationSummary (create_time, conversation_id)
+    """)
+    # Keyset pagination order; must match LIST_SORT_KEY exactly to be used
+    conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_conversation_summary_sort
+        ON ConversationSummary ({LIST_SORT_KEY}, conversation_id)
+    """)
+    if not existed:
+        refresh_conversation_summaries(conn)
+
+_REFRESH_QUERY = f"""
+    INSERT OR REPLACE INTO ConversationSummary ({", ".join(SUMMARY_COLUMNS)})
+    SELECT
+        c.conversation_id,
+        c.title,
+        c.create_time,
+        c.update_time,
+        COUNT(m.message_id),
+        MIN(m.create_time),
+        MAX(m.create_time),
+        COUNT(CASE WHEN m.author_role = 'user' THEN 1 END),
+        COUNT(CASE WHEN m.author_role = 'assistant' THEN 1 END),
+        COUNT(CASE WHEN m.author_role = 'system' THEN 1 END),
+        COUNT(CASE WHEN m.author_role = 'tool' THEN 1 END),
+        (
+            SELECT substr(inflate_content(p.content), 1, {PREVIEW_LENGTH})
+            FROM Messages p
+            WHERE p.conversation_id = c.conversation_id
+              AND p.author_role = 'user'
+              AND p.content IS NOT NULL AND p.content != ''
+            ORDER BY p.create_time ASC
+            LIMIT 1
+        )
+    FROM Conversations c
+    LEFT JOIN Messages m ON m.conversation_id = c.conversation_id
+    {{where}}
+    GROUP BY c.conversation_id
+"""
+
+def refresh_conversation_summaries(conn, conversation_ids=None):
+    """
+    Recomputes ConversationSummary rows from Conversations and Messages.
+
+    Args:
+        conn: An open connection; the caller owns the transaction.
+        conversation_ids: The conversations to refresh, or None to rebuild all.
+    """
+    # Previews of compressed bodies are cut from the inflated text
+    register_content_functions(conn)
+    if conversation_ids is None:
+        conn.execute(_REFRESH_QUERY.format(where=""))
+        return
+
+    for chunk, placeholders in iter_id_chunks(conversation_ids):
+        conn.execute(
+            _REFRESH_QUERY.format(where=f"WHERE c.conversation_id IN ({placeholders})"),
+            chunk,
+        )
+
+def count_conversations(conn, where="1=1", params=()):
+    """
+    Counts ConversationSummary rows matching `where`, reusing the last result
+    for the same filter until the data changes (see app/cache.py).
+    """
+    return cached_query(
+        conn,
+        ("count_conversations", where, tuple(params)),
+        lambda: conn.execute(f"SELECT COUNT(*) FROM ConversationSummary WHERE {where}", params).fetchone()[0],
+    )
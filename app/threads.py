@@ -0,0 +1,204 @@
+# app/threads.py
+
+"""
+Materialized thread layout for branching conversations.
+
+ChatGPT stores a conversation as a tree: regenerating an answer or editing a
+prompt starts a sibling branch, and `current_node` marks the leaf of the branch
+the user last saw. Each message row carries:
+
+    depth            distance from the root of the tree
+    branch_position  order along the active branch (NULL for messages on other branches)
+    tree_path        materialized path with one "/<sibling index>/" segment per branch point
+
+Linear stretches of a conversation share their path, so paths only grow at
+branch points. The subtree of a message is then every row of the conversation
+whose tree_path starts with the message's path and whose depth is at least its
+depth, and ordering by (tree_path, depth) lists the tree depth-first. Both the
+active branch and any sub-branch come back from one indexed range query.
+"""
+
+# Upper bound for tree_path range scans; sorts after every digit and "/".
+_PATH_END = "~"
+
+def _path_segment(index):
+    """
+    Encodes a sibling index for tree_path as its digit count followed by its
+    digits ("10", "19", "210", "41000"), so segments sort numerically as
+    text however many siblings a message has.
+    """
+    digits = str(index)
+    return f"{len(digits)}{digits}"
+
+def thread_layout(parents, current_node=None, children=None):
+    """
+    Computes depth, active-branch position and materialized path per node.
+
+    Args:
+        parents: Maps node id -> parent id (None, or an id not in the dict, for
+            roots), in sibling order.
+        current_node: The leaf of the active branch. When missing or unknown,
+            the branch is found by following the last child from the first root.
+        children: Optional node id -> ordered child ids, e.g. the export's own
+            `children` lists. Derived from `parents` when omitted.
+
+    Returns:
+        A dict mapping node id -> (depth, branch_position, tree_path).
+    """
+    if children is None:
+        children = {node_id: [] for node_id in parents}
+        for node_id, parent in parents.items():
+            if parent in children:
+                children[parent].append(node_id)
+    roots = [node_id for node_id, parent in parents.items() if parent not in parents]
+
+    layout = {}
+    stack = [
+        (root, 0, f"/{_path_segment(index)}/" if len(roots) > 1 else "/")
+        for index, root in reversed(list(enumerate(roots)))
+    ]
+    while stack:
+        node_id, depth, path = stack.pop()
+        if node_id in layout:
+            continue  # malformed export with a cycle or shared child
+        layout[node_id] = [depth, None, path]
+        kids = [child for child in children.get(node_id) or [] if child in parents]
+        if len(kids) == 1:
+            stack.append((kids[0], depth + 1, path))
+        else:
+            for index, child in reversed(list(enumerate(kids))):
+                stack.append((child, depth + 1, f"{path}{_path_segment(index)}/"))
+
+    if current_node not in layout:
+        current_node = roots[0] if roots else None
+        while current_node is not None:
+            kids = [child for child in children.get(current_node) or [] if child in layout]
+            if not kids:
+                break
+            current_node = kids[-1]
+
+    branch, seen = [], set()
+    while current_node in layout and current_node not in seen:
+        seen.add(current_node)
+        branch.append(current_node)
+        current_node = parents.get(current_node)
+    for position, node_id in enumerate(reversed(branch)):
+        layout[node_id][1] = position
+
+    return {node_id: tuple(values) for node_id, values in layout.items()}
+
+def refresh_thread_layout(conn, conversation_ids=None):
+    """
+    Recomputes depth, branch_position and tree_path from the stored parent_id
+    links, for databases imported before the importer computed them. Siblings
+    are ordered by create_time, and the active branch ends at
+    Conversations.current_node when known, otherwise at the newest leaf.
+
+    Args:
+        conn: An open connection; the caller owns the transaction.
+        conversation_ids: The conversations to refresh, or None for all.
+    """
+    if conversation_ids is None:
+        conversation_ids = [row[0] for row in conn.execute(
+            "SELECT DISTINCT conversation_id FROM Messages WHERE conversation_id IS NOT NULL"
+        )]
+
+    for conversation_id in conversation_ids:
+        row = conn.execute(
+            "SELECT current_node FROM Conversations WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        parents = {
+            message_id: parent_id
+            for message_id, parent_id in conn.execute(
+                "SELECT message_id, parent_id FROM Messages WHERE conversation_id = ? "
+                "ORDER BY create_time, message_id",
+                (conversation_id,),
+            )
+        }
+        layout = thread_layout(parents, row[0] if row else None)
+        conn.executemany(
+            "UPDATE Messages SET depth = ?, branch_position = ?, tree_path = ? WHERE message_id = ?",
+            [(*layout[message_id], message_id) for message_id in parents],
+        )
+
+def fetch_active_branch(conn, conversation_id):
+    """Returns the messages of the active branch, root first."""
+    return conn.execute(
+        """
+        SELECT * FROM Messages
+        WHERE conversation_id = ? AND branch_position IS NOT NULL
+        ORDER BY branch_position
+        """,
+        (conversation_id,),
+    ).fetchall()
+
+def fetch_thread_tree(conn, conversation_id):
+    """Returns every message of the conversation in depth-first tree order."""
+    return conn.execute(
+        "SELECT * FROM Messages WHERE conversation_id = ? ORDER BY tree_path, depth",
+        (conversation_id,),
+    ).fetchall()
+
+def fetch_subtree(conn, message_id):
+    """
+    Returns a message and all of its descendants in depth-first order, or an
+    empty list if the message is unknown or has no layout yet.
+    """
+    root = conn.execute(
+        "SELECT conversation_id, depth, tree_path FROM Messages WHERE message_id = ?", (message_id,)
+    ).fetchone()
+    if root is None or root["tree_path"] is None:
+        return []
+    return conn.execute(
+        """
+        SELECT * FROM Messages
+        WHERE conversation_id = ? AND tree_path >= ? AND tree_path < ? AND depth >= ?
+        ORDER BY tree_path, depth
+        """,
+        (root["conversation_id"], root["tree_path"], root["tree_path"] + _PATH_END, root["depth"]),
+    ).fetchall()
+
+# Keyset orders for fetch_message_page: (unique sort key columns, extra filter).
+# Legacy rows without a layout are paged by time; NULL times sort first.
+_PAGE_ORDERS = {
+    "active": (("branch_position",), "branch_position IS NOT NULL"),
+    "tree": (("tree_path", "depth"), "1=1"),
+    "time": (("IFNULL(create_time, 0)", "message_id"), "1=1"),
+}
+
+def fetch_message_page(conn, conversation_id, after=None, limit=50, all_branches=False):
+    """
+    Returns one page of a conversation's messages, in the same order as
+    fetch_active_branch / fetch_thread_tree, starting after a keyset position.
+
+    Args:
+        after: The sort key of the last message already shown, as returned in
+            `next_key`, or None for the first page. A key that does not fit
+            the conversation's ordering starts from the beginning.
+        limit: Messages per page.
+        all_branches: Page through the whole tree instead of the active branch.
+
+    Returns:
+        (rows, next_key) where next_key is None on the last page.
+    """
+    has_layout = conn.execute(
+        "SELECT 1 FROM Messages WHERE conversation_id = ? AND tree_path IS NOT NULL LIMIT 1",
+        (conversation_id,),
+    ).fetchone() is not None
+    keys, where = _PAGE_ORDERS[("tree" if all_branches else "active") if has_layout else "time"]
+    key_list = ", ".join(keys)
+
+    sql = f"SELECT *, {key_list} FROM Messages WHERE conversation_id = ? AND {where}"
+    params = [conversation_id]
+    if after is not None and len(after) == len(keys):
+        sql += f" AND ({key_list}) > ({', '.join('?' for _ in keys)})"
+        params.extend(after)
+    sql += f" ORDER BY {key_list} LIMIT ?"
+    params.append(limit + 1)
+
+    rows = conn.execute(sql, params).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    # The key columns were appended after Messages.*
+    return rows, tuple(rows[-1][-len(keys):])
@@ -1,8 +1,9 @@
 # app/utils.py
 
 import json
-from datetime import datetime
-import os
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
 
 def format_timestamp(unix_timestamp):
     """
@@ -16,38 +17,99 @@ def format_timestamp(unix_timestamp):
     except (ValueError, TypeError):
         return "N/A"
 
-def log_search(query, start_date, end_date):
-    log_entry = {
-        "query": query,
-        "start_date": start_date,
-        "end_date": end_date,
-        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }
+def date_to_epoch(date_string, end_of_day=False):
+    """
+    Converts a 'YYYY-MM-DD' date from the filter form into Unix epoch seconds (UTC).
+
+    Args:
+        date_string: The date to convert.
+        end_of_day: If True, returns the start of the following day, for use
+            as an exclusive upper bound.
+
+    Returns:
+        The epoch seconds as a float, or None if the date is empty or invalid.
+    """
+    try:
+        day = datetime.strptime(date_string, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    except (ValueError, TypeError):
+        return None
+    if end_of_day:
+        day += timedelta(days=1)
+    return day.timestamp()
 
-    log_file_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'search_history.json')
-    
+def month_to_epochs(month_string):
+    """
+    Converts a 'YYYY-MM' month into epoch bounds (UTC).
+
+    Returns:
+        (start, end) with `end` exclusive, or None if the month is invalid.
+    """
     try:
-        os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
-
-        if os.path.exists(log_file_path):
-            with open(log_file_path, 'r+') as file:
-                data = json.load(file) if file.read() else []
-                data.append(log_entry)
-                file.seek(0)
-                json.dump(data, file, indent=4)
-        else:
-            with open(log_file_path, 'w') as file:
-                json.dump([log_entry], file, indent=4)
-    except Exception as e:
-        print(f"Error writing to search history file: {e}")
-
-def get_recent_searches(limit=5):
-    log_file_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'search_history.json')
+        start = datetime.strptime(month_string, '%Y-%m').replace(tzinfo=timezone.utc)
+    except (ValueError, TypeError):
+        return None
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start.timestamp(), end.timestamp()
+
+def conversation_filter(query='', start_date='', end_date=''):
+    """
+    Builds the WHERE clause for the conversation list filters. Dates become
+    epoch bounds on create_time so its index is used.
+
+    Args:
+        query: Substring to match in the title.
+        start_date: Inclusive 'YYYY-MM-DD' lower bound.
+        end_date: Inclusive 'YYYY-MM-DD' upper bound.
+
+    Returns:
+        A (where, params) pair usable against Conversations or ConversationSummary.
+    """
+    filters, params = [], []
+    if query:
+        filters.append("title LIKE ?")
+        params.append(f"%{query}%")
+    start_epoch = date_to_epoch(start_date)
+    if start_epoch is not None:
+        filters.append("create_time >= ?")
+        params.append(start_epoch)
+    end_epoch = date_to_epoch(end_date, end_of_day=True)
+    if end_epoch is not None:
+        filters.append("create_time < ?")
+        params.append(end_epoch)
+    return " AND ".join(filters) or "1=1", params
+
+def encode_cursor(values):
+    """
+    Encodes a keyset pagination position (the sort-key values of a row) as an
+    opaque, URL-safe string.
+    """
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip("=")
+
+def _is_cursor_value(value):
+    """True for values SQLite can bind as a sort key: NULL, text, REAL or a 64-bit INTEGER."""
+    if isinstance(value, int):
+        return -2**63 <= value < 2**63
+    return value is None or isinstance(value, (str, float))
+
+def decode_cursor(cursor, size=2):
+    """
+    Decodes a cursor made by `encode_cursor`.
+
+    Args:
+        size: The expected number of values, or None to accept any length.
+
+    Returns:
+        The list of sort-key values, or None if the cursor is missing,
+        malformed or holds values that are not SQL scalars.
+    """
+    if not cursor:
+        return None
     try:
-        if os.path.exists(log_file_path):
-            with open(log_file_path, 'r') as file:
-                data = json.load(file)
-                return data[-limit:]
-    except Exception as e:
-        print(f"Error reading search history file: {e}")
-    return []
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list) or (size is not None and len(values) != size):
+        return None
+    if not all(_is_cursor_value(value) for value in values):
+        return None
+    return values
@@ -0,0 +1,165 @@
+# benchmarks/generate_export.py
+
+"""
+Writes a synthetic ChatGPT export folder shaped like the real thing:
+conversations.json with a message tree per conversation (an empty root node,
+a hidden system message, then alternating user/assistant turns, with some
+answers regenerated into sibling branches), plus message_feedback.json and
+model_comparisons.json.
+
+The output is fully determined by the arguments and the seed, so two runs
+with the same settings produce byte-identical files.
+"""
+
+import os
+import json
+import random
+import argparse
+
+WORDS = (
+    "the of and to in is for on with that this as are be it by from or an at "
+    "python sqlite index query flask thread vector cache page export import "
+    "retry backoff timeout latency request response schema migration batch "
+    "stream parser token branch summary search ranking snippet window cursor "
+    "memory disk compression benchmark profile worker queue writer reader"
+).split()
+
+START_TIME = 1672531200  # 2023-01-01 UTC
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(max(1, int(rng.gauss(words, words / 3)))))
+
+
+def _node(node_id, parent, role, text, create_time):
+    return {
+        "id": node_id,
+        "parent": parent,
+        "children": [],
+        "message": {
+            "id": node_id,
+            "author": {"role": role, "name": None, "metadata": {}},
+            "create_time": create_time,
+            "update_time": None,
+            "content": {"content_type": "text", "parts": [text]},
+            "status": "finished_successfully",
+            "end_turn": role == "assistant",
+            "weight": 1.0,
+            "metadata": {},
+            "recipient": "all",
+        },
+    }
+
+
+def make_conversation(rng, index, messages, branch_rate, content_words):
+    """
+    Builds one conversation with about `messages` messages on its active branch.
+    Each assistant answer is regenerated with probability `branch_rate`; the
+    last regeneration continues the conversation, like in ChatGPT.
+    """
+    conversation_id = f"bench-{index:07d}"
+    create_time = START_TIME + index * 1800 + rng.random()
+    clock = create_time
+
+    mapping = {"client-created-root": {"id": "client-created-root", "message": None, "parent": None, "children": []}}
+
+    def add(parent, role, text):
+        nonlocal clock
+        clock += rng.uniform(2, 90)
+        node_id = f"{conversation_id}-{len(mapping):05d}"
+        mapping[node_id] = _node(node_id, parent, role, text, clock)
+        mapping[parent]["children"].append(node_id)
+        return node_id
+
+    current = add("client-created-root", "system", "")
+    for turn in range(max(1, messages // 2)):
+        prompt = add(current, "user", _text(rng, content_words // 4))
+        current = add(prompt, "assistant", _text(rng, content_words))
+        while rng.random() < branch_rate:
+            current = add(prompt, "assistant", _text(rng, content_words))
+
+    return {
+        "title": f"{_text(rng, 4).capitalize()} #{index}",
+        "create_time": create_time,
+        "update_time": clock,
+        "mapping": mapping,
+        "moderation_results": [],
+        "current_node": current,
+        "plugin_ids": None,
+        "conversation_id": conversation_id,
+        "conversation_template_id": None,
+        "id": conversation_id,
+    }
+
+
+def generate_export(folder, conversations=1000, messages=20, branch_rate=0.1, content_words=60, seed=0):
+    """
+    Writes conversations.json, message_feedback.json and model_comparisons.json
+    into `folder`, streaming conversations to disk one at a time.
+
+    Args:
+        folder: Output folder, created if missing.
+        conversations: Number of conversations.
+        messages: Approximate messages per conversation on the active branch.
+        branch_rate: Probability that an answer is regenerated (repeatedly).
+        content_words: Average words per assistant message; prompts are a quarter.
+        seed: Random seed.
+
+    Returns:
+        A dict with the number of conversations, messages and bytes written.
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    feedback, comparisons = [], []
+    message_count = 0
+
+    path = os.path.join(folder, "conversations.json")
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("[")
+        for index in range(conversations):
+            conv = make_conversation(rng, index, messages, branch_rate, content_words)
+            message_count += len(conv["mapping"]) - 1
+            if rng.random() < 0.05:
+                feedback.append({
+                    "feedback_id": f"fb-{index:07d}",
+                    "conversation_id": conv["conversation_id"],
+                    "message_id": conv["current_node"],
+                    "type": rng.choice(["thumbsUp", "thumbsDown"]),
+                    "content": json.dumps({"text": _text(rng, 8)}),
+                })
+            if rng.random() < 0.01:
+                comparisons.append({
+                    "comparison_id": f"cmp-{index:07d}",
+                    "conversation_id": conv["conversation_id"],
+                    "criteria": rng.choice(["helpfulness", "accuracy", "style"]),
+                    "results": json.dumps({"preferred": rng.choice(["a", "b"])}),
+                })
+            file.write(("," if index else "") + json.dumps(conv))
+        file.write("]")
+
+    with open(os.path.join(folder, "message_feedback.json"), "w", encoding="utf-8") as file:
+        json.dump(feedback, file)
+    with open(os.path.join(folder, "model_comparisons.json"), "w", encoding="utf-8") as file:
+        json.dump(comparisons, file)
+
+    return {
+        "conversations": conversations,
+        "messages": message_count,
+        "bytes": os.path.getsize(path),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic ChatGPT export folder.")
+    parser.add_argument("folder", help="Output folder")
+    parser.add_argument("--conversations", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=20, help="Messages per conversation (active branch)")
+    parser.add_argument("--branch-rate", type=float, default=0.1, help="Chance an answer is regenerated")
+    parser.add_argument("--content-words", type=int, default=60, help="Average words per assistant message")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stats = generate_export(
+        args.folder, args.conversations, args.messages, args.branch_rate, args.content_words, args.seed
+    )
+    print(json.dumps(stats))
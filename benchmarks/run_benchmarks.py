@@ -0,0 +1,279 @@
+# benchmarks/run_benchmarks.py
+
+"""
+Timed scenarios for the importer and the web routes on a synthetic export.
+
+Generates an export (see generate_export.py), imports it with
+process_folders (sequential, parallel and a no-op incremental re-import),
+times a forced rebuild of the semantic vector index when NumPy is installed,
+then drives the index, conversation and search routes (full-text, semantic,
+substring and regex) through the Flask test client. Results are printed (or written with
+--output) as JSON so runs can be compared; --compare exits non-zero when a
+scenario's median regressed past --tolerance against a previous result file.
+
+    python benchmarks/run_benchmarks.py --conversations 2000 --output bench.json
+    python benchmarks/run_benchmarks.py --conversations 2000 --compare bench.json
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_export import WORDS, generate_export
+
+
+def summarize(samples, **extra):
+    """Timing statistics (seconds) for a list of samples."""
+    ordered = sorted(samples)
+    result = {
+        "iterations": len(ordered),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "mean": statistics.fmean(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "max": ordered[-1],
+    }
+    result.update(extra)
+    return result
+
+
+def timed(function, iterations, setup=None):
+    """Runs `function` `iterations` times (after `setup`, untimed) with stdout silenced."""
+    samples = []
+    sink = io.StringIO()
+    for iteration in range(iterations):
+        if setup is not None:
+            setup(iteration)
+        with redirect_stdout(sink):
+            start = time.perf_counter()
+            function(iteration)
+            samples.append(time.perf_counter() - start)
+        sink.seek(0)
+        sink.truncate()
+    return samples
+
+
+def run_ingest(folder, work_dir, workers, export_stats):
+    from chatgpt_folder_to_db_v2 import process_folders
+
+    results = {}
+    databases = {}
+    for name, kwargs in (
+        ("ingest_sequential", {"workers": 1}),
+        ("ingest_parallel", {"workers": workers}),
+    ):
+        db_path = os.path.join(work_dir, f"{name}.db")
+        samples = timed(lambda _: process_folders([folder], db_path, **kwargs), 1)
+        results[name] = summarize(
+            samples,
+            workers=kwargs["workers"],
+            messages_per_second=export_stats["messages"] / samples[0],
+        )
+        databases[name] = db_path
+
+    db_path = databases["ingest_sequential"]
+    samples = timed(lambda _: process_folders([folder], db_path, incremental=True), 1)
+    results["ingest_incremental_unchanged"] = summarize(samples)
+
+    from app.semantic import build_vector_index, is_available
+    if is_available():
+        samples = timed(lambda _: build_vector_index(db_path, force=True), 1)
+        results["vector_index_build"] = summarize(
+            samples, messages_per_second=export_stats["messages"] / samples[0]
+        )
+    return results, db_path
+
+
+def run_routes(db_path, iterations, seed):
+    from app.db import configure_database
+    from app.cache import invalidate_query_cache
+    from app.app import app
+
+    configure_database(db_path)
+    client = app.test_client()
+    rng = random.Random(seed)
+
+    conn = sqlite3.connect(db_path)
+    conversation_ids = [row[0] for row in conn.execute("SELECT conversation_id FROM Conversations")]
+    largest = conn.execute(
+        "SELECT conversation_id FROM ConversationSummary ORDER BY message_count DESC LIMIT 1"
+    ).fetchone()[0]
+    conn.close()
+    sample_ids = [rng.choice(conversation_ids) for _ in range(iterations)]
+    queries = [" ".join(rng.sample(WORDS[20:], 2)) for _ in range(iterations)]
+
+    def get(url, **params):
+        response = client.get(url, query_string=params or None)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} {params} returned {response.status_code}")
+        return response
+
+    def cold(_):
+        invalidate_query_cache()
+
+    def walk_pages(pages):
+        url = "/"
+        for _ in range(pages):
+            html = get(url).get_data(as_text=True)
+            match = re.search(r'<a href="([^"]*after=[^"]*)">Next</a>', html)
+            if not match:
+                break
+            url = match.group(1).replace("&amp;", "&")
+
+    second_page = get(f"/conversation/{largest}/messages").get_json()["next_cursor"]
+
+    results = {}
+    results["index_first_page"] = summarize(timed(lambda _: get("/"), iterations, setup=cold))
+    results["index_first_page_cached"] = summarize(timed(lambda _: get("/"), iterations))
+    results["index_walk_10_pages"] = summarize(timed(lambda _: walk_pages(10), max(1, iterations // 4), setup=cold))
+    results["index_title_filter"] = summarize(
+        timed(lambda i: get("/", query=rng.choice(WORDS[20:])), iterations, setup=cold)
+    )
+    results["conversation_view"] = summarize(timed(lambda i: get(f"/conversation/{sample_ids[i]}"), iterations))
+    results["conversation_view_all_branches"] = summarize(
+        timed(lambda i: get(f"/conversation/{sample_ids[i]}", branches="all"), iterations)
+    )
+    results["conversation_messages_page"] = summarize(
+        timed(lambda _: get(f"/conversation/{largest}/messages", cursor=second_page or ""), iterations)
+    )
+    results["search"] = summarize(timed(lambda i: get("/search", query=queries[i]), iterations, setup=cold))
+    results["search_cached"] = summarize(timed(lambda _: get("/search", query=queries[0]), iterations))
+    results["search_facets"] = summarize(
+        timed(lambda i: get("/search", query=queries[i], facets=1), iterations, setup=cold)
+    )
+    results["search_substring"] = summarize(
+        timed(lambda i: get("/search", query=queries[i], mode="substring"), iterations, setup=cold)
+    )
+    results["search_regex"] = summarize(
+        timed(lambda i: get("/search", query=queries[i].replace(" ", r"\s+"), mode="regex"), iterations, setup=cold)
+    )
+
+    get("/suggest", query=queries[0][:3])
+    results["suggest"] = summarize(timed(lambda i: get("/suggest", query=queries[i][:i % 6 + 1]), iterations))
+
+    from app.semantic import load_vector_index
+    if load_vector_index(db_path) is not None:
+        results["search_semantic"] = summarize(
+            timed(lambda i: get("/search", query=queries[i], mode="semantic"), iterations, setup=cold)
+        )
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, tolerance):
+    """Prints median ratios against a baseline and returns the regressed scenario names."""
+    regressed = []
+    for name, result in current["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        ratio = result["median"] / previous["median"] if previous["median"] else float("inf")
+        flag = "REGRESSED" if ratio > tolerance else ""
+        print(f"{name:34s} {previous['median'] * 1000:10.2f}ms -> {result['median'] * 1000:10.2f}ms  x{ratio:5.2f} {flag}",
+              file=sys.stderr)
+        if ratio > tolerance:
+            regressed.append(name)
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingest, browsing and search on a synthetic export.")
+    parser.add_argument("--conversations", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=20, help="Messages per conversation (active branch)")
+    parser.add_argument("--branch-rate", type=float, default=0.1)
+    parser.add_argument("--content-words", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=20, help="Requests timed per route scenario")
+    parser.add_argument("--workers", type=int, default=0, help="Workers for the parallel ingest (0 = one per CPU)")
+    parser.add_argument("--work-dir", help="Keep the export and databases here instead of a temp dir")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="Previous results file to compare medians against")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Median ratio counted as a regression")
+    args = parser.parse_args()
+
+    temp_dir = None
+    if args.work_dir:
+        work_dir = args.work_dir
+        os.makedirs(work_dir, exist_ok=True)
+    else:
+        temp_dir = tempfile.TemporaryDirectory(prefix="conversations-bench-")
+        work_dir = temp_dir.name
+    # Keep benchmark searches out of the real search history
+    os.environ["SEARCH_HISTORY_DB_PATH"] = os.path.join(work_dir, "search_history.db")
+
+    folder = os.path.join(work_dir, "export")
+    start = time.perf_counter()
+    export_stats = generate_export(
+        folder, args.conversations, args.messages, args.branch_rate, args.content_words, args.seed
+    )
+    export_stats["generate_seconds"] = time.perf_counter() - start
+    for name in os.listdir(work_dir):
+        if name.endswith((".db", ".db-wal", ".db-shm")):
+            os.remove(os.path.join(work_dir, name))
+
+    results, db_path = run_ingest(folder, work_dir, args.workers, export_stats)
+    results.update(run_routes(db_path, args.iterations, args.seed))
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "parameters": {
+                "conversations": args.conversations,
+                "messages": args.messages,
+                "branch_rate": args.branch_rate,
+                "content_words": args.content_words,
+                "seed": args.seed,
+                "iterations": args.iterations,
+            },
+            "export": export_stats,
+        },
+        "unit": "seconds",
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressed = compare(report, json.load(file), args.tolerance)
+        if regressed:
+            print(f"Regressed: {', '.join(regressed)}", file=sys.stderr)
+            exit_code = 1
+
+    if temp_dir is not None:
+        temp_dir.cleanup()
+    sys.exit(exit_code)
@@ -1,129 +1,783 @@
 import os
+import re
 import json
-import pandas as pd
+import time
+import queue
+import hashlib
 import sqlite3
+import argparse
+import threading
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from app.analytics import ensure_activity_rollups
+from app.compression import (
+    DEFAULT_COMPRESS_THRESHOLD, compress_content, get_compress_threshold, register_content_functions,
+    set_compress_threshold
+)
+from app.db import bump_ingest_generation, ensure_ingest_state
+from app.dedupe import DEDUPE_MODES, DEFAULT_THRESHOLD, deduplicate_conversations
+from app.search import deferred_trigram_index, ensure_search_index
+from app.semantic import build_vector_index, is_available as vectors_available
+from app.summary import ensure_summary_table, refresh_conversation_summaries
+from app.threads import refresh_thread_layout, thread_layout
+
+# Characters read from an export file per refill. Only the element currently
+# being decoded (plus one chunk) is ever held in memory.
+CHUNK_SIZE = 1 << 20
+
+# Rows buffered before they are written with executemany and committed.
+BATCH_SIZE = 5000
+
+# Export records (conversations, feedback entries, ...) handed to a parallel
+# worker at a time.
+SHARD_SIZE = 200
+
+JSON_FILES = ["conversations.json", "model_comparisons.json", "message_feedback.json"]
+
+SCHEMA = {
+    "Conversations": [
+        ("conversation_id", "TEXT PRIMARY KEY"),
+        ("title", "TEXT"),
+        ("create_time", "REAL"),
+        ("update_time", "REAL"),
+        ("current_node", "TEXT"),
+    ],
+    "Messages": [
+        ("message_id", "TEXT PRIMARY KEY"),
+        ("conversation_id", "TEXT"),
+        ("parent_id", "TEXT"),
+        ("author_role", "TEXT"),
+        ("content", "TEXT"),
+        ("create_time", "REAL"),
+        ("update_time", "REAL"),
+        ("status", "TEXT"),
+        # Thread layout, see app/threads.py
+        ("depth", "INTEGER"),
+        ("branch_position", "INTEGER"),
+        ("tree_path", "TEXT"),
+    ],
+    "ModelComparisons": [
+        ("comparison_id", "TEXT PRIMARY KEY"),
+        ("conversation_id", "TEXT"),
+        ("criteria", "TEXT"),
+        ("results", "TEXT"),
+    ],
+    "MessageFeedback": [
+        ("feedback_id", "TEXT PRIMARY KEY"),
+        ("message_id", "TEXT"),
+        ("feedback_type", "TEXT"),
+        ("feedback_content", "TEXT"),
+    ],
+    # What each import saw per conversation, so incremental runs can skip
+    # conversations that have not changed since.
+    "IngestManifest": [
+        ("conversation_id", "TEXT PRIMARY KEY"),
+        ("update_time", "REAL"),
+        ("content_hash", "TEXT"),
+        ("ingested_at", "TEXT"),
+    ],
+}
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_conversations_create_time ON Conversations (create_time)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_conversation_time ON Messages (conversation_id, create_time)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_active_branch ON Messages (conversation_id, branch_position) "
+    "WHERE branch_position IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx_messages_tree_path ON Messages (conversation_id, tree_path, depth)",
+    # Batched feedback / comparison lookups (app/helpers.py)
+    "CREATE INDEX IF NOT EXISTS idx_message_feedback_message_id ON MessageFeedback (message_id)",
+    "CREATE INDEX IF NOT EXISTS idx_model_comparisons_conversation_id ON ModelComparisons (conversation_id)",
+    # Superseded by idx_messages_conversation_time
+    "DROP INDEX IF EXISTS idx_messages_conversation_id",
+]
+
+# Epoch-second columns, stored as REAL so range filters can use indexes.
+TIMESTAMP_COLUMNS = ("create_time", "update_time")
+
+COLUMNS = {table: [col for col, _ in columns] for table, columns in SCHEMA.items()}
+_CONTENT_INDEX = COLUMNS["Messages"].index("content")
+
+_WHITESPACE = re.compile(r"\s*")
+
+
+def iter_json_array(file_path, chunk_size=CHUNK_SIZE, raw=False):
+    """Yield the elements of a top-level JSON array one at a time.
+
+    The file is read in chunks and each element is decoded as soon as it is
+    complete, so memory use is bounded by the largest single element rather
+    than by the size of the file. With `raw=True` (value, JSON text) pairs
+    are yielded instead of just the decoded value.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8") as f:
+        buffer, pos, eof = "", 0, False
+        read_size = chunk_size
+        state = "open"
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                if eof:
+                    raise ValueError(f"{file_path}: unexpected end of JSON array")
+                buffer, pos = f.read(read_size), 0
+                eof = not buffer
+                continue
+
+            char = buffer[pos]
+            if state == "open":
+                if char != "[":
+                    raise ValueError(f"{file_path}: expected a top-level JSON array")
+                pos += 1
+                state = "first"
+                continue
+            if state in ("first", "next") and char == "]":
+                return
+            if state == "next":
+                if char != ",":
+                    raise ValueError(f"{file_path}: expected ',' at offset {pos} of current chunk")
+                pos += 1
+                state = "value"
+                continue
+
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                complete = eof or end < len(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                # The element runs past the buffer: read more and retry. The read
+                # size doubles so a very large element is not re-decoded per chunk.
+                data = f.read(read_size)
+                eof = not data
+                buffer, pos = buffer[pos:] + data, 0
+                read_size *= 2
+                continue
+
+            read_size = chunk_size
+            text, pos = buffer[pos:end], end
+            state = "next"
+            yield (item, text) if raw else item
+
+
+def _message_content(message):
+    parts = (message.get("content") or {}).get("parts") or [None]
+    content = parts[0]
+    if content is None or isinstance(content, str):
+        return content
+    # Non-text parts (images, tool payloads) are kept as their JSON encoding.
+    return json.dumps(content)
+
+
+def _conversation_id(conv):
+    return conv.get("conversation_id") or conv.get("id")
+
+
+def content_hash(text):
+    """Hash of a conversation's raw JSON, stored in the ingest manifest."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def flatten_conversation(conv, content_hash=None):
+    """Yield the Conversations row and one Messages row per node of a conversation.
+
+    When the hash of the conversation's JSON is given, an IngestManifest row
+    is yielded as well.
+    """
+    conversation_id = _conversation_id(conv)
+    yield "Conversations", {
+        "conversation_id": conversation_id,
+        "title": conv.get("title"),
+        "create_time": conv.get("create_time"),
+        "update_time": conv.get("update_time"),
+        "current_node": conv.get("current_node"),
+    }
+    if content_hash is not None:
+        yield "IngestManifest", {
+            "conversation_id": conversation_id,
+            "update_time": conv.get("update_time"),
+            "content_hash": content_hash,
+            "ingested_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+    mapping = conv.get("mapping") or {}
+    layout = thread_layout(
+        {node_id: node.get("parent") for node_id, node in mapping.items()},
+        conv.get("current_node"),
+        {node_id: node.get("children") or [] for node_id, node in mapping.items()},
+    )
+    for node_id, node in mapping.items():
+        message = node.get("message") or {}
+        if not message.get("id"):
+            # Root and placeholder nodes carry no message.
+            continue
+        depth, branch_position, tree_path = layout[node_id]
+        yield "Messages", {
+            "conversation_id": conversation_id,
+            "message_id": message.get("id"),
+            "author_role": (message.get("author") or {}).get("role"),
+            "content": _message_content(message),
+            "create_time": message.get("create_time"),
+            "update_time": message.get("update_time"),
+            "status": message.get("status"),
+            "parent_id": node.get("parent"),
+            "depth": depth,
+            "branch_position": branch_position,
+            "tree_path": tree_path,
+        }
+
 
 def flatten_json(json_data, data_type):
-    """Flatten JSON data based on its type."""
+    """Flatten JSON data based on its type, yielding (table, row) pairs."""
     if data_type == "conversations":
-        flattened_data = []
         for conv in json_data:
-            conversation_id = conv.get("conversation_id")
-            title = conv.get("title")
-            create_time = conv.get("create_time")
-            update_time = conv.get("update_time")
-            mapping = conv.get("mapping", {})
-            for msg_id, msg in mapping.items():
-                message = msg.get("message", {})
-                flattened_data.append({
-                    "conversation_id": conversation_id,
-                    "message_id": message.get("id"),
-                    "author_role": message.get("author", {}).get("role"),
-                    "content": message.get("content", {}).get("parts", [None])[0],
-                    "create_time": message.get("create_time"),
-                    "update_time": message.get("update_time"),
-                    "status": message.get("status"),
-                    "parent_id": msg.get("parent"),
-                })
-        return pd.DataFrame(flattened_data)
+            yield from flatten_conversation(conv)
 
     elif data_type == "model_comparisons":
-        flattened_data = []
         for item in json_data:
-            flattened_data.append({
+            yield "ModelComparisons", {
                 "comparison_id": item.get("comparison_id"),
                 "conversation_id": item.get("conversation_id"),
                 "criteria": item.get("criteria"),
                 "results": item.get("results"),
-            })
-        return pd.DataFrame(flattened_data)
+            }
 
     elif data_type == "message_feedback":
-        flattened_data = []
         for feedback in json_data:
-            flattened_data.append({
+            yield "MessageFeedback", {
                 "feedback_id": feedback.get("feedback_id"),
                 "message_id": feedback.get("message_id"),
                 "feedback_type": feedback.get("type"),
                 "feedback_content": feedback.get("content"),
-            })
-        return pd.DataFrame(flattened_data)
+            }
 
-def save_to_database(flattened_dataframes, db_path):
-    """Save flattened dataframes to SQLite database with deduplication."""
-    conn = sqlite3.connect(db_path)
 
-    # Define the schema
-    schema = {
-        "Conversations": [
-            ("conversation_id", "TEXT PRIMARY KEY"),
-            ("title", "TEXT"),
-            ("create_time", "TEXT"),
-            ("update_time", "TEXT"),
-        ],
-        "Messages": [
-            ("message_id", "TEXT PRIMARY KEY"),
-            ("conversation_id", "TEXT"),
-            ("parent_id", "TEXT"),
-            ("author_role", "TEXT"),
-            ("content", "TEXT"),
-            ("create_time", "TEXT"),
-            ("update_time", "TEXT"),
-            ("status", "TEXT"),
-        ],
-        "ModelComparisons": [
-            ("comparison_id", "TEXT PRIMARY KEY"),
-            ("conversation_id", "TEXT"),
-            ("criteria", "TEXT"),
-            ("results", "TEXT"),
-        ],
-        "MessageFeedback": [
-            ("feedback_id", "TEXT PRIMARY KEY"),
-            ("message_id", "TEXT"),
-            ("feedback_type", "TEXT"),
-            ("feedback_content", "TEXT"),
-        ],
-    }
+def _rebuild_with_real_timestamps(conn, table):
+    """
+    Rebuild `table` with REAL timestamp columns if they were created as TEXT.
+
+    Every other column and each row's rowid are kept, so the FTS index (keyed
+    by rowid) stays valid; indexes and triggers are recreated by the caller.
+    """
+    info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    if not any(name in TIMESTAMP_COLUMNS and col_type.upper() != "REAL" for _, name, col_type, *_ in info):
+        return False
+
+    definitions, selects = [], []
+    for _, name, col_type, notnull, default, pk in info:
+        if name in TIMESTAMP_COLUMNS:
+            col_type = "REAL"
+            selects.append(f"CASE WHEN trim({name}) = '' THEN NULL ELSE CAST({name} AS REAL) END")
+        else:
+            selects.append(name)
+        definition = f"{name} {col_type}"
+        if pk:
+            definition += " PRIMARY KEY"
+        if notnull:
+            definition += " NOT NULL"
+        if default is not None:
+            definition += f" DEFAULT {default}"
+        definitions.append(definition)
+
+    column_names = ", ".join(name for _, name, *_ in info)
+    conn.execute(f"DROP TABLE IF EXISTS {table}__migrating")
+    conn.execute(f"CREATE TABLE {table}__migrating ({', '.join(definitions)})")
+    conn.execute(
+        f"INSERT INTO {table}__migrating (rowid, {column_names}) SELECT rowid, {', '.join(selects)} FROM {table}"
+    )
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}__migrating RENAME TO {table}")
+    print(f"Migrated {table} timestamps from TEXT to REAL")
+    return True
+
+
+def migrate_timestamp_columns(conn):
+    """
+    Convert databases written with TEXT create_time/update_time columns to REAL.
+
+    A ConversationSummary with TEXT timestamps is dropped, for
+    `ensure_summary_table` to rebuild.
+    """
+    for table in ("Conversations", "Messages"):
+        _rebuild_with_real_timestamps(conn, table)
+    summary = conn.execute("PRAGMA table_info(ConversationSummary)").fetchall()
+    if any(name == "create_time" and col_type.upper() != "REAL" for _, name, col_type, *_ in summary):
+        # Derived data: cheaper to rebuild than to migrate
+        conn.execute("DROP TABLE ConversationSummary")
+
+
+def add_missing_columns(conn):
+    """
+    Add SCHEMA columns that tables created by older versions lack.
 
-    # Create tables
-    for table, columns in schema.items():
+    Returns:
+        The set of (table, column) pairs that were added.
+    """
+    added = set()
+    for table, columns in SCHEMA.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for col, dtype in columns:
+            if col not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {dtype}")
+                added.add((table, col))
+    return added
+
+
+def create_tables(conn):
+    """Create the ingest tables if they do not exist yet, migrating older layouts."""
+    # The FTS triggers and summary refresh read compressed bodies through inflate_content()
+    register_content_functions(conn)
+    for table, columns in SCHEMA.items():
         column_definitions = ", ".join(f"{col} {dtype}" for col, dtype in columns)
         conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({column_definitions})")
+    added_columns = add_missing_columns(conn)
+    migrate_timestamp_columns(conn)
+    for index in INDEXES:
+        conn.execute(index)
+    # Created and filled from the existing rows if missing or dropped above
+    ensure_summary_table(conn)
+    if ("Messages", "tree_path") in added_columns:
+        print("Computing thread layout for existing messages")
+        refresh_thread_layout(conn)
+    ensure_ingest_state(conn)
+    if not ensure_search_index(conn):
+        print("SQLite was built without FTS5; /search will fall back to LIKE scans.")
+    ensure_activity_rollups(conn)
+    conn.commit()
 
-    # Insert data with deduplication
-    for table, dataframe in flattened_dataframes.items():
-        placeholders = ", ".join("?" for _ in dataframe.columns)
-        column_names = ", ".join(dataframe.columns)
-        insert_query = f"INSERT OR IGNORE INTO {table} ({column_names}) VALUES ({placeholders})"
-        conn.executemany(insert_query, dataframe.to_records(index=False))
 
-    conn.commit()
-    conn.close()
+def _insert_query(table, upsert):
+    columns = COLUMNS[table]
+    placeholders = ", ".join("?" for _ in columns)
+    if not upsert:
+        return f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    key, updates = columns[0], ", ".join(f"{col} = excluded.{col}" for col in columns[1:])
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT({key}) DO UPDATE SET {updates}"
+    )
+
+
+class DatabaseWriter:
+    """Buffers rows per table and writes them with batched, deduplicating inserts.
+
+    Every flush runs in its own transaction, so at most `batch_size` rows are
+    held in memory and a crash loses at most one uncommitted chunk.
+
+    With `upsert=True` existing rows are updated instead of ignored, and the
+    stored messages of every conversation written are replaced, so edited or
+    pruned conversations end up exactly as in the export. A conversation's row
+    is always queued before its messages, and its old messages are deleted at
+    the start of the flush that writes that row.
+
+    Each flush also refreshes the ConversationSummary rows of the
+    conversations it touched and bumps the ingest generation, inside the
+    same transaction, so caches in the web app see the new data.
+
+    If the database has a compression threshold set (app/compression.py),
+    message bodies longer than it are written compressed.
+    """
+
+    def __init__(self, db_path, batch_size=BATCH_SIZE, upsert=False):
+        self.conn = sqlite3.connect(db_path)
+        create_tables(self.conn)
+        self.compress_threshold = get_compress_threshold(self.conn)
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.insert_queries = {table: _insert_query(table, upsert) for table in SCHEMA}
+        self.pending = {table: [] for table in SCHEMA}
+        self.pending_rows = 0
+        self.rows_written = 0
+
+    def add(self, table, row):
+        """Queue a row given as a dict of column values."""
+        self.extend(table, [tuple(row.get(col) for col in COLUMNS[table])])
 
-def process_folders(folder_paths, db_path):
-    """Process all JSON files across multiple folders and save to database."""
-    json_files = ["conversations.json", "model_comparisons.json", "message_feedback.json"]
+    def extend(self, table, rows):
+        """Queue rows that are already tuples in `COLUMNS[table]` order."""
+        self.pending[table].extend(rows)
+        self.pending_rows += len(rows)
+        if self.pending_rows >= self.batch_size:
+            self.flush()
 
+    def flush(self):
+        if not self.pending_rows:
+            return
+        conversation_ids = {row[0] for row in self.pending["Conversations"]}
+        conversation_ids.update(row[1] for row in self.pending["Messages"] if row[1] is not None)
+        if self.compress_threshold:
+            self.pending["Messages"] = [
+                row[:_CONTENT_INDEX]
+                + (compress_content(row[_CONTENT_INDEX], self.compress_threshold),)
+                + row[_CONTENT_INDEX + 1:]
+                for row in self.pending["Messages"]
+            ]
+        with self.conn:
+            if self.upsert and self.pending["Conversations"]:
+                self.conn.executemany(
+                    "DELETE FROM Messages WHERE conversation_id = ?",
+                    [(row[0],) for row in self.pending["Conversations"]],
+                )
+            with deferred_trigram_index(self.conn):
+                for table, rows in self.pending.items():
+                    if rows:
+                        self.conn.executemany(self.insert_queries[table], rows)
+                        rows.clear()
+            refresh_conversation_summaries(self.conn, conversation_ids)
+            bump_ingest_generation(self.conn)
+        self.rows_written += self.pending_rows
+        self.pending_rows = 0
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+
+
+class IngestManifest:
+    """Read side of the IngestManifest table, used to skip unchanged conversations.
+
+    Lookups go to SQLite one primary-key probe at a time rather than loading
+    the whole manifest, so memory stays flat however large the archive is.
+    """
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        create_tables(self.conn)
+        self.skipped = 0
+
+    def is_unchanged(self, conv, text):
+        row = self.conn.execute(
+            "SELECT update_time, content_hash FROM IngestManifest WHERE conversation_id = ?",
+            (_conversation_id(conv),),
+        ).fetchone()
+        # Hashing is only needed when the update_time already matches.
+        unchanged = row is not None and row[0] == conv.get("update_time") and row[1] == content_hash(text)
+        self.skipped += unchanged
+        return unchanged
+
+    def close(self):
+        self.conn.close()
+
+
+def iter_folder_records(folder_path, manifest=None):
+    """Stream every export file in a folder as (table, row) pairs.
+
+    Conversations that `manifest` reports as unchanged are skipped.
+    """
+    for file_name in JSON_FILES:
+        file_path = os.path.join(folder_path, file_name)
+        if not os.path.exists(file_path):
+            continue
+        data_type = file_name.split(".")[0]  # Infer data type from file name
+        if data_type != "conversations":
+            yield from flatten_json(iter_json_array(file_path), data_type)
+            continue
+        for conv, text in iter_json_array(file_path, raw=True):
+            if manifest is None or not manifest.is_unchanged(conv, text):
+                yield from flatten_conversation(conv, content_hash(text))
+
+
+def save_to_database(records, db_path, batch_size=BATCH_SIZE):
+    """Save (table, row) records to SQLite with deduplication, in chunked transactions."""
+    writer = DatabaseWriter(db_path, batch_size)
+    try:
+        for table, row in records:
+            writer.add(table, row)
+    finally:
+        writer.close()
+    return writer.rows_written
+
+
+class StageStats:
+    """Item count and time spent in one stage of the parallel ingest pipeline."""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.seconds = 0.0
+
+    def record(self, items, seconds):
+        self.items += items
+        self.seconds += seconds
+
+    def __str__(self):
+        rate = self.items / self.seconds if self.seconds else 0.0
+        return f"{self.name:<6} {self.items} {self.unit} in {self.seconds:.2f}s ({rate:,.0f} {self.unit}/s)"
+
+
+def iter_shards(folder_paths, shard_size=SHARD_SIZE, manifest=None):
+    """Split every export file into (data_type, [raw JSON record]) shards.
+
+    Conversations that `manifest` reports as unchanged are left out.
+    """
     for folder_path in folder_paths:
         print(f"Processing folder: {folder_path}")
-        flattened_dataframes = {}
-
-        for file_name in json_files:
+        for file_name in JSON_FILES:
             file_path = os.path.join(folder_path, file_name)
-            if os.path.exists(file_path):
-                with open(file_path, "r") as f:
-                    json_data = json.load(f)
-                data_type = file_name.split(".")[0]  # Infer data type from file name
-                flattened_dataframes[data_type] = flatten_json(json_data, data_type)
-
-        # Save the dataframes to the database
-        save_to_database(flattened_dataframes, db_path)
-
-# Example usage
-folders = [
-    "path/to/folder1",
-    "path/to/folder2",
-    "path/to/folder3",
-]
-db_path = "output_database.db"
-process_folders(folders, db_path)
+            if not os.path.exists(file_path):
+                continue
+            data_type = file_name.split(".")[0]
+            shard = []
+            for item, text in iter_json_array(file_path, raw=True):
+                if data_type == "conversations" and manifest is not None and manifest.is_unchanged(item, text):
+                    continue
+                shard.append(text)
+                if len(shard) >= shard_size:
+                    yield data_type, shard
+                    shard = []
+            if shard:
+                yield data_type, shard
+
+
+def flatten_shard(shard):
+    """Worker entry point: decode and flatten one shard into rows grouped by table."""
+    start = time.perf_counter()
+    data_type, texts = shard
+    if data_type == "conversations":
+        records = (
+            record for text in texts
+            for record in flatten_conversation(json.loads(text), content_hash(text))
+        )
+    else:
+        records = flatten_json((json.loads(text) for text in texts), data_type)
+    rows = {table: [] for table in SCHEMA}
+    for table, row in records:
+        rows[table].append(tuple(row.get(col) for col in COLUMNS[table]))
+    # Keep SCHEMA order so a conversation is always queued before its messages.
+    return {table: table_rows for table, table_rows in rows.items() if table_rows}, time.perf_counter() - start
+
+
+def _write_batches(db_path, batch_size, upsert, batches, stats, errors):
+    """Writer thread: the only connection that writes during a parallel ingest."""
+    writer = None
+    try:
+        writer = DatabaseWriter(db_path, batch_size, upsert)
+        while True:
+            rows = batches.get()
+            if rows is None:
+                break
+            start = time.perf_counter()
+            for table, table_rows in rows.items():
+                writer.extend(table, table_rows)
+            stats.record(sum(len(table_rows) for table_rows in rows.values()), time.perf_counter() - start)
+        start = time.perf_counter()
+        writer.close()
+        stats.seconds += time.perf_counter() - start
+    except Exception as e:
+        errors.append(e)
+        if writer is not None:
+            writer.conn.close()
+        # Keep draining so the pipeline never blocks on a full queue.
+        while batches.get() is not None:
+            pass
+
+
+def process_folders_parallel(
+    folder_paths, db_path, batch_size=BATCH_SIZE, workers=None, shard_size=SHARD_SIZE, incremental=False
+):
+    """Ingest folders with a process pool for flattening and a single writer thread.
+
+    The main process splits each export file into shards of raw records,
+    workers decode and flatten the shards concurrently, and one writer thread
+    batches the resulting rows into SQLite. At most `2 * workers` shards are in
+    flight, so memory stays bounded just like the sequential path.
+    """
+    workers = workers or os.cpu_count() or 1
+    read_stats = StageStats("read", "records")
+    parse_stats = StageStats("parse", "rows")
+    write_stats = StageStats("write", "rows")
+    batches = queue.Queue(maxsize=workers * 2)
+    errors = []
+    manifest = IngestManifest(db_path) if incremental else None
+    writer_thread = threading.Thread(
+        target=_write_batches, args=(db_path, batch_size, incremental, batches, write_stats, errors)
+    )
+    writer_thread.start()
+    started = time.perf_counter()
+
+    def collect(future):
+        rows, seconds = future.result()
+        parse_stats.record(sum(len(table_rows) for table_rows in rows.values()), seconds)
+        batches.put(rows)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            shards = iter_shards(folder_paths, shard_size, manifest)
+            while not errors:
+                start = time.perf_counter()
+                shard = next(shards, None)
+                if shard is None:
+                    break
+                read_stats.record(len(shard[1]), time.perf_counter() - start)
+                pending.append(pool.submit(flatten_shard, shard))
+                if len(pending) >= workers * 2:
+                    collect(pending.popleft())
+            while pending:
+                collect(pending.popleft())
+    finally:
+        batches.put(None)
+        writer_thread.join()
+        if manifest is not None:
+            manifest.close()
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - started
+    print(read_stats)
+    print(f"{parse_stats} (worker time summed over {workers} workers)")
+    print(write_stats)
+    if manifest is not None:
+        print(f"Skipped {manifest.skipped} unchanged conversations")
+    print(f"Wrote {write_stats.items} rows to {db_path} in {elapsed:.2f}s")
+    return write_stats.items
+
+
+def update_vector_index(db_path):
+    """Rebuilds the semantic search vectors (app/semantic.py) if the data changed."""
+    if not vectors_available():
+        print("NumPy is not installed; skipping the semantic search index")
+        return None
+    stats = build_vector_index(db_path)
+    if stats is None:
+        print("Semantic search index is up to date")
+    else:
+        print(
+            f"Built semantic search index: {stats['messages']} messages, "
+            f"{stats['conversations']} conversations in {stats['build_seconds']:.2f}s"
+        )
+    return stats
+
+
+def deduplicate(db_path, mode="link", threshold=DEFAULT_THRESHOLD):
+    """Links or merges near-duplicate conversations (app/dedupe.py) and prints the report."""
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    try:
+        report = deduplicate_conversations(conn, mode, threshold)
+    finally:
+        conn.close()
+    print(
+        f"Fingerprinted {report['fingerprinted']} conversations in {time.perf_counter() - started:.2f}s: "
+        f"{report['duplicates']} near-duplicates ({report['linked']} linked, {report['merged']} merged)"
+    )
+    if report["merged"]:
+        print(
+            f"Merging removed {report['messages_removed']} messages "
+            f"({report['bytes_saved'] / 1048576:.1f} MiB of content) "
+            f"and moved {report['messages_moved']} into the newer copies"
+        )
+    if report["linked"]:
+        print(
+            f"Linked versions hold {report['bytes_reclaimable'] / 1048576:.1f} MiB of content; "
+            f"import with --dedupe merge to reclaim it"
+        )
+    return report
+
+
+def configure_compression(db_path, threshold):
+    """Stores the compression threshold (0 turns compression off) used by this and later imports."""
+    conn = sqlite3.connect(db_path)
+    try:
+        create_tables(conn)
+        with conn:
+            set_compress_threshold(conn, threshold)
+    finally:
+        conn.close()
+    print(f"Compressing message bodies over {threshold} bytes" if threshold else "Message compression is off")
+
+
+def process_folders(
+    folder_paths, db_path, batch_size=BATCH_SIZE, workers=1, incremental=False, vectors=True,
+    dedupe="link", dedupe_threshold=DEFAULT_THRESHOLD, compress_threshold=None,
+):
+    """Process all JSON files across multiple folders and save to database.
+
+    `workers` other than 1 switches to `process_folders_parallel`; 0 or None
+    uses one worker per CPU. With `incremental=True` conversations whose
+    update_time and content hash match the ingest manifest are skipped and
+    changed ones are upserted rather than ignored. New and changed
+    conversations are then checked for near-duplicates, which are linked as
+    versions or merged according to `dedupe` ('link', 'merge' or 'off').
+    Unless `vectors=False` the semantic search index is refreshed last.
+
+    `compress_threshold` (bytes, 0 for off) changes the database's stored
+    compression setting before importing; None keeps the current one.
+    Already stored messages are left as they are, see
+    debug_scripts/compress_messages.py.
+    """
+    if compress_threshold is not None:
+        configure_compression(db_path, compress_threshold)
+    if workers != 1:
+        rows_written = process_folders_parallel(folder_paths, db_path, batch_size, workers, incremental=incremental)
+    else:
+        rows_written = process_folders_sequential(folder_paths, db_path, batch_size, incremental)
+    if dedupe != "off":
+        deduplicate(db_path, dedupe, dedupe_threshold)
+    if vectors:
+        update_vector_index(db_path)
+    return rows_written
+
+
+def process_folders_sequential(folder_paths, db_path, batch_size=BATCH_SIZE, incremental=False):
+    """Streams every folder through one DatabaseWriter in this process."""
+    started = time.perf_counter()
+    manifest = IngestManifest(db_path) if incremental else None
+    writer = DatabaseWriter(db_path, batch_size, upsert=incremental)
+    try:
+        for folder_path in folder_paths:
+            print(f"Processing folder: {folder_path}")
+            for table, row in iter_folder_records(folder_path, manifest):
+                writer.add(table, row)
+    finally:
+        writer.close()
+        if manifest is not None:
+            manifest.close()
+    if manifest is not None:
+        print(f"Skipped {manifest.skipped} unchanged conversations")
+    print(f"Wrote {writer.rows_written} rows to {db_path} in {time.perf_counter() - started:.2f}s")
+    return writer.rows_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import extracted ChatGPT export folders into SQLite.")
+    parser.add_argument("folders", nargs="+", help="Extracted export folders containing conversations.json")
+    parser.add_argument("--db", default="output_database.db", help="SQLite database to write to")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per insert transaction")
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Parallel flattening processes (1 = sequential streaming, 0 = one per CPU)",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Skip conversations unchanged since the last import and upsert the changed ones",
+    )
+    parser.add_argument(
+        "--dedupe", choices=DEDUPE_MODES, default="link",
+        help="What to do with near-duplicate conversations: link them as versions, merge them into "
+             "the newest copy, or skip detection",
+    )
+    parser.add_argument(
+        "--dedupe-threshold", type=float, default=DEFAULT_THRESHOLD,
+        help="Minimum share of identical messages (Jaccard) for two conversations to count as versions",
+    )
+    parser.add_argument(
+        "--compress", nargs="?", type=int, const=DEFAULT_COMPRESS_THRESHOLD, metavar="THRESHOLD",
+        help=f"Store message bodies over THRESHOLD bytes (default {DEFAULT_COMPRESS_THRESHOLD}) zlib-compressed, "
+             "for this and later imports; --compress 0 turns it off",
+    )
+    parser.add_argument(
+        "--no-vectors", action="store_true",
+        help="Do not build the semantic search index (app/semantic.py) after importing",
+    )
+    args = parser.parse_args()
+
+    process_folders(
+        args.folders, args.db, batch_size=args.batch_size, workers=args.workers, incremental=args.incremental,
+        vectors=not args.no_vectors, dedupe=args.dedupe, dedupe_threshold=args.dedupe_threshold,
+        compress_threshold=args.compress,
+    )
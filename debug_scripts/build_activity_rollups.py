@@ -0,0 +1,30 @@
+# debug_scripts/build_activity_rollups.py
+
+"""
+Creates (or recomputes) the MessageActivity / ConversationActivity rollups
+and their triggers for a database imported before the ingest maintained them.
+"""
+
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.analytics import ensure_activity_rollups, rebuild_activity_rollups
+
+
+def build_activity_rollups():
+    conn = sqlite3.connect('GPT_conversations_database.db')
+
+    with conn:
+        ensure_activity_rollups(conn)
+        rebuild_activity_rollups(conn)
+
+    days = conn.execute("SELECT COUNT(DISTINCT day) FROM MessageActivity").fetchone()[0]
+    conn.close()
+    print(f"Activity rollups rebuilt for {days} days.")
+
+# Run the script
+if __name__ == "__main__":
+    build_activity_rollups()
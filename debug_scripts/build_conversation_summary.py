@@ -0,0 +1,34 @@
+# debug_scripts/build_conversation_summary.py
+
+"""
+Rebuilds the ConversationSummary table from Conversations and Messages. The
+importer creates and fills it for older databases on its own; this refreshes
+it without an import.
+"""
+
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.summary import ensure_summary_table, has_summary_table, refresh_conversation_summaries
+
+
+def build_conversation_summary():
+    conn = sqlite3.connect('GPT_conversations_database.db')
+
+    with conn:
+        existed = has_summary_table(conn)
+        # Filled on creation; only an existing table needs the refresh
+        ensure_summary_table(conn)
+        if existed:
+            refresh_conversation_summaries(conn)
+
+    count = conn.execute("SELECT COUNT(*) FROM ConversationSummary").fetchone()[0]
+    conn.close()
+    print(f"ConversationSummary rebuilt for {count} conversations.")
+
+# Run the script
+if __name__ == "__main__":
+    build_conversation_summary()
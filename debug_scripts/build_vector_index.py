@@ -0,0 +1,52 @@
+# debug_scripts/build_vector_index.py
+
+"""
+Builds (or rebuilds with --force) the semantic search vectors for an existing
+database, e.g. one imported before semantic search existed, then runs an
+optional sample query against them.
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.semantic import build_vector_index, is_available, semantic_search
+
+
+def build(db_path, force, query):
+    if not is_available():
+        print("NumPy is not installed (pip install numpy).")
+        return
+
+    stats = build_vector_index(db_path, force=force)
+    if stats is None:
+        print("Vector index is already up to date; use --force to rebuild.")
+    else:
+        print(f"Indexed {stats['messages']} messages and {stats['conversations']} conversations "
+              f"in {stats['build_seconds']:.2f}s")
+
+    if query:
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        start = time.perf_counter()
+        conversations, messages = semantic_search(conn, db_path, query, 5)
+        print(f"Query {query!r} answered in {(time.perf_counter() - start) * 1000:.1f}ms")
+        for row in conversations:
+            print(f"  {row['score']:.3f}  conversation {row['conversation_id']}: {row['title']}")
+        for row in messages:
+            print(f"  {row['score']:.3f}  message {row['message_id']}: {row['snippet'][:80]}")
+        conn.close()
+
+# Run the script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the semantic search vector index.")
+    parser.add_argument("--db", default="GPT_conversations_database.db", help="SQLite database to index")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the index is current")
+    parser.add_argument("--query", help="Run a sample semantic query afterwards")
+    args = parser.parse_args()
+
+    build(args.db, args.force, args.query)
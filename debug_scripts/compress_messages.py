@@ -0,0 +1,83 @@
+# debug_scripts/compress_messages.py
+
+"""
+Compresses (or, with --threshold 0, decompresses) the message bodies already
+stored in a database and records the threshold for later imports, printing a
+storage report before and after. Freed pages are reused by later writes; pass
+--vacuum to shrink the file now, which also rebuilds the rowid-keyed search
+and vector indexes.
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.compression import (
+    DEFAULT_COMPRESS_THRESHOLD, migrate_message_content, register_content_functions, set_compress_threshold,
+    storage_report
+)
+from app.db import ensure_ingest_state
+from app.search import ensure_search_index, rebuild_search_index
+from app.semantic import build_vector_index, is_available as vectors_available
+
+
+def print_report(label, report):
+    mib = 1048576
+    print(f"{label}:")
+    print(f"  messages          {report['messages']} ({report['compressed_messages']} compressed)")
+    print(f"  plain content     {report['plain_bytes'] / mib:10.1f} MiB")
+    print(f"  compressed        {report['compressed_bytes'] / mib:10.1f} MiB "
+          f"(from {report['compressed_original_bytes'] / mib:.1f} MiB)")
+    print(f"  content ratio     {report['content_ratio']:10.3f}")
+    print(f"  database file     {report['file_bytes'] / mib:10.1f} MiB ({report['free_bytes'] / mib:.1f} MiB free)")
+
+
+def compress_messages(db_path, threshold, report_only, vacuum):
+    conn = sqlite3.connect(db_path)
+    register_content_functions(conn)
+
+    print_report("Before", storage_report(conn))
+    if report_only:
+        conn.close()
+        return
+
+    with conn:
+        ensure_ingest_state(conn)
+        # Brings older FTS triggers up to date so they index the inflated text
+        ensure_search_index(conn)
+        set_compress_threshold(conn, threshold)
+
+    start = time.perf_counter()
+    rewritten = migrate_message_content(conn, threshold)
+    print(f"Rewrote {rewritten} messages in {time.perf_counter() - start:.2f}s")
+
+    if vacuum:
+        start = time.perf_counter()
+        conn.execute("VACUUM")
+        with conn:
+            rebuild_search_index(conn)
+        print(f"Vacuumed and rebuilt the search index in {time.perf_counter() - start:.2f}s")
+        if vectors_available():
+            build_vector_index(db_path, force=True)
+            print("Rebuilt the semantic search index")
+
+    print_report("After", storage_report(conn))
+    conn.close()
+
+# Run the script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress stored message bodies and report storage use.")
+    parser.add_argument("--db", default="GPT_conversations_database.db", help="SQLite database to update")
+    parser.add_argument(
+        "--threshold", type=int, default=DEFAULT_COMPRESS_THRESHOLD,
+        help="Compress bodies over this many bytes; 0 decompresses everything and turns compression off",
+    )
+    parser.add_argument("--report", action="store_true", help="Only print the storage report")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the file")
+    args = parser.parse_args()
+
+    compress_messages(args.db, args.threshold, args.report, args.vacuum)
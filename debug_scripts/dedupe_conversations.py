@@ -0,0 +1,45 @@
+# debug_scripts/dedupe_conversations.py
+
+"""
+Runs near-duplicate detection (app/dedupe.py) on an existing database, e.g.
+one built from several overlapping exports before detection existed, and
+prints how much content the linked and merged versions account for.
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.dedupe import DEFAULT_THRESHOLD, deduplicate_conversations, get_dedupe_report
+
+
+def dedupe(db_path, mode, threshold):
+    conn = sqlite3.connect(db_path)
+
+    start = time.perf_counter()
+    stats = deduplicate_conversations(conn, mode, threshold)
+    print(f"Fingerprinted {stats['fingerprinted']} conversations in {time.perf_counter() - start:.2f}s, "
+          f"found {stats['duplicates']} near-duplicates.")
+
+    for action, totals in get_dedupe_report(conn).items():
+        print(f"{action.capitalize()} versions: {totals['conversations']} conversations, "
+              f"{totals['messages']} messages, {totals['content_bytes'] / 1048576:.1f} MiB of content")
+
+    conn.close()
+    return stats
+
+# Run the script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Link or merge near-duplicate conversations.")
+    parser.add_argument("--db", default="GPT_conversations_database.db", help="SQLite database to update")
+    parser.add_argument("--mode", choices=("link", "merge"), default="link",
+                        help="Record older copies as versions, or delete them in favour of the newest copy")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Minimum share of identical messages (Jaccard)")
+    args = parser.parse_args()
+
+    dedupe(args.db, args.mode, args.threshold)
@@ -1,83 +1,67 @@
 # debug_scripts/link_orphan_db.py
 
+"""
+Links orphaned messages (no conversation_id) to conversations, first by
+timestamp and then by title similarity, using the batch engine in
+app/orphans.py. Prints each link with its confidence.
+"""
+
+import os
+import sys
+import time
 import sqlite3
-import difflib
+import argparse
 
-# Connect to the database
-conn = sqlite3.connect('GPT_conversations_database.db')
-conn.row_factory = sqlite3.Row
-cursor = conn.cursor()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-def link_orphaned_messages():
-    # Identify orphaned messages
-    orphaned_messages = cursor.execute(
-        "SELECT message_id, content, create_time FROM Messages WHERE conversation_id IS NULL"
-    ).fetchall()
+from app.orphans import (
+    DEFAULT_SIMILARITY_THRESHOLD, DEFAULT_TIME_WINDOW, apply_orphan_links, find_orphan_links
+)
 
-    link_log = []
 
-    for message in orphaned_messages:
-        message_id = message["message_id"]
-        content = message["content"]
-        create_time = message["create_time"]
+def link_orphaned_messages(db_path, time_window, similarity_threshold, min_confidence, dry_run):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
 
-        # Match by timestamp
-        matched_conversation = cursor.execute(
-            """
-            SELECT conversation_id 
-            FROM Conversations 
-            WHERE ABS(Conversations.create_time - ?) < 600
-            ORDER BY ABS(Conversations.create_time - ?) ASC
-            LIMIT 1
-            """,
-            (create_time, create_time)
-        ).fetchone()
+    start = time.perf_counter()
+    links = find_orphan_links(conn, time_window, similarity_threshold)
+    matched = time.perf_counter() - start
 
-        if matched_conversation:
-            # Update message with matched conversation_id
-            cursor.execute(
-                "UPDATE Messages SET conversation_id = ? WHERE message_id = ?",
-                (matched_conversation["conversation_id"], message_id)
-            )
-            link_log.append(f"Linked Message ID {message_id} to Conversation ID {matched_conversation['conversation_id']}")
-        else:
-            # Fallback: Match by content similarity
-            potential_matches = cursor.execute("SELECT conversation_id, title FROM Conversations").fetchall()
+    for link in links:
+        label = "Linked" if link["method"] == "timestamp" else "Content-linked"
+        print(
+            f"{label} Message ID {link['message_id']} to Conversation ID {link['conversation_id']} "
+            f"(confidence {link['confidence']:.2f})"
+        )
 
-            best_match_id = None
-            highest_similarity = 0
+    if dry_run:
+        linked = 0
+        print(f"Dry run: {len(links)} matches found in {matched:.2f}s, nothing written.")
+    else:
+        linked = apply_orphan_links(conn, links, min_confidence)
+        print(f"Linked {linked} of {len(links)} matched messages in {time.perf_counter() - start:.2f}s.")
 
-            for conversation in potential_matches:
-                similarity = difflib.SequenceMatcher(None, content, conversation["title"]).ratio()
-                if similarity > highest_similarity:
-                    highest_similarity = similarity
-                    best_match_id = conversation["conversation_id"]
+    # Verify remaining orphans
+    remaining = conn.execute("SELECT COUNT(*) FROM Messages WHERE conversation_id IS NULL").fetchone()[0]
+    if remaining:
+        print(f"Remaining orphaned messages: {remaining}")
+    else:
+        print("All orphaned messages have been successfully linked.")
 
-            if highest_similarity > 0.6:  # Threshold for similarity
-                cursor.execute(
-                    "UPDATE Messages SET conversation_id = ? WHERE message_id = ?",
-                    (best_match_id, message_id)
-                )
-                link_log.append(f"Content-linked Message ID {message_id} to Conversation ID {best_match_id} with similarity {highest_similarity:.2f}")
-
-    # Commit changes
-    conn.commit()
-
-    # Display results
-    for log in link_log:
-        print(log)
+    conn.close()
+    return linked
 
 # Run the script
-link_orphaned_messages()
-
-# Verify remaining orphans
-remaining_orphans = cursor.execute(
-    "SELECT message_id FROM Messages WHERE conversation_id IS NULL"
-).fetchall()
-
-if remaining_orphans:
-    print("Remaining orphaned messages:", [row["message_id"] for row in remaining_orphans])
-else:
-    print("All orphaned messages have been successfully linked.")
-
-conn.close()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Link orphaned messages to conversations.")
+    parser.add_argument("--db", default="GPT_conversations_database.db", help="SQLite database to update")
+    parser.add_argument("--window", type=float, default=DEFAULT_TIME_WINDOW, help="Timestamp match window in seconds")
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_SIMILARITY_THRESHOLD,
+        help="Minimum title similarity for content matches",
+    )
+    parser.add_argument("--min-confidence", type=float, default=0.0, help="Only apply links at or above this confidence")
+    parser.add_argument("--dry-run", action="store_true", help="Report matches without writing them")
+    args = parser.parse_args()
+
+    link_orphaned_messages(args.db, args.window, args.threshold, args.min_confidence, args.dry_run)
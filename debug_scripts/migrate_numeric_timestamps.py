@@ -0,0 +1,26 @@
+# debug_scripts/migrate_numeric_timestamps.py
+
+"""
+Converts a database imported with TEXT create_time/update_time columns to
+REAL epoch columns and adds the timestamp indexes, so date-range filters
+become index range scans. Importing into the database does the same.
+"""
+
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from chatgpt_folder_to_db_v2 import create_tables
+
+
+def migrate_numeric_timestamps():
+    conn = sqlite3.connect('GPT_conversations_database.db')
+    create_tables(conn)
+    conn.close()
+    print("Migration completed successfully.")
+
+# Run the script
+if __name__ == "__main__":
+    migrate_numeric_timestamps()
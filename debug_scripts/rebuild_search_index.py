@@ -0,0 +1,34 @@
+# debug_scripts/rebuild_search_index.py
+
+"""
+Creates the FTS5 search index for a database imported before it existed, or
+rebuilds it from scratch (needed after VACUUM, which may renumber the rowids
+the index is keyed on).
+"""
+
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.search import ensure_search_index, rebuild_search_index
+
+
+def rebuild():
+    conn = sqlite3.connect('GPT_conversations_database.db')
+
+    with conn:
+        if not ensure_search_index(conn):
+            print("This SQLite build has no FTS5 support; search will use LIKE scans.")
+            conn.close()
+            return
+        rebuild_search_index(conn)
+
+    count = conn.execute("SELECT COUNT(*) FROM MessagesFTS").fetchone()[0]
+    conn.close()
+    print(f"Search index rebuilt for {count} messages.")
+
+# Run the script
+if __name__ == "__main__":
+    rebuild()
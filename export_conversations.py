@@ -0,0 +1,77 @@
+import sys
+import sqlite3
+import argparse
+from contextlib import closing
+
+from app.export import EXPORT_FORMATS, iter_conversations, iter_ndjson, iter_zip
+from app.utils import conversation_filter
+
+
+def export_conversations(db_path, output, export_format="ndjson", query="", start_date="",
+                         end_date="", conversation_ids=None, all_branches=False):
+    """
+    Streams the selected conversations from the database to `output`.
+
+    Args:
+        db_path: The SQLite database to read.
+        output: A binary file object to write to.
+        export_format: "ndjson" (one conversation per line) or "zip" (one JSON file each).
+        query, start_date, end_date: The same filters as the conversation list.
+        conversation_ids: Optional list of ids to export.
+        all_branches: Export every branch instead of only the active one.
+
+    Returns:
+        The number of bytes written.
+    """
+    where, params = conversation_filter(query, start_date, end_date)
+    written = 0
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.row_factory = sqlite3.Row
+        conversations = iter_conversations(conn, where, params, conversation_ids)
+        if export_format == "zip":
+            chunks = iter_zip(conn, conversations, all_branches)
+        else:
+            chunks = (piece.encode("utf-8") for piece in iter_ndjson(conn, conversations, all_branches))
+        for chunk in chunks:
+            output.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def read_ids(values):
+    """Expands --ids arguments: comma-separated ids, or @file with one id per line."""
+    ids = []
+    for value in values:
+        if value.startswith("@"):
+            with open(value[1:], encoding="utf-8") as file:
+                ids.extend(line.strip() for line in file if line.strip())
+        else:
+            ids.extend(part.strip() for part in value.split(",") if part.strip())
+    return ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export conversations from the database as NDJSON or a zip archive.")
+    parser.add_argument("--db", default="GPT_conversations_database.db", help="SQLite database to read")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson", help="Output format")
+    parser.add_argument("--output", "-o", default="-", help="Output file ('-' for stdout)")
+    parser.add_argument("--query", default="", help="Only conversations whose title contains this text")
+    parser.add_argument("--start-date", default="", help="Only conversations created on or after YYYY-MM-DD")
+    parser.add_argument("--end-date", default="", help="Only conversations created on or before YYYY-MM-DD")
+    parser.add_argument(
+        "--ids", nargs="+", default=[],
+        help="Conversation ids to export, comma-separated, or @file with one id per line",
+    )
+    parser.add_argument("--all-branches", action="store_true", help="Export every branch, not only the active one")
+    args = parser.parse_args()
+
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        written = export_conversations(
+            args.db, output, args.format, args.query, args.start_date, args.end_date,
+            read_ids(args.ids) or None, args.all_branches,
+        )
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    print(f"Exported {written} bytes", file=sys.stderr)
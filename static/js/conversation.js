@@ -0,0 +1,93 @@
+// static/js/conversation.js
+
+// Loads the rest of a long conversation page by page as the reader scrolls,
+// so the first messages render without waiting for the whole thread.
+document.addEventListener("DOMContentLoaded", function () {
+    const container = document.getElementById("messages");
+    const sentinel = document.getElementById("messages-more");
+    if (!container || !sentinel) {
+        return;
+    }
+
+    const allBranches = container.dataset.allBranches === "true";
+    let nextCursor = container.dataset.nextCursor;
+    let loading = false;
+
+    function addField(element, label, value) {
+        const paragraph = document.createElement("p");
+        const strong = document.createElement("strong");
+        strong.textContent = `${label}:`;
+        paragraph.appendChild(strong);
+        paragraph.appendChild(document.createTextNode(` ${value}`));
+        element.appendChild(paragraph);
+    }
+
+    function renderMessage(message) {
+        const element = document.createElement("div");
+        element.className = "message";
+        if (allBranches) {
+            if (!message.on_active_branch) {
+                element.classList.add("off-branch");
+            }
+            element.style.marginLeft = `${message.depth}em`;
+        }
+        addField(element, "Author", message.author_role);
+        addField(element, "Timestamp", message.timestamp);
+        addField(element, "Content", message.content);
+        if (message.feedback && message.feedback.length > 0) {
+            addField(element, "Feedback", message.feedback.map((entry) => entry.feedback_type).join(", "));
+            element.lastChild.className = "feedback";
+            const link = document.createElement("a");
+            link.href = `/message/${encodeURIComponent(message.message_id)}`;
+            link.textContent = "details";
+            element.lastChild.append(" (", link, ")");
+        }
+        return element;
+    }
+
+    function loadMore() {
+        if (loading || !nextCursor) {
+            return;
+        }
+        loading = true;
+
+        const url = new URL(container.dataset.url, window.location.origin);
+        url.searchParams.set("cursor", nextCursor);
+
+        fetch(url)
+            .then((response) => {
+                if (!response.ok) {
+                    throw new Error(`Loading messages failed with status ${response.status}.`);
+                }
+                return response.json();
+            })
+            .then((page) => {
+                const fragment = document.createDocumentFragment();
+                page.messages.forEach((message) => fragment.appendChild(renderMessage(message)));
+                container.appendChild(fragment);
+
+                nextCursor = page.next_cursor;
+                if (!nextCursor) {
+                    observer.disconnect();
+                    sentinel.remove();
+                }
+            })
+            .catch((error) => {
+                console.error(error);
+                sentinel.textContent = "Could not load more messages.";
+            })
+            .finally(() => {
+                loading = false;
+            });
+    }
+
+    const observer = new IntersectionObserver(
+        (entries) => {
+            if (entries.some((entry) => entry.isIntersecting)) {
+                loadMore();
+            }
+        },
+        { rootMargin: "400px" }
+    );
+    observer.observe(sentinel);
+});
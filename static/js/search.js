@@ -51,7 +51,7 @@ document.addEventListener("DOMContentLoaded", function () {
                         resultElement.innerHTML = `
                             <h4>Message Details</h4>
                             <p><strong>Message ID:</strong> ${result.match.message_id}</p>
-                            <p><strong>Content:</strong> ${result.match.content}</p>
+                            <p><strong>Content:</strong> ${result.match.snippet || result.match.content}</p>
                             <p><strong>Author:</strong> ${result.match.author_role}</p>
                             <p><strong>Timestamp:</strong> ${result.match.timestamp}</p>
                             <a href="/conversation/${result.match.conversation_id}" class="view-details">
@@ -89,4 +89,108 @@ document.addEventListener("DOMContentLoaded", function () {
                 searchResultsContainer.innerHTML = "<p>An error occurred. Please try again later.</p>";
             });
     });
+
+    // As-you-type suggestions from /suggest
+    const searchInput = document.getElementById("search-query");
+    const suggestionList = document.createElement("ul");
+    suggestionList.id = "search-suggestions";
+    suggestionList.hidden = true;
+    searchForm.appendChild(suggestionList);
+
+    const SUGGEST_DELAY_MS = 150;
+    let suggestTimer = null;
+    let suggestRequest = null;
+    let suggestions = [];
+    let activeSuggestion = -1;
+
+    function hideSuggestions() {
+        suggestionList.hidden = true;
+        suggestionList.innerHTML = "";
+        suggestions = [];
+        activeSuggestion = -1;
+    }
+
+    function chooseSuggestion(suggestion) {
+        hideSuggestions();
+        if (suggestion.kind === "title") {
+            window.location.href = `/conversation/${encodeURIComponent(suggestion.conversation_id)}`;
+        } else {
+            searchInput.value = suggestion.text;
+            searchForm.submit();
+        }
+    }
+
+    function highlightSuggestion(index) {
+        activeSuggestion = index;
+        Array.from(suggestionList.children).forEach((item, i) => {
+            item.classList.toggle("active", i === index);
+        });
+    }
+
+    function showSuggestions(results) {
+        hideSuggestions();
+        if (results.length === 0) {
+            return;
+        }
+        suggestions = results;
+        results.forEach((suggestion, index) => {
+            const item = document.createElement("li");
+            item.className = `suggestion ${suggestion.kind}`;
+            item.textContent = suggestion.text;
+            // mousedown fires before the input loses focus
+            item.addEventListener("mousedown", (event) => {
+                event.preventDefault();
+                chooseSuggestion(suggestion);
+            });
+            item.addEventListener("mouseover", () => highlightSuggestion(index));
+            suggestionList.appendChild(item);
+        });
+        suggestionList.style.left = `${searchInput.offsetLeft}px`;
+        suggestionList.style.width = `${searchInput.offsetWidth}px`;
+        suggestionList.hidden = false;
+    }
+
+    searchInput.addEventListener("input", function () {
+        clearTimeout(suggestTimer);
+        const prefix = searchInput.value;
+        if (!prefix.trim()) {
+            hideSuggestions();
+            return;
+        }
+        suggestTimer = setTimeout(() => {
+            // Only the latest prefix's completions are shown
+            if (suggestRequest) {
+                suggestRequest.abort();
+            }
+            suggestRequest = new AbortController();
+            fetch(`/suggest?query=${encodeURIComponent(prefix)}`, { signal: suggestRequest.signal })
+                .then((response) => (response.ok ? response.json() : []))
+                .then(showSuggestions)
+                .catch((error) => {
+                    if (error.name !== "AbortError") {
+                        console.error("Error fetching suggestions:", error);
+                    }
+                });
+        }, SUGGEST_DELAY_MS);
+    });
+
+    searchInput.addEventListener("keydown", function (event) {
+        if (suggestionList.hidden) {
+            return;
+        }
+        if (event.key === "ArrowDown") {
+            event.preventDefault();
+            highlightSuggestion((activeSuggestion + 1) % suggestions.length);
+        } else if (event.key === "ArrowUp") {
+            event.preventDefault();
+            highlightSuggestion((activeSuggestion - 1 + suggestions.length) % suggestions.length);
+        } else if (event.key === "Enter" && activeSuggestion >= 0) {
+            event.preventDefault();
+            chooseSuggestion(suggestions[activeSuggestion]);
+        } else if (event.key === "Escape") {
+            hideSuggestions();
+        }
+    });
+
+    searchInput.addEventListener("blur", hideSuggestions);
 });
@@ -0,0 +1,85 @@
+# tests/test_conversation_list.py
+
+"""
+Keyset pagination of the conversation list (/), including conversations
+without a create_time.
+"""
+
+import base64
+import json
+import os
+import re
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from chatgpt_folder_to_db_v2 import create_tables
+from app.app import app
+from app.cache import invalidate_query_cache
+from app.db import configure_database
+
+
+@pytest.fixture
+def client(tmp_path):
+    db_path = str(tmp_path / "conversations.db")
+    conn = sqlite3.connect(db_path)
+    # 10 dated conversations and 35 whose timestamps were '' before the REAL migration
+    rows = [(f"dated-{i:02d}", f"Dated {i}", 1_700_000_000.0 + i) for i in range(10)]
+    rows += [(f"undated-{i:02d}", f"Undated {i}", None) for i in range(35)]
+    conn.execute("CREATE TABLE Conversations (conversation_id TEXT PRIMARY KEY, title TEXT, create_time REAL)")
+    conn.executemany("INSERT INTO Conversations (conversation_id, title, create_time) VALUES (?, ?, ?)", rows)
+    create_tables(conn)
+    conn.close()
+
+    configure_database(db_path)
+    invalidate_query_cache()
+    yield app.test_client()
+    invalidate_query_cache()
+
+
+def list_page(client, url):
+    html = client.get(url).get_data(as_text=True)
+    ids = re.findall(r"<td>((?:un)?dated-\d+)</td>", html)
+    next_url = re.search(r'<a href="([^"]*)">Next</a>', html)
+    previous_url = re.search(r'<a href="([^"]*)">Previous</a>', html)
+    return (
+        ids,
+        next_url and next_url.group(1).replace("&amp;", "&"),
+        previous_url and previous_url.group(1).replace("&amp;", "&"),
+    )
+
+
+def test_pages_cross_null_create_times(client):
+    pages, url = [], "/"
+    while url:
+        ids, url, _ = list_page(client, url)
+        pages.append(ids)
+
+    assert [len(ids) for ids in pages] == [20, 20, 5]
+    listed = [conversation_id for ids in pages for conversation_id in ids]
+    # Newest first; conversations without a create_time sort as the oldest
+    assert listed == (
+        [f"dated-{i:02d}" for i in reversed(range(10))]
+        + [f"undated-{i:02d}" for i in reversed(range(35))]
+    )
+
+
+def test_previous_page_from_null_create_times(client):
+    first, second_url, _ = list_page(client, "/")
+    second, third_url, _ = list_page(client, second_url)
+    _, _, back_url = list_page(client, third_url)
+
+    assert list_page(client, back_url)[0] == second
+    assert list_page(client, list_page(client, back_url)[2])[0] == first
+
+
+@pytest.mark.parametrize("values", [[{"a": 1}, "x"], [[1], "x"], [1, 2**70]])
+def test_malformed_cursor_shows_the_first_page(client, values):
+    cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+    response = client.get("/", query_string={"after": cursor})
+
+    assert response.status_code == 200
+    assert list_page(client, f"/?after={cursor}")[0] == list_page(client, "/")[0]
@@ -0,0 +1,68 @@
+# tests/test_conversation_messages.py
+
+"""
+Paged message loading (/conversation/<id>/messages).
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from chatgpt_folder_to_db_v2 import create_tables
+from app.app import app
+from app.cache import invalidate_query_cache
+from app.db import configure_database
+from app.threads import refresh_thread_layout
+
+
+@pytest.fixture
+def client(tmp_path):
+    db_path = str(tmp_path / "conversations.db")
+    conn = sqlite3.connect(db_path)
+    create_tables(conn)
+    conn.execute("INSERT INTO Conversations (conversation_id, title, create_time) VALUES ('c1', 'Long', 1)")
+    conn.executemany(
+        "INSERT INTO Messages (message_id, conversation_id, parent_id, author_role, content, create_time) "
+        "VALUES (?, 'c1', ?, 'user', ?, ?)",
+        [(f"m{i:02d}", f"m{i - 1:02d}" if i else None, f"message {i}", i) for i in range(12)],
+    )
+    refresh_thread_layout(conn)
+    conn.commit()
+    conn.close()
+
+    configure_database(db_path)
+    invalidate_query_cache()
+    yield app.test_client()
+    invalidate_query_cache()
+
+
+def message_ids(page):
+    return [message["message_id"] for message in page["messages"]]
+
+
+def test_cursor_continues_after_the_previous_page(client):
+    first = client.get("/conversation/c1/messages", query_string={"limit": 5}).get_json()
+    second = client.get(
+        "/conversation/c1/messages", query_string={"limit": 5, "cursor": first["next_cursor"]}
+    ).get_json()
+
+    assert message_ids(first) == [f"m{i:02d}" for i in range(5)]
+    assert message_ids(second) == [f"m{i:02d}" for i in range(5, 10)]
+
+
+@pytest.mark.parametrize("cursor", [
+    base64.urlsafe_b64encode(json.dumps([{"a": 1}]).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps([[1, 2]]).encode()).decode(),
+    "not a cursor",
+])
+def test_bad_cursor_starts_from_the_first_page(client, cursor):
+    response = client.get("/conversation/c1/messages", query_string={"limit": 5, "cursor": cursor})
+
+    assert response.status_code == 200
+    assert message_ids(response.get_json()) == [f"m{i:02d}" for i in range(5)]
@@ -0,0 +1,89 @@
+# tests/test_dedupe.py
+
+"""
+Near-duplicate conversations: linking versions and merging the older copy
+into the newer one.
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from chatgpt_folder_to_db_v2 import create_tables
+from app.compression import register_content_functions
+from app.dedupe import deduplicate_conversations
+from app.threads import refresh_thread_layout
+
+SHARED = [f"shared message number {i}" for i in range(9)]
+
+
+def add_conversation(conn, conversation_id, update_time, texts):
+    conn.execute(
+        "INSERT INTO Conversations (conversation_id, title, create_time, update_time) VALUES (?, 'Copy', 1, ?)",
+        (conversation_id, update_time),
+    )
+    conn.executemany(
+        "INSERT INTO Messages (message_id, conversation_id, parent_id, author_role, content, create_time) "
+        "VALUES (?, ?, ?, 'user', ?, ?)",
+        [
+            (f"{conversation_id}-{i}", conversation_id, f"{conversation_id}-{i - 1}" if i else None, text, i)
+            for i, text in enumerate(texts)
+        ],
+    )
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "conversations.db"))
+    create_tables(conn)
+    register_content_functions(conn)
+    # The older copy has one reply the newer export lost
+    add_conversation(conn, "old", 1, SHARED + ["only in the old copy"])
+    add_conversation(conn, "new", 2, SHARED)
+    conn.executemany(
+        "INSERT INTO MessageFeedback (feedback_id, message_id, feedback_type) VALUES (?, ?, 'thumbsUp')",
+        [("f-shared", "old-3"), ("f-unique", "old-9")],
+    )
+    refresh_thread_layout(conn)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def message_ids(conn, conversation_id):
+    return {row[0] for row in conn.execute(
+        "SELECT message_id FROM Messages WHERE conversation_id = ?", (conversation_id,)
+    )}
+
+
+def test_link_keeps_both_copies(conn):
+    report = deduplicate_conversations(conn, "link")
+
+    assert (report["duplicates"], report["linked"], report["merged"]) == (1, 1, 0)
+    assert conn.execute(
+        "SELECT conversation_id, canonical_id, action FROM ConversationVersions"
+    ).fetchall() == [("old", "new", "linked")]
+    assert len(message_ids(conn, "old")) == 10
+    assert len(message_ids(conn, "new")) == 9
+
+
+def test_merge_keeps_messages_only_the_older_copy_has(conn):
+    report = deduplicate_conversations(conn, "merge")
+
+    assert (report["merged"], report["messages_removed"], report["messages_moved"]) == (1, 9, 1)
+    assert conn.execute("SELECT 1 FROM Conversations WHERE conversation_id = 'old'").fetchone() is None
+    assert message_ids(conn, "old") == set()
+    assert message_ids(conn, "new") == {f"new-{i}" for i in range(9)} | {"old-9"}
+    # Grafted under the newer copy's version of its parent
+    assert conn.execute("SELECT parent_id FROM Messages WHERE message_id = 'old-9'").fetchone() == ("new-8",)
+    assert dict(conn.execute("SELECT feedback_id, message_id FROM MessageFeedback")) == {
+        "f-shared": "new-3",
+        "f-unique": "old-9",
+    }
+    assert conn.execute(
+        "SELECT action FROM ConversationVersions WHERE conversation_id = 'old'"
+    ).fetchone() == ("merged",)
@@ -0,0 +1,53 @@
+# tests/test_export.py
+
+"""
+Single-conversation exports (/conversation/<id>/export/...).
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from chatgpt_folder_to_db_v2 import create_tables
+from app.app import app
+from app.cache import invalidate_query_cache
+from app.db import configure_database
+
+CONVERSATION_ID = 'odd id; name="x".html'
+
+
+@pytest.fixture
+def client(tmp_path):
+    db_path = str(tmp_path / "conversations.db")
+    conn = sqlite3.connect(db_path)
+    create_tables(conn)
+    conn.execute(
+        "INSERT INTO Conversations (conversation_id, title, create_time) VALUES (?, 'Export me', 1)",
+        (CONVERSATION_ID,),
+    )
+    conn.execute(
+        "INSERT INTO Messages (message_id, conversation_id, author_role, content, create_time) "
+        "VALUES ('m1', ?, 'user', 'hello', 1)",
+        (CONVERSATION_ID,),
+    )
+    conn.commit()
+    conn.close()
+
+    configure_database(db_path)
+    invalidate_query_cache()
+    yield app.test_client()
+    invalidate_query_cache()
+
+
+@pytest.mark.parametrize("export_format", ["json", "html"])
+def test_exports_use_the_same_safe_file_name(client, export_format):
+    response = client.get(f"/conversation/{CONVERSATION_ID}/export/{export_format}")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == (
+        f"attachment; filename=conversation_odd_id__name__x_.html.{export_format}"
+    )
@@ -0,0 +1,50 @@
+# tests/test_search.py
+
+"""
+Full-text search over the FTS5 index: user query syntax and error handling.
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from chatgpt_folder_to_db_v2 import create_tables
+from app.search import search_messages
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "conversations.db"))
+    conn.row_factory = sqlite3.Row
+    create_tables(conn)
+    conn.execute("INSERT INTO Conversations (conversation_id, title, create_time) VALUES ('c1', 'Retries', 1)")
+    conn.executemany(
+        "INSERT INTO Messages (message_id, conversation_id, author_role, content, create_time) VALUES (?, 'c1', 'user', ?, ?)",
+        [("m1", "retry with exponential backoff", 1), ("m2", "what is c++ good for", 2)],
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("retry AND backoff", ["m1"]),
+    ("c++", ["m2"]),
+    ("backoff:", ["m1"]),
+    ('"exponential backoff', ["m1"]),
+])
+def test_invalid_fts_syntax_is_retried_quoted(conn, query, expected):
+    assert [row["message_id"] for row in search_messages(conn, query)] == expected
+
+
+def test_other_errors_are_raised(conn):
+    # Interrupts only the first MATCH statement, so a silent retry would succeed
+    matches = []
+    conn.set_trace_callback(lambda sql: "MATCH" in sql and matches.append(sql))
+    conn.set_progress_handler(lambda: len(matches) == 1, 1)
+    with pytest.raises(sqlite3.OperationalError, match="interrupted"):
+        search_messages(conn, "retry")
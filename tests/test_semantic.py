@@ -0,0 +1,120 @@
+# tests/test_semantic.py
+
+"""
+Semantic search: building and rebuilding the vector index, and /search
+with mode=semantic when no usable index exists.
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from chatgpt_folder_to_db_v2 import create_tables
+from app.app import app
+from app.cache import invalidate_query_cache
+from app.compression import migrate_message_content, register_content_functions
+from app.db import bump_ingest_generation, configure_database
+from app.semantic import build_vector_index, vector_index_path
+
+MESSAGES = [
+    ("m1", "c1", "How do I retry failed requests with exponential backoff?"),
+    ("m2", "c1", "Wrap the call in a loop and double the delay after each failure."),
+    ("m3", "c2", "What is a good recipe for sourdough bread with a crisp crust?"),
+    ("m4", "c2", "Bake it in a preheated dutch oven, lid on for the first twenty minutes."),
+    ("m5", "c2", "thanks!"),
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = str(tmp_path / "conversations.db")
+    conn = sqlite3.connect(db_path)
+    create_tables(conn)
+    conn.executemany(
+        "INSERT INTO Conversations (conversation_id, title, create_time) VALUES (?, ?, 1)",
+        [("c1", "Retry backoff"), ("c2", "Sourdough baking")],
+    )
+    conn.executemany(
+        "INSERT INTO Messages (message_id, conversation_id, author_role, content, create_time) "
+        "VALUES (?, ?, 'user', ?, 1)",
+        MESSAGES,
+    )
+    conn.commit()
+    conn.close()
+
+    configure_database(db_path)
+    invalidate_query_cache()
+    yield db_path
+    invalidate_query_cache()
+
+
+def semantic(client, query):
+    return client.get("/search", query_string={"query": query, "mode": "semantic"})
+
+
+def test_search_without_a_vector_index_is_unavailable(db_path):
+    response = semantic(app.test_client(), "retry backoff")
+
+    assert response.status_code == 503
+    assert "error" in response.get_json()
+
+
+def test_search_with_an_unreadable_index_is_unavailable(db_path):
+    build_vector_index(db_path)
+    with open(os.path.join(vector_index_path(db_path), "meta.json"), "w", encoding="utf-8") as file:
+        file.write("{")
+
+    assert semantic(app.test_client(), "retry backoff").status_code == 503
+
+
+def test_search_ranks_by_meaning(db_path):
+    stats = build_vector_index(db_path)
+    results = semantic(app.test_client(), "retries with backoff").get_json()
+
+    # "thanks!" is too short to be indexed
+    assert stats["messages"] == 4
+    assert results[0] == {**results[0], "type": "conversation", "conversation_id": "c1"}
+    messages = [result["match"]["message_id"] for result in results if result["type"] == "message"]
+    assert messages[0] == "m1"
+
+
+def test_rebuild_only_after_new_data(db_path):
+    assert build_vector_index(db_path)["messages"] == 4
+    assert build_vector_index(db_path) is None
+
+    conn = sqlite3.connect(db_path)
+    register_content_functions(conn)
+    with conn:
+        conn.execute(
+            "INSERT INTO Messages (message_id, conversation_id, author_role, content, create_time) "
+            "VALUES ('m6', 'c1', 'user', 'Add jitter so clients do not retry in lockstep.', 2)"
+        )
+        bump_ingest_generation(conn)
+    conn.close()
+
+    assert build_vector_index(db_path)["messages"] == 5
+
+
+def test_compressed_bodies_are_indexed_like_plain_ones(db_path):
+    conn = sqlite3.connect(db_path)
+    register_content_functions(conn)
+    with conn:
+        # Compresses to fewer bytes than MIN_CONTENT_CHARS
+        conn.execute(
+            "INSERT INTO Messages (message_id, conversation_id, author_role, content, create_time) "
+            "VALUES ('m6', 'c1', 'tool', ?, 2)",
+            ("retry " * 40,),
+        )
+    plain = build_vector_index(db_path)
+    assert migrate_message_content(conn, 20) > 0
+    assert conn.execute("SELECT length(content) < 20 FROM Messages WHERE message_id = 'm6'").fetchone()[0]
+    conn.close()
+
+    assert plain["messages"] == 5
+    assert build_vector_index(db_path, force=True)["messages"] == plain["messages"]
@@ -0,0 +1,126 @@
+# tests/test_suggest.py
+
+"""
+Search box completions (/suggest): ranking, and the background build
+backing off while the database cannot be read.
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from chatgpt_folder_to_db_v2 import create_tables
+from app import history, suggest
+from app.app import app
+from app.cache import invalidate_query_cache
+from app.db import configure_database
+from app.suggest import SuggestIndex
+
+
+def join_builds():
+    for thread in threading.enumerate():
+        if thread.name == "suggest-index":
+            thread.join()
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    # No tables yet, so every build fails until a test creates them
+    db_path = str(tmp_path / "conversations.db")
+    sqlite3.connect(db_path).close()
+    monkeypatch.setattr(history, "HISTORY_DB_PATH", str(tmp_path / "search_history.db"))
+    monkeypatch.setattr(suggest, "REBUILD_RETRY", 60)
+    for name, value in [
+        ("_index", None), ("_rebuilding", False), ("_failures", 0), ("_retry_at", 0.0),
+        ("_first_attempt", threading.Event()),
+    ]:
+        monkeypatch.setattr(suggest, name, value)
+    builds = []
+    build = suggest._build
+    monkeypatch.setattr(suggest, "_build", lambda: builds.append(1) or build())
+
+    configure_database(db_path)
+    invalidate_query_cache()
+    yield db_path, builds
+    join_builds()
+    invalidate_query_cache()
+
+
+def create_conversations(db_path):
+    conn = sqlite3.connect(db_path)
+    create_tables(conn)
+    conn.execute(
+        "INSERT INTO Conversations (conversation_id, title, create_time, update_time) "
+        "VALUES ('c1', 'Retry with backoff', 1, 1)"
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_failed_build_is_not_retried_on_every_request(db_path):
+    _, builds = db_path
+    client = app.test_client()
+
+    for _ in range(5):
+        response = client.get("/suggest", query_string={"query": "ret"})
+        assert response.status_code == 200
+        assert response.get_json() == []
+        join_builds()
+
+    assert len(builds) == 1
+    assert suggest._failures == 1
+
+
+def test_backoff_doubles_up_to_the_limit(db_path, monkeypatch):
+    monkeypatch.setattr(suggest, "MAX_REBUILD_RETRY", 100)
+    delays = []
+    for _ in range(3):
+        suggest._build()
+        delays.append(suggest._retry_at - suggest.time.monotonic())
+
+    assert [round(delay) for delay in delays] == [60, 100, 100]
+
+
+def test_build_recovers_once_the_database_is_readable(db_path):
+    path, builds = db_path
+    client = app.test_client()
+    assert client.get("/suggest", query_string={"query": "ret"}).get_json() == []
+    join_builds()
+
+    create_conversations(path)
+    # The backoff has run out: the next request starts a build in the background
+    suggest._retry_at = 0.0
+    client.get("/suggest", query_string={"query": "ret"})
+    join_builds()
+    completions = client.get("/suggest", query_string={"query": "ret"}).get_json()
+
+    assert completions == [{"text": "Retry with backoff", "kind": "title", "conversation_id": "c1"}]
+    assert suggest._failures == 0
+    assert len(builds) == 2
+
+
+def test_static_files_do_not_start_a_build(db_path):
+    _, builds = db_path
+    app.test_client().get("/static/missing.css")
+    join_builds()
+
+    assert builds == []
+    assert suggest._index is None
+
+
+def test_completions_rank_queries_then_titles_once_each():
+    index = SuggestIndex(
+        titles=[("c1", "Retry with backoff", 1), ("c2", "Old retry notes", 2), ("c3", "RETRY with backoff", 3)],
+        queries=[("retry budget", 2), ("retry", 7)],
+    )
+
+    assert [completion["text"] for completion in index.complete("retry")] == [
+        "retry", "retry budget", "RETRY with backoff", "Old retry notes",
+    ]
+    assert index.complete("backoff") == [{"text": "RETRY with backoff", "kind": "title", "conversation_id": "c3"}]
+    assert index.complete("  ") == []
@@ -0,0 +1,46 @@
+# tests/test_threads.py
+
+"""
+Materialized thread layout: depth-first order from (tree_path, depth).
+"""
+
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.threads import thread_layout
+
+
+def test_tree_order_holds_past_a_thousand_siblings():
+    # A root answered 1200 times (regenerations), each answer with a follow-up
+    siblings = 1200
+    parents = {"root": None}
+    expected = ["root"]
+    for index in range(siblings):
+        parents[f"answer-{index}"] = "root"
+        parents[f"follow-up-{index}"] = f"answer-{index}"
+        expected += [f"answer-{index}", f"follow-up-{index}"]
+
+    layout = thread_layout(parents, current_node=f"follow-up-{siblings - 1}")
+
+    # Sorted the way SQLite sorts the tree_path index
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE Messages (message_id TEXT, depth INTEGER, tree_path TEXT)")
+    conn.executemany(
+        "INSERT INTO Messages VALUES (?, ?, ?)",
+        [(node_id, depth, path) for node_id, (depth, _, path) in layout.items()],
+    )
+    ordered = [row[0] for row in conn.execute("SELECT message_id FROM Messages ORDER BY tree_path, depth")]
+
+    assert ordered == expected
+    assert layout[f"follow-up-{siblings - 1}"][1] == 2
+    assert layout["answer-999"][1] is None
+
+
+def test_linear_stretches_share_their_path():
+    layout = thread_layout({"a": None, "b": "a", "c": "b"})
+
+    assert {path for _, _, path in layout.values()} == {"/"}
+    assert [layout[node][1] for node in "abc"] == [0, 1, 2]